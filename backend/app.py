@@ -1,9 +1,10 @@
 import os
 import re
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, redirect
 from flask_cors import CORS
 from flask_mail import Mail, Message
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge, NotFound
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
 from dotenv import load_dotenv
@@ -14,44 +15,45 @@ from functools import wraps
 import threading
 import time
 from datetime import datetime, timedelta, timezone
-import uuid
 import pathlib
+import mimetypes
+from urllib.parse import quote
 import math
+import posixpath
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    R = 6371.0 # Radius of the Earth in km
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-
-    dlon = lon2_rad - lon1_rad
-    dlat = lat2_rad - lat1_rad
-
-    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+from geo_distance import haversine_km
 
-    distance = R * c
-    return distance
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Distance in km between two points; geo_distance has the vectorized batch versions."""
+    return haversine_km(lat1, lon1, lat2, lon2)
 
 # Import our custom modules
-from department_contacts import get_emails_for_department, get_response_time_for_department
+from department_contacts import get_emails_for_department, get_response_time_for_department, normalize_department_key
+from geo import geo_fields
+from clustering import find_cluster_match, find_photo_match, merge_into_cluster, merge_reviewed_duplicate, DUPLICATE_STATUS
 from whatsapp_service import send_whatsapp_notification, send_whatsapp_reminder, send_whatsapp_escalation
-
-# Optional: Google Cloud Vision for image moderation
-try:
-    from google.cloud import vision
-    VISION_AVAILABLE = True
-except ImportError:
-    VISION_AVAILABLE = False
-    print("⚠️ Google Cloud Vision not installed. Image moderation disabled.")
-
-import io
+from report_queries import fetch_requests, stream_requests, parse_page_size, decode_cursor
+from report_analytics import safe_record_report_change, update_report, record_clustered_report, get_department_analytics, format_analytics
+from report_cache import report_cache, get_report
+from report_mirror import report_mirror, mirror_enabled
+from http_cache import etag_for_reports, etag_for_payload, json_with_etag
+from json_provider import FirestoreJSONProvider, ORJSON_AVAILABLE
+from streaming import wants_ndjson, ndjson_response
+from spatial_index import nearby_index, OPEN_STATUSES, MAX_RADIUS_KM
+from photo_index import photo_index, image_hashes
+from heatmap_tiles import get_heatmap_tile, is_valid_tile, MIN_ZOOM, MAX_ZOOM
+from boundary_router import boundary_router, routing_fields
+from moderation import moderation_pool, MODERATION_PENDING, MODERATION_APPROVED
+from upload_store import UploadStore, UploadRejected, add_references, digest_of, legacy_target, URL_PREFIX
+from upload_metadata import strip_metadata
+from upload_ingest import StreamingUploadRequest, MB, sniff_media
+from upload_sessions import UploadSessions
+from image_derivatives import DerivativePool, SIZES as DERIVATIVE_SIZES
 
 # Load environment variables
 load_dotenv()
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, redirect
 
 # Optional: Flask-Limiter for rate limiting
 try:
@@ -63,6 +65,10 @@ except ImportError:
     print("⚠️ Flask-Limiter not installed. Rate limiting disabled.")
 
 app = Flask(__name__)
+# Encodes Firestore types explicitly and uses orjson when installed
+app.json = FirestoreJSONProvider(app)
+if not ORJSON_AVAILABLE:
+    print("⚠️ orjson not installed. Using the standard library JSON encoder.")
 
 # Initialize Rate Limiter only if available
 if LIMITER_AVAILABLE:
@@ -81,7 +87,8 @@ app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=1)
 app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=30)
 jwt = JWTManager(app)
 
-CORS(app)
+# ETag is exposed so browser clients (Flutter web) can send If-None-Match
+CORS(app, expose_headers=["ETag"])
 
 
 
@@ -101,6 +108,33 @@ BASE_DIR = pathlib.Path(__file__).resolve().parent
 UPLOAD_FOLDER = BASE_DIR / 'uploads'
 UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = str(UPLOAD_FOLDER)
+# Originals are public, so location and camera metadata are stripped before they are stored
+upload_store = UploadStore(UPLOAD_FOLDER, scrub=strip_metadata)
+derivative_pool = DerivativePool(upload_store, workers=int(os.getenv('DERIVATIVE_WORKERS', 2)))
+
+# File parts are streamed straight into the upload folder, with per-file and per-request limits
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_REQUEST_MB', 256)) * MB
+StreamingUploadRequest.upload_store = upload_store
+StreamingUploadRequest.max_file_bytes = int(os.getenv('MAX_UPLOAD_FILE_MB', 50)) * MB
+StreamingUploadRequest.max_files = int(os.getenv('MAX_UPLOAD_FILES', 20))
+app.request_class = StreamingUploadRequest
+# Resumable uploads: the app sends files in chunks first and the report refers to them by id
+upload_sessions = UploadSessions(upload_store, max_file_bytes=StreamingUploadRequest.max_file_bytes,
+                                 ttl_hours=int(os.getenv('UPLOAD_SESSION_TTL_HOURS', 24)), sniff=sniff_media)
+
+# Upload names never change content (hash or uuid names), so clients and proxies may keep them for good
+UPLOAD_CACHE_MAX_AGE = int(os.getenv('UPLOAD_CACHE_MAX_AGE', 365 * 24 * 3600))
+# 'x-sendfile' (Apache, lighttpd) or 'x-accel' (nginx): the front proxy sends the file bytes, not a Flask worker
+UPLOAD_SENDFILE = os.getenv('UPLOAD_SENDFILE', '').strip().lower()
+UPLOAD_ACCEL_PREFIX = os.getenv('UPLOAD_ACCEL_PREFIX', '/protected-uploads/')
+app.config['USE_X_SENDFILE'] = UPLOAD_SENDFILE == 'x-sendfile'
+
+HEATMAP_MAX_AGE_SECONDS = int(os.getenv('HEATMAP_MAX_AGE_SECONDS', 60))
+# Without the report mirror, each worker reloads its nearby index this often to see other workers' writes
+NEARBY_INDEX_REFRESH_SECONDS = int(os.getenv('NEARBY_INDEX_REFRESH_SECONDS', 900))
+PHOTO_INDEX_REFRESH_SECONDS = int(os.getenv('PHOTO_INDEX_REFRESH_SECONDS', 900))
+# How long a moderation worker waits for its process's photo index before clustering by location only
+PHOTO_INDEX_WAIT_SECONDS = 30
 
 # Initialize Firebase
 db = None
@@ -156,6 +190,9 @@ def handle_errors(f):
     def decorated_function(*args, **kwargs):
         try:
             return f(*args, **kwargs)
+        except (UploadRejected, RequestEntityTooLarge):
+            # Answered by their error handlers (413/415)
+            raise
         except Exception as e:
             print(f"Error in {f.__name__}: {str(e)}")
             return jsonify({"msg": str(e)}), 500
@@ -165,35 +202,68 @@ def handle_errors(f):
 def ratelimit_handler(e):
     return jsonify({"msg": f"Rate limit exceeded: {e.description}"}), 429
 
+@app.errorhandler(413)
+def request_too_large_handler(e):
+    return jsonify({"msg": f"Upload too large: at most {app.config['MAX_CONTENT_LENGTH'] // MB} MB per submission"}), 413
+
+@app.errorhandler(UploadRejected)
+def upload_rejected_handler(e):
+    return jsonify({"msg": str(e)}), e.status_code
+
 # AI Image Moderation
-def analyze_image_safety(image_path):
+def resolve_upload_path(image):
+    """Local file of an uploaded image path ('uploads/...'), or None for anything else."""
+    if not isinstance(image, str) or not image.startswith('uploads/'):
+        return None
+    path = upload_store.local_path(image)
+    return path if path is not None and path.is_file() else None
+
+def attachment_source(img_path):
+    """(file, mime type, extension) to attach for an image: the medium WebP if it exists already, else the original."""
+    # Never waits: emails are sent from request handlers, and the original is stripped of metadata too
+    derivative = derivative_pool.get(img_path, 'medium')
+    if derivative is not None:
+        return str(derivative), 'image/webp', 'webp'
+    # Handle both absolute paths (legacy) and relative 'uploads/...' paths (new)
+    return str(upload_store.local_path(img_path) or img_path), 'image/jpeg', 'jpg'
+
+def handle_moderation_verdict(report_id, report, update):
+    """Side effects of a moderation verdict written by the background pool."""
+    report_cache.invalidate(report_id)
+    if update.get('status'):
+        # Flagged: the report left the review queue as rejected
+        nearby_index.update(report_id, {'status': update['status']})
+        photo_index.update(report_id, {'status': update['status']})
+    elif update.get('moderation_status') == MODERATION_APPROVED:
+        if cluster_reviewed_report(report_id, report):
+            return
+        # Authorities only hear about reports whose images passed moderation.
+        # Runs on a pool thread, and Flask-Mail needs the app context there
+        with app.app_context():
+            send_report_email_to_authorities({**report, 'id': report_id})
+
+def cluster_reviewed_report(report_id, report):
     """
-    Analyzes an image for explicit content (Violence, Adult, Racy, etc.)
-    using Google Cloud Vision API. Returns True if SAFE, False if EXPLICIT.
+    Reports with images are clustered once moderation has approved them, so a
+    photo that gets rejected never upvotes another report. This is also where
+    their photos are matched. Returns True if merged.
     """
     try:
-        # Check if Vision API is available
-        if not VISION_AVAILABLE or db is None:
-            return True # In offline/dev mode or without Vision API, assume safe
-            
-        client = vision.ImageAnnotatorClient()
-        with io.open(image_path, 'rb') as image_file:
-            content = image_file.read()
-
-        image = vision.Image(content=content)
-        response = client.safe_search_detection(image=image)
-        safe = response.safe_search_annotation
-
-        # Likelihood enum: 1=UNKNOWN, 2=VERY_UNLIKELY, 3=UNLIKELY, 4=POSSIBLE, 5=LIKELY, 6=VERY_LIKELY
-        # We block if any of these are LIKELY (5) or VERY_LIKELY (6)
-        if (safe.adult >= 5 or safe.violence >= 5 or safe.racy >= 5):
-            print(f"⚠️ Image flagged by AI Moderation: Adult={safe.adult}, Violence={safe.violence}, Racy={safe.racy}")
+        match = find_cluster_match(db, report)
+        # The pool and the index start together, so the first verdicts can come before the build
+        if match is None and photo_index.wait_ready(PHOTO_INDEX_WAIT_SECONDS):
+            match = find_photo_match(db, report, photo_index)
+        if match is None or not merge_reviewed_duplicate(db, report_id, report, match[0]):
             return False
-            
-        return True
-    except Exception as e:
-        print(f"⚠️ Vision API Error: {str(e)}")
-        return True # Fallback to true if API fails so we don't block legitimate users
+    except Exception as cluster_err:
+        print(f"Clustering error: {cluster_err}")
+        return False
+    report_cache.invalidate(report_id)
+    report_cache.invalidate(match[0].id)
+    nearby_index.update(report_id, {'status': DUPLICATE_STATUS})
+    photo_index.update(report_id, {'status': DUPLICATE_STATUS})
+    print(f"✓ Approved report {report_id} clustered with existing request: {match[0].id}")
+    return True
 
 # Email sending function
 def send_welcome_email(user_email, user_name):
@@ -501,17 +571,10 @@ def send_escalation_email(report, escalation_level=1):
         images = report.get('images', [])
         for i, img_path in enumerate(images[:5]):  # Limit to 5 attachments
             try:
-                # Handle both absolute paths (legacy) and relative paths (new)
-                if 'uploads/' in img_path:
-                     # Remove 'uploads/' prefix if present and join with UPLOAD_FOLDER
-                     filename_only = os.path.basename(img_path)
-                     full_path = str(UPLOAD_FOLDER / filename_only)
-                else:
-                     full_path = img_path
-                
+                full_path, mime_type, extension = attachment_source(img_path)
                 with open(full_path, 'rb') as fp:
-                    filename = f"report_{report.get('id')}_image_{i+1}.jpg"
-                    msg.attach(filename, 'image/jpeg', fp.read())
+                    filename = f"report_{report.get('id')}_image_{i+1}.{extension}"
+                    msg.attach(filename, mime_type, fp.read())
             except Exception as e:
                 print(f"⚠️ Could not attach image {img_path}: {str(e)}")
 
@@ -657,16 +720,10 @@ def send_confirmation_email_to_reporter(report):
         images = report.get('images', [])
         for i, img_path in enumerate(images[:5]):  # Limit to 5 attachments
             try:
-                # Handle both absolute paths (legacy) and relative paths (new)
-                if 'uploads/' in img_path:
-                     filename_only = os.path.basename(img_path)
-                     full_path = str(UPLOAD_FOLDER / filename_only)
-                else:
-                     full_path = img_path
-                
+                full_path, mime_type, extension = attachment_source(img_path)
                 with open(full_path, 'rb') as fp:
-                    filename = f"report_{report.get('id')}_image_{i+1}.jpg"
-                    msg.attach(filename, 'image/jpeg', fp.read())
+                    filename = f"report_{report.get('id')}_image_{i+1}.{extension}"
+                    msg.attach(filename, mime_type, fp.read())
             except Exception as e:
                 print(f"⚠️ Could not attach image {img_path}: {str(e)}")
 
@@ -1154,6 +1211,19 @@ def refresh():
     new_access_token = create_access_token(identity=current_user)
     return jsonify(access_token=new_access_token), 200
 
+def query_reports(filters, limit=None, cursor=None):
+    """List reports from the live mirror when it is warm, otherwise straight from Firestore."""
+    if report_mirror.is_serving():
+        return report_mirror.query(filters, limit=limit, cursor=cursor)
+    return fetch_requests(db, filters, limit=limit, cursor=cursor)
+
+def stream_reports(filters):
+    """Iterate every matching report newest first without materializing the full list."""
+    if report_mirror.is_serving():
+        reports, _, plan = report_mirror.query(filters)
+        return iter(reports), plan
+    return stream_requests(db, filters)
+
 # GET ALL REQUESTS ENDPOINT
 @app.route('/api/requests', methods=['GET'])
 # jwt is optional so mobile clients can still call this without a token
@@ -1166,6 +1236,14 @@ def get_requests():
         status = request.args.get('status')
         user_id = request.args.get('userId')  # Get userId filter
 
+        # Optional cursor pagination; without `limit` every match is returned (legacy clients)
+        try:
+            limit = parse_page_size(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            cursor = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({"msg": "Invalid limit or cursor"}), 400
+
         # if caller provided a valid JWT containing admin data, enforce its department
         current_user = get_jwt_identity()
         if isinstance(current_user, dict):
@@ -1175,67 +1253,112 @@ def get_requests():
                 department = dept_token
         print(f"DEBUG: get_requests called with department={department}, status={status}, userId={user_id}")
 
-        # Build query based on filters
-        if department and status:
-            # If both filters are present, we need to handle this differently to avoid composite index issues
-            # Fetch all documents and filter in Python
-            print("DEBUG: Using both filters - fetching all and filtering in Python")
-            requests_ref = db.collection('requests').stream()
-            requests_list = []
-            for doc in requests_ref:
-                request_data = doc.to_dict()
-                request_data['id'] = doc.id
-                # Apply filters in Python
-                if (not department or request_data.get('department') == department) and \
-                   (not status or request_data.get('status') == status) and \
-                    (not user_id or request_data.get('userId') == user_id):
-                    requests_list.append(request_data)
-        elif department:
-            # Single filter by department - fetch all and filter in Python to avoid index issues
-            print(f"DEBUG: Using department filter: {department}")
-            requests_ref = db.collection('requests').stream()
-            requests_list = []
-            for doc in requests_ref:
-                request_data = doc.to_dict()
-                request_data['id'] = doc.id
-                if request_data.get('department') == department:
-                    if not user_id or request_data.get('userId') == user_id:
-                        requests_list.append(request_data)
-            # Sort by createdAt in descending order (most recent first)
-            requests_list.sort(key=lambda x: x.get('createdAt'), reverse=True)
-        elif status:
-            # Single filter by status - fetch all and filter in Python to avoid index issues
-            print(f"DEBUG: Using status filter: {status}")
-            requests_ref = db.collection('requests').stream()
-            requests_list = []
-            for doc in requests_ref:
-                request_data = doc.to_dict()
-                request_data['id'] = doc.id
-                if request_data.get('status') == status:
-                    if not user_id or request_data.get('userId') == user_id:
-                        requests_list.append(request_data)
-            # Sort by createdAt in descending order (most recent first)
-            requests_list.sort(key=lambda x: x.get('createdAt'), reverse=True)
-        else:
-            # No filters - can use order_by directly
-            print("DEBUG: No filters - using order_by")
-            requests_ref = db.collection('requests').order_by('createdAt', direction=firestore.Query.DESCENDING).stream()
-            requests_list = []
-            for doc in requests_ref:
-                request_data = doc.to_dict()
-                request_data['id'] = doc.id
-                if not user_id or request_data.get('userId') == user_id:
-                    requests_list.append(request_data)
-
-        print(f"✓ Fetched {len(requests_list)} requests")
-        return jsonify({
+        # Equality filters and createdAt ordering are pushed down to Firestore
+        # (see firestore.indexes.json); the plan says whether an index was used
+        requests_list, next_cursor, plan = query_reports(
+            {'department': department, 'status': status, 'userId': user_id},
+            limit=limit,
+            cursor=cursor
+        )
+
+        print(f"✓ Fetched {len(requests_list)} requests (plan={plan['strategy']}, reads={plan.get('documents_read')})")
+        etag = etag_for_reports(requests_list, next_cursor)
+        return json_with_etag(etag, lambda: {
             "msg": "Success",
-            "requests": requests_list
-        }), 200
+            "requests": requests_list,
+            "next_cursor": next_cursor,
+            "plan": plan
+        })
     except Exception as e:
         print(f"Error fetching requests: {str(e)}")
         return jsonify({"msg": "Failed to fetch requests", "error": str(e)}), 500
 
+# NEARBY REQUESTS ENDPOINT
+@app.route('/api/requests/nearby', methods=['GET'])
+@handle_errors
+def get_nearby_requests():
+    """Reports around a point, nearest first, served from the in-memory grid index."""
+    try:
+        try:
+            lat = float(request.args['lat'])
+            lon = float(request.args['lon'])
+            radius = float(request.args.get('radius', 1.0))
+            limit = parse_page_size(request.args.get('limit')) or 50
+        except (KeyError, ValueError):
+            return jsonify({"msg": "lat and lon are required; radius (km) and limit must be numbers"}), 400
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180) or not (0 < radius <= MAX_RADIUS_KM):
+            return jsonify({"msg": f"Invalid coordinates or radius (max {MAX_RADIUS_KM} km)"}), 400
+
+        category = request.args.get('category')
+        # Open issues by default; `status` takes a comma-separated list
+        status = request.args.get('status')
+        statuses = tuple(s.strip() for s in status.split(',') if s.strip()) if status else OPEN_STATUSES
+
+        if not nearby_index.ready:
+            response = jsonify({"msg": "Nearby search is starting up, please retry shortly"})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+
+        results = nearby_index.query(lat, lon, radius, category=category, statuses=statuses, limit=limit)
+        return jsonify({"msg": "Success", "count": len(results), "requests": results}), 200
+    except Exception as e:
+        print(f"Error fetching nearby requests: {str(e)}")
+        return jsonify({"msg": "Failed to fetch nearby requests", "error": str(e)}), 500
+
+# RESUMABLE UPLOAD ENDPOINTS
+# Chunks are small and retried on bad connections, so they get their own, higher limits.
+# A report carries up to 20 files, so sessions allow 20 times the report limits
+@app.route('/api/uploads', methods=['POST'])
+@limiter.limit("100 per minute") if LIMITER_AVAILABLE else lambda f: f
+@limiter.limit("1000 per day") if LIMITER_AVAILABLE else lambda f: f
+@handle_errors
+def create_upload_session():
+    """Start a resumable upload: {size, sha256?, chunk_size?} -> upload id and chunk layout."""
+    data = request.get_json(silent=True) or {}
+    try:
+        size = int(data.get('size'))
+        chunk_size = int(data['chunk_size']) if data.get('chunk_size') else None
+    except (TypeError, ValueError):
+        return jsonify({"msg": "size (bytes) is required; chunk_size must be a number"}), 400
+    session = upload_sessions.create(size, sha256=data.get('sha256'), chunk_size=chunk_size)
+    return jsonify({"msg": "Upload started", **session}), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@limiter.limit("600 per minute") if LIMITER_AVAILABLE else lambda f: f
+@handle_errors
+def get_upload_session(upload_id):
+    """Which chunks have arrived, so an interrupted upload can resume where it stopped."""
+    return jsonify({"msg": "Success", **upload_sessions.status(upload_id)}), 200
+
+@app.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+# A 50 MB video is 100 chunks of the app's 512 KB
+@limiter.limit("2000 per minute") if LIMITER_AVAILABLE else lambda f: f
+@limiter.limit("100000 per day") if LIMITER_AVAILABLE else lambda f: f
+@handle_errors
+def put_upload_chunk(upload_id, index):
+    """Raw chunk bytes as the body; an optional X-Chunk-SHA256 header is checked."""
+    session = upload_sessions.put_chunk(upload_id, index, request.stream,
+                                        sha256=request.headers.get('X-Chunk-SHA256'))
+    return jsonify({"msg": "Chunk received", **session}), 200
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@limiter.limit("100 per minute") if LIMITER_AVAILABLE else lambda f: f
+@limiter.limit("1000 per day") if LIMITER_AVAILABLE else lambda f: f
+@handle_errors
+def complete_upload_session(upload_id):
+    """Verify the whole file against {sha256} and store it; the report then sends the upload id."""
+    data = request.get_json(silent=True) or {}
+    session = upload_sessions.complete(upload_id, sha256=data.get('sha256'))
+    # Thumbnails are ready by the time the report arrives
+    derivative_pool.submit(session['image'])
+    return jsonify({"msg": "Upload complete", **session}), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@handle_errors
+def delete_upload_session(upload_id):
+    upload_sessions.delete(upload_id)
+    return jsonify({"msg": "Upload cancelled"}), 200
+
 # CREATE REQUEST ENDPOINT
 @app.route('/api/requests', methods=['POST'])
 @limiter.limit("5 per minute") if LIMITER_AVAILABLE else lambda f: f  # Prevent report spamming
@@ -1262,24 +1385,24 @@ def create_request():
                 return jsonify({"msg": "Reporter email and OTP are required"}), 400
 
             images = []
-            is_explicit = False
             for f in request.files.getlist('images'):
-                if f and f.filename:
-                    filename = secure_filename(f.filename)
-                    unique_name = f"{uuid.uuid4().hex}_{filename}"
-                    save_path = UPLOAD_FOLDER / unique_name
-                    f.save(str(save_path))
-                    
-                    # Moderate the image immediately
-                    if not analyze_image_safety(str(save_path)):
-                        is_explicit = True
-                        
-                    # Store relative path for web access
-                    images.append(f'uploads/{unique_name}')
-            
-            if is_explicit:
-                # If AI flags it, instantly reject and don't save to DB
-                return jsonify({"msg": "Report rejected. Uploaded images violate our safety policy regarding inappropriate content."}), 400
+                # An empty file (no photo picked in a form) is skipped rather than stored
+                if f and f.filename and f.stream.seek(0, os.SEEK_END) > 0:
+                    f.stream.seek(0)
+                    # Stored by content hash, so a retried or repeated photo reuses the same file
+                    image_path, _, _, _ = upload_store.save(f.stream, secure_filename(f.filename))
+                    # Thumbnails are made in the background for list views and emails
+                    derivative_pool.submit(image_path)
+                    # Store relative path for web access; moderation runs in the background
+                    if image_path not in images:
+                        images.append(image_path)
+            # Files already sent through the resumable upload API
+            upload_ids = [u.strip() for value in form.getlist('upload_ids') for u in value.split(',') if u.strip()]
+            for image_path in upload_sessions.resolve(upload_ids):
+                if image_path not in images:
+                    images.append(image_path)
+            if len(images) > StreamingUploadRequest.max_files:
+                return jsonify({"msg": f"At most {StreamingUploadRequest.max_files} files can be attached to a report"}), 413
 
             request_data = {
                 'title': title,
@@ -1312,6 +1435,19 @@ def create_request():
 
             otp = data.get('otp', '').strip()
             reporter_email = data.get('reporter_email')
+            images = data.get('images') or []
+            if not isinstance(images, list) or not all(isinstance(image, str) for image in images):
+                return jsonify({"msg": "images must be a list of uploaded image paths"}), 400
+            # Only files that were uploaded here; they are counted, hashed and kept by the collector
+            for image in images:
+                path = upload_store.local_path(image) if digest_of(image) else None
+                if path is None or not path.is_file():
+                    return jsonify({"msg": f"Unknown image: {image}"}), 400
+            images = list(dict.fromkeys(images))
+            # Files already sent through the resumable upload API
+            for image_path in upload_sessions.resolve(data.get('upload_ids') or []):
+                if image_path not in images:
+                    images.append(image_path)
 
             request_data = {
                 'title': data.get('title'),
@@ -1325,7 +1461,7 @@ def create_request():
                 'status': 'under_review',  # Placed in moderation queue first
                 'createdAt': firestore.SERVER_TIMESTAMP,
                 'userId': data.get('userId'),
-                'images': data.get('images', []),
+                'images': images,
                 'reporter_name': data.get('reporter_name'),
                 'reporter_email': data.get('reporter_email'),
                 'landmark': data.get('landmark'),
@@ -1336,6 +1472,19 @@ def create_request():
                 'escalationHistory': []
             }
 
+        # Canonical key so admin queries can filter with an index instead of
+        # matching 'PWD' against 'pwd' in Python
+        request_data['department_key'] = normalize_department_key(request_data.get('department'))
+        # lat/lon, geohash and cluster_cell for indexed spatial lookups
+        request_data.update(geo_fields(request_data.get('location_text')))
+        # Images are checked by the moderation pool after the report is saved
+        request_data['moderation_status'] = MODERATION_PENDING if request_data.get('images') else MODERATION_APPROVED
+        # District, local body and nearest office from the GPS position when the client did not send them
+        try:
+            request_data.update(routing_fields(request_data))
+        except Exception as routing_err:
+            print(f"⚠️ Boundary routing failed: {routing_err}")
+
         # Verify OTP before saving
         otp_doc = db.collection('otps').document(reporter_email).get()
         if not otp_doc.exists:
@@ -1355,51 +1504,29 @@ def create_request():
         except:
             pass
 
+        # Perceptual hashes of the photos, for clustering re-sent pictures when GPS is off.
+        # Decoding every photo is the slow part, so it waits until the OTP is verified
+        if request_data.get('images'):
+            request_data['image_hashes'] = image_hashes(request_data['images'], resolve_upload_path)
+
         # ---- NEW CLUSTERING LOGIC ----
+        # Reports with images are clustered after moderation (cluster_reviewed_report)
         try:
-            loc_text = request_data.get('location_text', '')
-            if loc_text and ',' in loc_text:
-                parts = loc_text.split(',')
-                if len(parts) >= 2:
-                    new_lat = float(parts[0].strip())
-                    new_lon = float(parts[1].strip())
-                    new_cat = request_data.get('category')
-                    
-                    # Search logic: fetch recent pending/in_progress from same category
-                    # We can't do an OR query easily in firestore for 'status', so we filter in Python
-                    existing_reports = db.collection('requests').where('category', '==', new_cat).stream()
-                    
-                    for doc in existing_reports:
-                        doc_data = doc.to_dict()
-                        if doc_data.get('status') not in ['pending', 'in_progress']:
-                            continue
-                            
-                        existing_loc = doc_data.get('location_text', '')
-                        if existing_loc and ',' in existing_loc:
-                            e_parts = existing_loc.split(',')
-                            if len(e_parts) >= 2:
-                                try:
-                                    e_lat = float(e_parts[0].strip())
-                                    e_lon = float(e_parts[1].strip())
-                                    dist = calculate_distance(new_lat, new_lon, e_lat, e_lon)
-                                    if dist <= 0.05:  # 50 meters
-                                        # Match found! Cluster them
-                                        existing_upvotes = doc_data.get('upvotes', 1)
-                                        updated_upvotes = existing_upvotes + 1
-                                        existing_reporters = doc_data.get('co_reporters', [])
-                                        reporter_email = request_data.get('reporter_email')
-                                        
-                                        if reporter_email and reporter_email not in existing_reporters:
-                                            existing_reporters.append(reporter_email)
-                                            
-                                        doc.reference.update({
-                                            'upvotes': updated_upvotes,
-                                            'co_reporters': existing_reporters
-                                        })
-                                        print(f"✓ Clustered with existing request: {doc.id}")
-                                        return jsonify({"msg": "Report clustered with identical existing issue", "id": doc.id}), 200
-                                except ValueError:
-                                    pass
+            match = None
+            if request_data['moderation_status'] != MODERATION_PENDING:
+                match = find_cluster_match(db, request_data)
+            if match is not None:
+                doc, doc_data = match
+                # Match found! Cluster them with one atomic write (no read-modify-write)
+                merge_into_cluster(doc.reference, request_data.get('reporter_email'))
+                # Only the server knows the new counts; the next read fetches them
+                report_cache.invalidate(doc.id)
+                try:
+                    record_clustered_report(db, doc_data)
+                except Exception as analytics_err:
+                    print(f"⚠️ Analytics update failed: {analytics_err}")
+                print(f"✓ Clustered with existing request: {doc.id}")
+                return jsonify({"msg": "Report clustered with identical existing issue", "id": doc.id}), 200
         except Exception as cluster_err:
             print(f"Clustering error: {cluster_err}")
             # Fallback to creating a new report if clustering fails
@@ -1417,11 +1544,23 @@ def create_request():
         # Attach id to local copy for email
         request_data['id'] = request_id
 
-        # Notify authorities
+        # Keep the department's dashboard counters current
+        safe_record_report_change(db, None, request_data)
+        nearby_index.upsert(request_id, request_data)
+        photo_index.upsert(request_id, request_data)
         try:
-            send_report_email_to_authorities(request_data)
-        except Exception:
-            pass
+            add_references(db, request_data.get('images'))
+        except Exception as ref_err:
+            print(f"⚠️ Upload refcount update failed: {ref_err}")
+
+        # Notify authorities now, or once the moderation pool has approved the images
+        if request_data['moderation_status'] == MODERATION_PENDING:
+            moderation_pool.submit(request_id)
+        else:
+            try:
+                send_report_email_to_authorities(request_data)
+            except Exception:
+                pass
 
         # Notify reporter
         try:
@@ -1434,6 +1573,9 @@ def create_request():
             "msg": "Request submitted successfully. It is currently under review by our moderation team.", 
             "id": request_id
         }), 200
+    except (UploadRejected, RequestEntityTooLarge):
+        # Answered as 413/415 by the error handlers; the partial files are already gone
+        raise
     except Exception as e:
         print(f"Error creating request: {str(e)}")
         return jsonify({"msg": "Failed to create request", "error": str(e)}), 500
@@ -1443,15 +1585,13 @@ def create_request():
 @handle_errors
 def get_request(request_id):
     try:
-        doc = db.collection('requests').document(request_id).get()
+        request_data = get_report(db, request_id)
         
-        if doc.exists:
-            request_data = doc.to_dict()
-            request_data['id'] = doc.id
-            return jsonify({
+        if request_data is not None:
+            return json_with_etag(etag_for_payload(request_data), lambda: {
                 "msg": "Success",
                 "request": request_data
-            }), 200
+            })
         else:
             return jsonify({"msg": "Request not found"}), 404
     except Exception as e:
@@ -1470,20 +1610,9 @@ def update_request(request_id):
         if not data:
             return jsonify({"msg": "No data provided"}), 400
 
-        # Fetch existing document to detect status changes
-        doc_ref = db.collection('requests').document(request_id)
-        doc = doc_ref.get()
-        if not doc.exists:
-            return jsonify({"msg": "Request not found"}), 404
-
-        old = doc.to_dict() or {}
-
         # if an admin token was provided, ensure they are allowed to modify this report
         current_user = get_jwt_identity()
-        if isinstance(current_user, dict):
-            dept_token = current_user.get('department')
-            if dept_token and old.get('department') != dept_token:
-                return jsonify({"msg": "Forbidden - cannot modify reports from other departments"}), 403
+        dept_token = current_user.get('department') if isinstance(current_user, dict) else None
 
         # Update only provided fields
         update_data = {}
@@ -1495,12 +1624,24 @@ def update_request(request_id):
         if not update_data:
             return jsonify({"msg": "No fields to update"}), 400
 
-        doc_ref.update(update_data)
+        def allowed_update(current):
+            # Checked against the state the transaction reads, not a cached copy
+            if dept_token and current.get('department') != dept_token:
+                return None
+            return update_data
+
+        old, updated_doc = update_report(db, request_id, allowed_update)
+        if old is None:
+            return jsonify({"msg": "Request not found"}), 404
+        if updated_doc is None:
+            return jsonify({"msg": "Forbidden - cannot modify reports from other departments"}), 403
+        report_cache.update(request_id, update_data)
+        nearby_index.update(request_id, update_data)
+        photo_index.update(request_id, update_data)
 
         # If status changed to completed, notify reporter
         new_status = update_data.get('status')
         if new_status and new_status.lower() in ['completed', 'complete', 'done', 'resolved']:
-            updated_doc = doc_ref.get().to_dict()
             try:
                 send_completion_email_to_reporter(updated_doc)
             except Exception:
@@ -1543,6 +1684,7 @@ def add_request_note(request_id):
             'escalationHistory': history,
             'lastActionDate': firestore.SERVER_TIMESTAMP
         })
+        report_cache.invalidate(request_id)
 
         print(f"✓ Added delay reason to request: {request_id}")
         return jsonify({"msg": "Reason logged. Escalation timer reset."}), 200
@@ -1556,15 +1698,69 @@ def health():
     try:
         # Test Firebase connection
         db.collection('_test').document('_test').set({'test': True})
-        return jsonify({"msg": "Server is running", "firebase": "connected"}), 200
+        firebase_status = "connected"
     except:
-        return jsonify({"msg": "Server is running", "firebase": "not connected"}), 200
-
+        firebase_status = "not connected"
+    return jsonify({
+        "msg": "Server is running",
+        "firebase": firebase_status,
+        "report_cache": report_cache.stats(),
+        "mirror": report_mirror.stats(),
+        "nearby_index": nearby_index.stats(),
+        "photo_index": photo_index.stats(),
+        "boundary_router": boundary_router.stats(),
+        "moderation": moderation_pool.stats(),
+        "derivatives": derivative_pool.stats(),
+        "upload_sessions": upload_sessions.stats(),
+    }), 200
+
+
+def send_upload(relative, max_age=UPLOAD_CACHE_MAX_AGE, immutable=True):
+    """
+    Serve a file below the upload folder with cache validators and Range support,
+    or hand it to the front proxy when UPLOAD_SENDFILE is set.
+    """
+    if UPLOAD_SENDFILE == 'x-accel':
+        path = upload_store.local_path(URL_PREFIX + relative)
+        if path is None or not path.is_file():
+            raise NotFound()
+        response = app.response_class(mimetype=mimetypes.guess_type(path.name)[0] or 'application/octet-stream')
+        # nginx serves the `internal` location itself, including Range, ETag and Last-Modified
+        response.headers['X-Accel-Redirect'] = UPLOAD_ACCEL_PREFIX.rstrip('/') + '/' + quote(relative)
+    else:
+        # Conditional (ETag/Last-Modified) and Range requests are answered by send_file
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], relative, as_attachment=False, max_age=max_age)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = immutable
+    return response
 
 @app.route('/uploads/<path:filename>', methods=['GET'])
 def uploaded_file(filename):
+    size = request.args.get('size')
+    if size and size not in DERIVATIVE_SIZES:
+        return jsonify({"msg": f"size must be one of: {', '.join(DERIVATIVE_SIZES)}"}), 400
+    # Partial uploads, resumable sessions and quarantined files are not public.
+    # Normalized first, so ./.incoming/x or a/../.quarantine/x cannot get past the check
+    filename = posixpath.normpath(filename)
+    if filename.startswith(('/', '.')):
+        return jsonify({"msg": "File not found"}), 404
+    if not (UPLOAD_FOLDER / filename).is_file():
+        # A flat upload moved by migrate-uploads, or an original strip-upload-metadata re-addressed
+        target = legacy_target(db, filename) if db is not None else None
+        if target:
+            query = f"?{request.query_string.decode()}" if request.query_string else ''
+            return redirect(f"/{target}{query}", code=301)
     try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename, as_attachment=False)
+        if size:
+            derivative = derivative_pool.get(f'uploads/{filename}', size)
+            if derivative is not None:
+                return send_upload(derivative.relative_to(UPLOAD_FOLDER.resolve()).as_posix())
+            # Not generated yet (or not an image): queue it and serve the original meanwhile,
+            # briefly cacheable so the thumbnail replaces it soon
+            derivative_pool.submit(f'uploads/{filename}')
+            return send_upload(filename, max_age=60, immutable=False)
+        return send_upload(filename)
     except Exception as e:
         return jsonify({"msg": "File not found", "error": str(e)}), 404
 
@@ -1618,6 +1814,7 @@ def reminder_worker_loop():
                         report['id'] = doc.id
                         send_report_email_to_authorities(report)
                         db.collection('requests').document(doc.id).update({'lastReminderAt': firestore.SERVER_TIMESTAMP})
+                        report_cache.invalidate(doc.id)
                         print(f"🔔 Reminder sent for request: {doc.id}")
                     except Exception as e:
                         print(f"❌ Failed to send reminder for {doc.id}: {str(e)}")
@@ -1681,6 +1878,7 @@ def reminder_worker_loop():
                             'lastActionDate': firestore.SERVER_TIMESTAMP,
                             'isCoolOffPeriod': False
                         })
+                        report_cache.invalidate(doc.id)
                         
                         # Trigger email
                         report_copy = data.copy()
@@ -1693,6 +1891,7 @@ def reminder_worker_loop():
                         doc_ref.update({
                             'isCoolOffPeriod': True
                         })
+                        report_cache.update(doc.id, {'isCoolOffPeriod': True})
                         # Trigger warning email specifically for cooloff
                         report_copy = data.copy()
                         report_copy['id'] = doc.id
@@ -1713,6 +1912,86 @@ def start_reminder_worker():
     t = threading.Thread(target=reminder_worker_loop, daemon=True)
     t.start()
 
+def start_report_mirror():
+    # The live mirror is opt-in: it holds every report in memory in each worker
+    if not mirror_enabled():
+        return
+    if db is None:
+        print("⚠️ Report mirror not started because Firestore (db) is not available.")
+        return
+    report_mirror.start(db)
+
+def start_moderation_pool():
+    if db is None:
+        print("⚠️ Image moderation not started because Firestore (db) is not available.")
+        return
+    moderation_pool.start(db, resolve_upload_path, on_verdict=handle_moderation_verdict)
+
+def start_nearby_index():
+    # Built in the background so startup is not blocked by a full collection read
+    if db is None:
+        print("⚠️ Nearby index not built because Firestore (db) is not available.")
+        return
+    if mirror_enabled():
+        # The mirror's listener sees every worker's writes, so no periodic reload is needed
+        report_mirror.add_listener(nearby_index)
+        nearby_index.start(db)
+    else:
+        nearby_index.start(db, refresh_seconds=NEARBY_INDEX_REFRESH_SECONDS)
+
+def start_photo_index():
+    if db is None:
+        print("⚠️ Photo index not built because Firestore (db) is not available.")
+        return
+    if mirror_enabled():
+        report_mirror.add_listener(photo_index)
+        photo_index.start(db)
+    else:
+        photo_index.start(db, refresh_seconds=PHOTO_INDEX_REFRESH_SECONDS)
+
+_worker_services_started = False
+_worker_services_lock = threading.Lock()
+
+def start_worker_services():
+    """Start this process's report mirror, in-memory indexes and background workers, once."""
+    global _worker_services_started
+    with _worker_services_lock:
+        if _worker_services_started:
+            return
+        _worker_services_started = True
+
+    try:
+        start_report_mirror()
+    except Exception as e:
+        print(f"⚠️ Could not start report mirror: {str(e)}")
+
+    try:
+        start_nearby_index()
+    except Exception as e:
+        print(f"⚠️ Could not build nearby index: {str(e)}")
+
+    try:
+        start_photo_index()
+    except Exception as e:
+        print(f"⚠️ Could not build photo index: {str(e)}")
+
+    try:
+        start_moderation_pool()
+    except Exception as e:
+        print(f"⚠️ Could not start image moderation: {str(e)}")
+
+    try:
+        # Every worker sweeps the shared sessions folder; removing a session twice is harmless
+        upload_sessions.start_gc()
+    except Exception as e:
+        print(f"⚠️ Could not start upload session cleanup: {str(e)}")
+
+@app.before_request
+def ensure_worker_services():
+    # gunicorn imports the app without running __main__, so each worker starts them on its first request
+    if not _worker_services_started:
+        start_worker_services()
+
 # ========================= ADMIN PORTAL ENDPOINTS =========================
 
 
@@ -1725,37 +2004,39 @@ def admin_get_complaints():
         current_user = get_jwt()
         department = current_user.get('department')
         status_filter = request.args.get('status', None)
+
+        try:
+            limit = parse_page_size(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            cursor = decode_cursor(cursor) if cursor else None
+        except ValueError:
+            return jsonify({"msg": "Invalid limit or cursor"}), 400
         
-        # Since the app sends capitalized departments (e.g. 'PWD') but admins might 
-        # be registered with lowercase ('pwd'), we'll fetch all and filter in Python
-        # to ensure case-insensitive matching.
-        query = db.collection('requests').stream()
         print(f"DEBUG admin_get_complaints - Dept: {department}, StatusFilter: {status_filter}")
-        complaints = []
-        for doc in query:
-            complaint_data = doc.to_dict()
-            complaint_data['id'] = doc.id
-            
-            # Case-insensitive department check
-            doc_dept_val = complaint_data.get('department')
-            doc_dept = (doc_dept_val if doc_dept_val else '').lower()
-            if department and doc_dept != department.lower():
-                continue
-                
-            # Filter by status if provided
-            if status_filter and complaint_data.get('status') != status_filter:
-                continue
-            
-            complaints.append(complaint_data)
-        
-        # Sort by created date (newest first)
-        complaints.sort(key=lambda x: x.get('createdAt', datetime.utcnow()), reverse=True)
+        filters = {'status': status_filter}
+        if department:
+            filters['department_key'] = normalize_department_key(department)
+
+        # Accept: application/x-ndjson streams the whole listing instead of one page
+        if wants_ndjson():
+            complaints, plan = stream_reports(filters)
+            return ndjson_response(
+                complaints,
+                headers={'X-Query-Strategy': plan['strategy']},
+                on_complete=lambda count: print(f"✓ Streamed {count} complaints (plan={plan['strategy']}, reads={plan.get('documents_read')})")
+            )
+
+        complaints, next_cursor, plan = query_reports(filters, limit=limit, cursor=cursor)
+        print(f"✓ Fetched {len(complaints)} complaints (plan={plan['strategy']}, reads={plan.get('documents_read')})")
         
-        return jsonify({
+        etag = etag_for_reports(complaints, next_cursor)
+        return json_with_etag(etag, lambda: {
             "msg": "Complaints retrieved",
             "count": len(complaints),
-            "complaints": complaints
-        }), 200
+            "complaints": complaints,
+            "next_cursor": next_cursor,
+            "plan": plan
+        })
     
     except Exception as e:
         print(f"Error fetching complaints: {str(e)}")
@@ -1767,14 +2048,11 @@ def admin_get_complaints():
 def admin_get_complaint_detail(complaint_id):
     """Get detailed info about a specific complaint"""
     try:
-        doc = db.collection('requests').document(complaint_id).get()
+        complaint_data = get_report(db, complaint_id)
         
-        if not doc.exists:
+        if complaint_data is None:
             return jsonify({"msg": "Complaint not found"}), 404
         
-        complaint_data = doc.to_dict()
-        complaint_data['id'] = doc.id
-        
         return jsonify({
             "msg": "Complaint details retrieved",
             "complaint": complaint_data
@@ -1804,52 +2082,55 @@ def admin_update_complaint_status(complaint_id):
             'note': f"Status changed to {new_status.replace('_', ' ').title()}. {notes}"
         }
 
-        # Update complaint
-        db.collection('requests').document(complaint_id).update({
+        # The old state is read inside the update transaction, so the analytics
+        # delta is taken against the status this change actually replaced
+        old, complaint = update_report(db, complaint_id, {
             'status': new_status,
             'lastActionDate': firestore.SERVER_TIMESTAMP,
             'statusNotes': notes,
             'escalationHistory': firestore.ArrayUnion([new_history_entry])
         })
+        if old is None:
+            return jsonify({"msg": "Complaint not found"}), 404
+        report_cache.invalidate(complaint_id)
+        nearby_index.update(complaint_id, {'status': new_status})
+        photo_index.update(complaint_id, {'status': new_status})
         
         # Send notification email to reporter
-        doc = db.collection('requests').document(complaint_id).get()
-        if doc.exists:
-            complaint = doc.to_dict()
-            reporter_email = complaint.get('reporter_email')
-            if reporter_email:
-                status_text = new_status.replace('_', ' ').title()
-                msg = Message(
-                    subject=f"Complaint Status Update: {status_text}",
-                    recipients=[reporter_email],
-                    html=f"""
-                    <html>
-                        <body style="font-family: Arial, sans-serif;">
-                            <p>Your complaint '{complaint.get('title')}' status has been updated to: <strong>{status_text}</strong></p>
-                            <p>Notes: {notes}</p>
-                        </body>
-                    </html>
-                    """
-                )
-                mail.send(msg)
-
-            # --- Check for SMS Notification ---
-            user_id = complaint.get('userId')
-            if user_id:
-                user_doc = db.collection('users').document(user_id).get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    phone = user_data.get('phone')
-                    if phone:
-                        try:
-                            from whatsapp_service import send_sms_otp
-                            status_text = new_status.replace('_', ' ').title()
-                            sms_message = f"Smart Public App: Your report '{complaint.get('title')}' status is now {status_text}. "
-                            if notes:
-                                sms_message += f"Admin Note: {notes}"
-                            send_sms_otp(phone, sms_message)
-                        except Exception as sms_err:
-                            print(f"Failed to send SMS to {phone}: {str(sms_err)}")
+        reporter_email = complaint.get('reporter_email')
+        if reporter_email:
+            status_text = new_status.replace('_', ' ').title()
+            msg = Message(
+                subject=f"Complaint Status Update: {status_text}",
+                recipients=[reporter_email],
+                html=f"""
+                <html>
+                    <body style="font-family: Arial, sans-serif;">
+                        <p>Your complaint '{complaint.get('title')}' status has been updated to: <strong>{status_text}</strong></p>
+                        <p>Notes: {notes}</p>
+                    </body>
+                </html>
+                """
+            )
+            mail.send(msg)
+
+        # --- Check for SMS Notification ---
+        user_id = complaint.get('userId')
+        if user_id:
+            user_doc = db.collection('users').document(user_id).get()
+            if user_doc.exists:
+                user_data = user_doc.to_dict()
+                phone = user_data.get('phone')
+                if phone:
+                    try:
+                        from whatsapp_service import send_sms_otp
+                        status_text = new_status.replace('_', ' ').title()
+                        sms_message = f"Smart Public App: Your report '{complaint.get('title')}' status is now {status_text}. "
+                        if notes:
+                            sms_message += f"Admin Note: {notes}"
+                        send_sms_otp(phone, sms_message)
+                    except Exception as sms_err:
+                        print(f"Failed to send SMS to {phone}: {str(sms_err)}")
         
         return jsonify({"msg": "Status updated successfully"}), 200
     
@@ -1870,11 +2151,10 @@ def admin_reply_complaint(complaint_id):
             return jsonify({"msg": "Message is required"}), 400
             
         doc_ref = db.collection('requests').document(complaint_id)
-        doc = doc_ref.get()
-        if not doc.exists:
+        complaint = get_report(db, complaint_id, fresh=True)
+        if complaint is None:
             return jsonify({"msg": "Complaint not found"}), 404
             
-        complaint = doc.to_dict()
         reporter_email = complaint.get('reporter_email')
         
         current_user = get_jwt()
@@ -1889,6 +2169,7 @@ def admin_reply_complaint(complaint_id):
         doc_ref.update({
             'escalationHistory': firestore.ArrayUnion([new_history_entry])
         })
+        report_cache.invalidate(complaint_id)
         
         # Send Email
         if reporter_email:
@@ -1925,73 +2206,48 @@ def admin_get_analytics():
         current_user = get_jwt()
         department = current_user.get('department')
         
-        # Get all complaints for department (case-insensitive)
+        # Pre-aggregated counters maintained on every write (see report_analytics.py)
         print(f"DEBUG admin_get_analytics - Dept: {department}")
-        complaints = []
-        for doc in db.collection('requests').stream():
-            doc_data = doc.to_dict()
-            doc_dept_val = doc_data.get('department')
-            doc_dept = (doc_dept_val if doc_dept_val else '').lower()
-            if department and doc_dept == department.lower():
-                complaints.append(doc_data)
-        
-        # Calculate statistics
-        total_complaints = len(complaints)
-        
-        status_counts = {}
-        priority_counts = {}
-        daily_counts = {}
-        
-        for complaint in complaints:
-            # Status distribution
-            status = complaint.get('status', 'unknown')
-            status_counts[status] = status_counts.get(status, 0) + 1
-            
-            # Priority distribution
-            priority = complaint.get('priority', 'normal')
-            priority_counts[priority] = priority_counts.get(priority, 0) + 1
-            
-            # Daily creation count
-            created_at = complaint.get('createdAt')
-            if created_at:
-                date_key = created_at.strftime('%Y-%m-%d') if isinstance(created_at, datetime) else str(created_at)[:10]
-                daily_counts[date_key] = daily_counts.get(date_key, 0) + 1
-        
-        # Calculate average resolution time
-        resolved_complaints = [c for c in complaints if c.get('status') == 'resolved']
-        avg_resolution_time = 0
-        if resolved_complaints:
-            resolution_times = []
-            for c in resolved_complaints:
-                created = c.get('createdAt')
-                updated = c.get('lastActionDate')
-                if created and updated and isinstance(created, datetime) and isinstance(updated, datetime):
-                    resolution_times.append((updated - created).days)
-            if resolution_times:
-                avg_resolution_time = sum(resolution_times) / len(resolution_times)
-        
-        # High priority unresolved
-        high_priority_unresolved = len([c for c in complaints if c.get('priority') == 'high' and c.get('status') != 'resolved'])
+        department_key = normalize_department_key(department) if department else None
+        if department_key and report_mirror.is_serving():
+            analytics = format_analytics(report_mirror.department_analytics(department_key))
+        else:
+            analytics = get_department_analytics(db, department_key)
         
-        return jsonify({
+        return json_with_etag(etag_for_payload(analytics), lambda: {
             "msg": "Analytics retrieved",
-            "analytics": {
-                "total_complaints": total_complaints,
-                "status_distribution": status_counts,
-                "priority_distribution": priority_counts,
-                "daily_creation_count": daily_counts,
-                "average_resolution_days": round(avg_resolution_time, 2),
-                "high_priority_unresolved": high_priority_unresolved,
-                "resolved_count": len([c for c in complaints if c.get('status') == 'resolved']),
-                "in_progress_count": len([c for c in complaints if c.get('status') == 'in_progress']),
-                "pending_count": len([c for c in complaints if c.get('status') == 'pending'])
-            }
-        }), 200
+            "analytics": analytics
+        })
     
     except Exception as e:
         print(f"Error fetching analytics: {str(e)}")
         return jsonify({"msg": str(e)}), 500
 
+# Heatmap tile for the analytics map
+@app.route('/api/admin/heatmap/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@jwt_required()
+def admin_get_heatmap_tile(z, x, y):
+    """Report density for one map tile of the admin's department (precomputed, see heatmap_tiles.py)"""
+    try:
+        if not is_valid_tile(z, x, y):
+            return jsonify({"msg": f"Invalid tile; zoom must be between {MIN_ZOOM} and {MAX_ZOOM}"}), 400
+
+        current_user = get_jwt()
+        department = current_user.get('department')
+        department_key = normalize_department_key(department) if department else None
+        status = request.args.get('status')
+        statuses = {s.strip() for s in status.split(',') if s.strip()} if status else None
+
+        tile = get_heatmap_tile(db, department_key, z, x, y, statuses)
+        response = json_with_etag(etag_for_payload(tile), lambda: {"tile": tile})
+        # Tiles change slowly; let the browser reuse them briefly before revalidating
+        response.headers['Cache-Control'] = f"private, max-age={HEATMAP_MAX_AGE_SECONDS}"
+        return response
+
+    except Exception as e:
+        print(f"Error fetching heatmap tile: {str(e)}")
+        return jsonify({"msg": str(e)}), 500
+
 # Serve admin portal pages
 @app.route('/admin', methods=['GET'])
 def admin_portal():
@@ -2022,4 +2278,11 @@ if __name__ == '__main__':
     except Exception as e:
         print(f"⚠️ Could not start reminder worker: {str(e)}")
 
+    start_worker_services()
+
+    try:
+        boundary_router.load()
+    except Exception as e:
+        print(f"⚠️ Could not load local body boundaries: {str(e)}")
+
     app.run(debug=False, host='0.0.0.0', port=PORT)
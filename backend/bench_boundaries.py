@@ -0,0 +1,102 @@
+"""
+Benchmark: locating points in local-body boundaries.
+Writes a synthetic boundary file with a grid of detailed polygons over Kerala
+(about as many as its local bodies), then times the STR-tree lookup against a
+linear scan over every polygon, and the cached route() for repeated spots.
+Run with: python bench_boundaries.py [grid side] [vertices per polygon] [queries]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from boundary_router import BoundaryRouter, _polygon_contains
+
+# Roughly Kerala
+LAT_MIN, LAT_MAX, LON_MIN, LON_MAX = 8.2, 12.8, 74.8, 77.4
+
+
+def square(lon0, lat0, lon1, lat1, vertices):
+    """Closed ring along the cell edges with `vertices` points, like a traced boundary."""
+    side = max(1, vertices // 4)
+    ring = []
+    for i in range(side):
+        ring.append((lon0 + (lon1 - lon0) * i / side, lat0))
+    for i in range(side):
+        ring.append((lon1, lat0 + (lat1 - lat0) * i / side))
+    for i in range(side):
+        ring.append((lon1 - (lon1 - lon0) * i / side, lat1))
+    for i in range(side):
+        ring.append((lon0, lat1 - (lat1 - lat0) * i / side))
+    ring.append(ring[0])
+    return ring
+
+
+def write_boundaries(path, side, vertices, rng):
+    d_lat = (LAT_MAX - LAT_MIN) / side
+    d_lon = (LON_MAX - LON_MIN) / side
+    features = []
+    for row in range(side):
+        for col in range(side):
+            lat0 = LAT_MIN + row * d_lat
+            lon0 = LON_MIN + col * d_lon
+            features.append({
+                'type': 'Feature',
+                'geometry': {'type': 'Polygon', 'coordinates': [square(lon0, lat0, lon0 + d_lon, lat0 + d_lat, vertices)]},
+                'properties': {'district': f'D{row // 5}', 'local_body_name': f'LB{row}_{col}', 'local_body_type': 'Grama Panchayat'},
+            })
+    for i in range(200):
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [rng.uniform(LON_MIN, LON_MAX), rng.uniform(LAT_MIN, LAT_MAX)]},
+            'properties': {'office': f'PWD Section {i}', 'department': 'pwd'},
+        })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f)
+
+
+def time_per_call(points, fn):
+    started = time.perf_counter()
+    for lat, lon in points:
+        fn(lat, lon)
+    return (time.perf_counter() - started) / len(points) * 1e6
+
+
+def main():
+    side = int(sys.argv[1]) if len(sys.argv) > 1 else 35
+    vertices = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    queries = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+    rng = random.Random(42)
+
+    fd, path = tempfile.mkstemp(suffix='.geojson')
+    os.close(fd)
+    try:
+        write_boundaries(path, side, vertices, rng)
+        router = BoundaryRouter()
+        started = time.perf_counter()
+        router.load(path)
+        print(f"Loaded {side * side} polygons x {vertices} vertices in {time.perf_counter() - started:.2f}s")
+    finally:
+        os.remove(path)
+
+    points = [(rng.uniform(LAT_MIN, LAT_MAX), rng.uniform(LON_MIN, LON_MAX)) for _ in range(queries)]
+    areas = router._index[0]
+
+    def linear(lat, lon):
+        for properties, polygons in areas:
+            if any(_polygon_contains(polygon, lon, lat) for polygon in polygons):
+                return properties
+        return None
+
+    scan_points = points[:max(1, queries // 50)]
+    print(f"linear scan:  {time_per_call(scan_points, linear):9.1f} us/lookup")
+    print(f"STR-tree:     {time_per_call(points, router.locate):9.1f} us/lookup")
+    print(f"route (cold): {time_per_call(points, lambda lat, lon: router.route(lat, lon, 'pwd')):9.1f} us/lookup")
+    print(f"route (warm): {time_per_call(points, lambda lat, lon: router.route(lat, lon, 'pwd')):9.1f} us/lookup")
+
+
+if __name__ == '__main__':
+    main()
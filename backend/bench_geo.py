@@ -0,0 +1,64 @@
+"""
+Benchmark: one point against N candidates with the old per-candidate
+calculate_distance loop versus one vectorized geo_distance call.
+Run with: python bench_geo.py [n ...]   (defaults to 1k, 10k and 100k)
+"""
+
+import math
+import random
+import sys
+import time
+
+from geo_distance import NUMPY_AVAILABLE, distances_from
+
+ROUNDS = 5
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    # The original scalar implementation from app.py, kept here as the baseline
+    R = 6371.0
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+    dlon = lon2_rad - lon1_rad
+    dlat = lat2_rad - lat1_rad
+    a = math.sin(dlat / 2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def best_of(fn):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(n):
+    rng = random.Random(n)
+    lat, lon = 9.93, 76.26
+    lats = [lat + rng.uniform(-0.5, 0.5) for _ in range(n)]
+    lons = [lon + rng.uniform(-0.5, 0.5) for _ in range(n)]
+
+    loop_time, loop_result = best_of(lambda: [calculate_distance(lat, lon, a, b) for a, b in zip(lats, lons)])
+    vector_time, vector_result = best_of(lambda: distances_from(lat, lon, lats, lons))
+
+    max_error = max(abs(a - b) for a, b in zip(loop_result, vector_result))
+    print(f"{n:>8}  loop {loop_time * 1000:9.2f} ms   vectorized {vector_time * 1000:9.2f} ms   "
+          f"speedup {loop_time / vector_time:6.1f}x   max diff {max_error:.2e} km")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    print(f"Haversine, one point to N candidates (best of {ROUNDS}; "
+          f"{'NumPy' if NUMPY_AVAILABLE else 'no NumPy: pure Python fallback'})")
+    for n in sizes:
+        run(n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Microbenchmark: serialize a 10k-report listing with Flask's default JSON
+provider and with FirestoreJSONProvider (orjson when installed).
+Run with: python bench_json.py [count]
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+
+from json_provider import FirestoreJSONProvider, ORJSON_AVAILABLE
+
+ROUNDS = 5
+
+
+def make_reports(count):
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    reports = []
+    for i in range(count):
+        created = base + timedelta(minutes=i)
+        reports.append({
+            'id': f'req{i:06d}',
+            'title': f'Pothole near junction {i}',
+            'description': 'Large pothole on the main road causing traffic issues. ' * 3,
+            'location': f'Ward {i % 40}, Main Road',
+            'latitude': 10.0 + (i % 1000) / 10000,
+            'longitude': 76.0 + (i % 1000) / 10000,
+            'department': 'pwd',
+            'department_key': 'pwd',
+            'priority': 'high' if i % 7 == 0 else 'normal',
+            'status': ('pending', 'in_progress', 'resolved')[i % 3],
+            'userId': f'user{i % 500}',
+            'reporter_name': 'Citizen',
+            'image_url': f'/uploads/{i}.jpg',
+            'upvotes': i % 13,
+            'createdAt': DatetimeWithNanoseconds.from_rfc3339(created.strftime('%Y-%m-%dT%H:%M:%S.%fZ')),
+            'lastActionDate': created + timedelta(days=1),
+            'updateTime': (created + timedelta(days=1)).isoformat(),
+            'statusNotes': [{'note': 'Assigned to field team', 'by': 'admin'}],
+        })
+    return reports
+
+
+def time_dumps(provider, payload):
+    best = None
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        body = provider.dumps(payload, separators=(',', ':'))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(body.encode('utf-8'))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    app = Flask(__name__)
+    payload = {'requests': make_reports(count), 'next_cursor': None}
+
+    default_time, default_size = time_dumps(DefaultJSONProvider(app), payload)
+    fast_time, fast_size = time_dumps(FirestoreJSONProvider(app), payload)
+
+    # Both providers must produce the same document
+    assert DefaultJSONProvider(app).loads(DefaultJSONProvider(app).dumps(payload)) == \
+        FirestoreJSONProvider(app).loads(FirestoreJSONProvider(app).dumps(payload))
+
+    print(f"Payload: {count} reports (best of {ROUNDS})")
+    print(f"  DefaultJSONProvider:   {default_time * 1000:8.1f} ms  {default_size / 1024:8.0f} KiB")
+    print(f"  FirestoreJSONProvider: {fast_time * 1000:8.1f} ms  {fast_size / 1024:8.0f} KiB"
+          f"  ({'orjson' if ORJSON_AVAILABLE else 'stdlib'})")
+    print(f"  Speedup: {default_time / fast_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: nearby-search latency of the in-memory grid index.
+Indexes N synthetic reports and times 1 km radius queries at random points,
+once spread over a state-sized area and once packed into one city.
+Run with: python bench_nearby.py [reports] [queries]
+"""
+
+import random
+import sys
+import time
+
+from spatial_index import SpatialGrid
+
+STATUSES = ('pending', 'in_progress', 'resolved', 'under_review')
+AREAS = {
+    # Roughly Kerala, and roughly Kochi
+    'state': (8.2, 12.8, 74.8, 77.4),
+    'city': (9.85, 10.15, 76.15, 76.45),
+}
+
+
+def build(n, area, rng):
+    lat_min, lat_max, lon_min, lon_max = area
+    grid = SpatialGrid()
+    for i in range(n):
+        grid.upsert(f'r{i}', {
+            'lat': rng.uniform(lat_min, lat_max),
+            'lon': rng.uniform(lon_min, lon_max),
+            'status': STATUSES[i % len(STATUSES)],
+            'category': 'pwd' if i % 2 else 'kseb',
+            'title': f'Report {i}',
+        })
+    return grid
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run(name, n, queries, rng):
+    area = AREAS[name]
+    started = time.perf_counter()
+    grid = build(n, area, rng)
+    build_time = time.perf_counter() - started
+
+    lat_min, lat_max, lon_min, lon_max = area
+    timings = []
+    found = 0
+    for _ in range(queries):
+        lat = rng.uniform(lat_min, lat_max)
+        lon = rng.uniform(lon_min, lon_max)
+        start = time.perf_counter()
+        found += len(grid.query(lat, lon, 1.0))
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"{name:>6}: {n} reports indexed in {build_time:.1f}s, {found / queries:.0f} open results/query; "
+          f"p50 {percentile(timings, 0.50):.2f} ms  p99 {percentile(timings, 0.99):.2f} ms  "
+          f"max {timings[-1]:.2f} ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    rng = random.Random(42)
+    print(f"1 km radius, {queries} queries")
+    for name in AREAS:
+        run(name, n, queries, rng)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: near-duplicate photo lookup in the multi-index hash table.
+Indexes N synthetic reports with one or two photo hashes each and times
+match() for re-sent photos (a stored hash with a few bits flipped) and for
+new photos, against a linear scan over every stored hash. Synthetic hashes are
+uniformly random; in real dHashes flat rows (sky, road) are mostly zero bits,
+so the skewed run makes each 8-bit row flat with probability 0.4.
+Run with: python bench_photo_index.py [reports] [queries]
+"""
+
+import gc
+import random
+import sys
+import time
+
+from photo_index import HASH_BITS, MIN_SET_BITS, PhotoIndex
+
+STATUSES = ('pending', 'in_progress', 'resolved', 'under_review')
+CATEGORIES = ('pwd', 'kseb', 'water', 'police')
+
+
+def random_hash(rng, skewed):
+    while True:
+        if not skewed:
+            value = rng.getrandbits(64)
+        else:
+            value = 0
+            for _ in range(8):
+                # A flat row has at most one changing gradient
+                row = (1 << rng.randrange(8)) * rng.getrandbits(1) if rng.random() < 0.4 else rng.getrandbits(8)
+                value = (value << 8) | row
+        # Nearly flat images are not hashed in production either
+        if MIN_SET_BITS <= bin(value).count('1') <= HASH_BITS - MIN_SET_BITS:
+            return value
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * 4096
+    except OSError:
+        return 0
+
+
+def flip(rng, value, bits):
+    for position in rng.sample(range(64), bits):
+        value ^= 1 << position
+    return value
+
+
+def build(n, rng, skewed):
+    index = PhotoIndex(max_distance=6)
+    stored = []
+    for i in range(n):
+        hashes = [random_hash(rng, skewed) for _ in range(1 + i % 2)]
+        stored.extend(hashes)
+        index.upsert(f'r{i}', {
+            'image_hashes': [f'{h:016x}' for h in hashes],
+            'status': STATUSES[i % len(STATUSES)],
+            'category': CATEGORIES[i % len(CATEGORIES)],
+        })
+    return index, stored
+
+
+def timed(queries, fn):
+    started = time.perf_counter()
+    found = sum(1 for q in queries if fn(q))
+    return (time.perf_counter() - started) / len(queries) * 1e6, found
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    q = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    rng = random.Random(42)
+    for skewed in (False, True):
+        index = stored = None
+        gc.collect()
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        index, stored = build(n, rng, skewed)
+        build_seconds = time.perf_counter() - started
+        memory = rss_bytes() - rss_before
+
+        resent = [flip(rng, rng.choice(stored), rng.randint(0, 6)) for _ in range(q)]
+        fresh = [random_hash(rng, skewed) for _ in range(q)]
+        label = 'skewed' if skewed else 'uniform'
+        # Freed memory is not returned to the OS, so only the first build's growth is meaningful
+        size = f", ~{memory / 1024 / 1024:.0f} MB" if not skewed else ''
+        print(f"{label}: {n} reports, {len(stored)} hashes indexed in {build_seconds:.1f}s{size}")
+        for name, queries in (('re-sent photo', resent), ('new photo', fresh)):
+            per_query, found = timed(queries, lambda h: index.nearest(h))
+            print(f"  {name:>13}: {per_query:7.1f} µs/query multi-index ({found}/{len(queries)} with a match)")
+            per_match, _ = timed(queries, lambda h: index.match('pwd', [f'{h:016x}'], ('pending', 'in_progress')))
+            print(f"  {'':>13}  {per_match:7.1f} µs/query match() with category and status filter")
+        per_scan, found = timed(resent[:50], lambda h: [s for s in stored if (h ^ s).bit_count() <= 6])
+        print(f"  {'linear scan':>13}: {per_scan:7.1f} µs/query ({found}/50 with a match)")
+
+
+if __name__ == '__main__':
+    main()
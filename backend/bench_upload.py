@@ -0,0 +1,142 @@
+"""
+Benchmark: memory and disk traffic of a large multipart report submission.
+Posts 20 files of 10 MB (200 MB) to a minimal Flask app, once with werkzeug's
+default spooling followed by FileStorage.save() (the old create_request path)
+and once with StreamingUploadRequest committing into the upload store. Each
+mode runs in a fresh process so peak RSS is comparable. A third run sends a
+body whose first file is not a photo, to show how much is read before the
+streaming path refuses it.
+Run with: python bench_upload.py [files] [MB per file]
+"""
+
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BOUNDARY = 'benchboundary7f3a'
+JPEG_HEAD = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00'
+BLOCK = os.urandom(1024 * 1024)
+
+
+class MultipartBody:
+    """File-like multipart body generated on the fly, so the client side holds no copy of it."""
+
+    def __init__(self, files, file_bytes, head=JPEG_HEAD):
+        self.parts = []
+        for i in range(files):
+            header = (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="images"; '
+                      f'filename="photo{i}.jpg"\r\nContent-Type: image/jpeg\r\n\r\n').encode()
+            # A distinct first block per file, so content addressing cannot dedupe them
+            self.parts.append((header, head + i.to_bytes(4, 'big'), file_bytes))
+        self.trailer = f'--{BOUNDARY}--\r\n'.encode()
+        self.length = sum(len(h) + n + 2 for h, _, n in self.parts) + len(self.trailer)
+        self._chunks = self._generate()
+        self._buffer = b''
+        self.sent = 0
+
+    def _generate(self):
+        for header, first, size in self.parts:
+            yield header
+            yield first
+            remaining = size - len(first)
+            while remaining > 0:
+                chunk = BLOCK[:min(remaining, len(BLOCK))]
+                remaining -= len(chunk)
+                yield chunk
+            yield b'\r\n'
+        yield self.trailer
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self.sent += len(data)
+        return data
+
+
+def written_bytes():
+    try:
+        with open('/proc/self/io') as f:
+            return int(next(line for line in f if line.startswith('wchar:')).split()[1])
+    except (OSError, StopIteration):
+        return 0
+
+
+def run_mode(mode, files, file_mb):
+    from flask import Flask, Request, jsonify, request
+    from werkzeug.test import EnvironBuilder
+
+    from upload_ingest import StreamingUploadRequest
+    from upload_store import UploadRejected, UploadStore
+
+    folder = Path(tempfile.mkdtemp())
+    app = Flask(__name__)
+    store = UploadStore(folder)
+    if mode != 'spooled':
+        StreamingUploadRequest.upload_store = store
+        StreamingUploadRequest.max_file_bytes = (file_mb + 1) * 1024 * 1024
+        StreamingUploadRequest.max_files = files
+        app.request_class = StreamingUploadRequest
+    else:
+        app.request_class = Request
+
+    @app.errorhandler(UploadRejected)
+    def rejected(e):
+        return jsonify({'msg': str(e)}), e.status_code
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        saved = 0
+        for f in request.files.getlist('images'):
+            if mode == 'spooled':
+                f.save(str(folder / f.filename))
+            else:
+                store.save(f.stream, f.filename)
+            saved += 1
+        return jsonify({'saved': saved})
+
+    body = MultipartBody(files, file_mb * 1024 * 1024, head=b'MZ\x90\x00' * 4 if mode == 'rejected' else JPEG_HEAD)
+    environ = EnvironBuilder(path='/upload', method='POST').get_environ()
+    environ.update({
+        'wsgi.input': body,
+        'CONTENT_LENGTH': str(body.length),
+        'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+    })
+    status = []
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    written_before = written_bytes()
+    started = time.perf_counter()
+    # Called as a WSGI app so the body is read straight from the generator
+    b''.join(app(environ, lambda code, headers: status.append(code)))
+    elapsed = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    written = written_bytes() - written_before
+    shutil.rmtree(folder)
+    print(f"{mode:>9}: HTTP {status[0].split()[0]}, {body.sent / 1024 / 1024:6.1f} MB read, "
+          f"{written / 1024 / 1024:6.1f} MB written, {elapsed:5.2f}s, "
+          f"peak RSS {rss_after / 1024:6.1f} MB (+{(rss_after - rss_before) / 1024:.1f} MB during the request)")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--mode':
+        run_mode(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+        return
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    file_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f"{files} files x {file_mb} MB = {files * file_mb} MB multipart submission")
+    for mode in ('spooled', 'streaming', 'rejected'):
+        subprocess.run([sys.executable, __file__, '--mode', mode, str(files), str(file_mb)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""
+Offline routing of reports to local bodies from their GPS position.
+Local-body boundaries are read from a GeoJSON file and their bounding boxes
+packed into an STR-tree (sort-tile-recursive R-tree), so locating a point only
+runs the exact point-in-polygon test on the few polygons whose boxes contain
+it. Subdivision offices are Point features in the same file; a report goes to
+the nearest office of its department. Results are cached on coordinates rounded
+to about a metre, so repeated submissions from the same spot are a dict lookup.
+
+Feature properties:
+    Polygon / MultiPolygon: district, local_body_name, local_body_type
+    Point:                  office (a SUBDIVISION_CONTACTS name), department
+"""
+
+import json
+import math
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from department_contacts import normalize_department_key
+from geo import report_coordinates
+from geo_distance import nearest_within
+
+DEFAULT_BOUNDARIES_PATH = Path(__file__).parent / 'data' / 'boundaries.geojson'
+# Entries per STR-tree node
+NODE_CAPACITY = 16
+# Average edges per band of a prepared polygon ring
+EDGES_PER_BAND = 4
+# 5 decimal places is about 1.1 m, well inside the accuracy of a phone GPS fix
+ROUND_DIGITS = 5
+CACHE_SIZE = 65536
+# Offices further away than this are not considered responsible for the spot
+MAX_OFFICE_DISTANCE_KM = 30.0
+
+ROUTING_FIELDS = ('district', 'local_body_name', 'local_body_type', 'department_office')
+
+
+class _Ring:
+    """
+    Polygon ring prepared for ray casting. Edges are bucketed into horizontal
+    bands, so a test only crosses the few edges in the point's band instead of
+    every vertex of a detailed boundary.
+    """
+    __slots__ = ('min_y', 'max_y', 'band_height', 'bands')
+
+    def __init__(self, points):
+        ys = [y for _, y in points]
+        self.min_y = min(ys)
+        self.max_y = max(ys)
+        count = max(1, len(points) // EDGES_PER_BAND)
+        self.band_height = (self.max_y - self.min_y) / count or 1.0
+        self.bands = [[] for _ in range(count)]
+        x1, y1 = points[-1]
+        for x2, y2 in points:
+            for band in range(self._band(min(y1, y2)), self._band(max(y1, y2)) + 1):
+                self.bands[band].append((x1, y1, x2, y2))
+            x1, y1 = x2, y2
+
+    def _band(self, y):
+        return min(len(self.bands) - 1, int((y - self.min_y) / self.band_height))
+
+    def contains(self, x, y):
+        """Ray casting: odd number of edge crossings to the right of the point means inside."""
+        if y < self.min_y or y > self.max_y:
+            return False
+        inside = False
+        for x1, y1, x2, y2 in self.bands[self._band(y)]:
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+        return inside
+
+
+def _polygon_contains(polygon, x, y):
+    """Inside the outer ring and outside every hole."""
+    if not polygon[0].contains(x, y):
+        return False
+    return not any(hole.contains(x, y) for hole in polygon[1:])
+
+
+def _bbox(polygons):
+    xs = [x for polygon in polygons for x, _ in polygon[0]]
+    ys = [y for polygon in polygons for _, y in polygon[0]]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+class STRTree:
+    """
+    Static R-tree bulk-loaded with Sort-Tile-Recursive packing. Nodes are
+    (min_x, min_y, max_x, max_y, children, is_leaf); leaf children are item boxes
+    (min_x, min_y, max_x, max_y, index).
+    """
+
+    def __init__(self, boxes, capacity=NODE_CAPACITY):
+        level = self._pack([(b[0], b[1], b[2], b[3], i) for i, b in enumerate(boxes)], capacity, True)
+        while len(level) > 1:
+            level = self._pack(level, capacity, False)
+        self.root = level[0] if level else None
+
+    @staticmethod
+    def _pack(entries, capacity, leaf):
+        """One tree level: sort by x into vertical slices, then by y within each slice."""
+        if not entries:
+            return []
+        node_count = math.ceil(len(entries) / capacity)
+        slice_size = math.ceil(math.sqrt(node_count)) * capacity
+        entries = sorted(entries, key=lambda e: e[0] + e[2])
+        packed = []
+        for start in range(0, len(entries), slice_size):
+            column = sorted(entries[start:start + slice_size], key=lambda e: e[1] + e[3])
+            for node_start in range(0, len(column), capacity):
+                group = column[node_start:node_start + capacity]
+                packed.append((
+                    min(e[0] for e in group),
+                    min(e[1] for e in group),
+                    max(e[2] for e in group),
+                    max(e[3] for e in group),
+                    group,
+                    leaf,
+                ))
+        return packed
+
+    def query_point(self, x, y):
+        """Indices of the items whose bounding box contains (x, y)."""
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            min_x, min_y, max_x, max_y, children, leaf = stack.pop()
+            if x < min_x or x > max_x or y < min_y or y > max_y:
+                continue
+            if leaf:
+                found.extend(e[4] for e in children if e[0] <= x <= e[2] and e[1] <= y <= e[3])
+            else:
+                stack.extend(children)
+        return found
+
+
+class BoundaryRouter:
+    """Point-in-polygon lookup of local bodies plus nearest subdivision office per department."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        # Areas and their tree are swapped together so a reload never mixes the two
+        self._index = ([], STRTree([]))
+        # {department_key: ([office names], [lats], [lons])}
+        self._offices = {}
+        self.source = None
+        self._route_cached = lru_cache(maxsize=CACHE_SIZE)(self._route)
+
+    @property
+    def ready(self):
+        return self._loaded and bool(self._index[0] or self._offices)
+
+    def load(self, path=None):
+        """(Re)load boundaries and offices from GeoJSON. A missing file leaves routing disabled."""
+        path = Path(path or os.getenv('BOUNDARIES_GEOJSON') or DEFAULT_BOUNDARIES_PATH)
+        areas, boxes, offices = [], [], {}
+        if path.exists():
+            with open(path, encoding='utf-8') as f:
+                collection = json.load(f)
+            for feature in collection.get('features', []):
+                geometry = feature.get('geometry') or {}
+                props = feature.get('properties') or {}
+                kind = geometry.get('type')
+                if kind in ('Polygon', 'MultiPolygon'):
+                    polygons = [geometry['coordinates']] if kind == 'Polygon' else geometry['coordinates']
+                    polygons = [[[(float(x), float(y)) for x, y, *_ in ring] for ring in polygon]
+                                for polygon in polygons if polygon]
+                    if not polygons:
+                        continue
+                    boxes.append(_bbox(polygons))
+                    areas.append(({
+                        'district': props.get('district', ''),
+                        'local_body_name': props.get('local_body_name', ''),
+                        'local_body_type': props.get('local_body_type', ''),
+                    }, [[_Ring(ring) for ring in polygon if len(ring) >= 3] for polygon in polygons]))
+                elif kind == 'Point' and props.get('office'):
+                    lon, lat = geometry['coordinates'][:2]
+                    names, lats, lons = offices.setdefault(normalize_department_key(props.get('department')), ([], [], []))
+                    names.append(props['office'])
+                    lats.append(float(lat))
+                    lons.append(float(lon))
+            print(f"✓ Boundary router: {len(areas)} local bodies, "
+                  f"{sum(len(o[0]) for o in offices.values())} offices from {path}")
+        else:
+            print(f"⚠️ Boundary file {path} not found; reports are routed by the fields the client sends.")
+
+        tree = STRTree(boxes)
+        with self._lock:
+            self._index, self._offices = (areas, tree), offices
+            self.source = str(path) if path.exists() else None
+            self._loaded = True
+            self._route_cached.cache_clear()
+        return len(areas)
+
+    def _ensure_loaded(self):
+        # Workers that never called load() (e.g. the reminder thread in a shell) load on first use
+        if not self._loaded:
+            self.load()
+
+    def locate(self, lat, lon):
+        """District and local body containing the point, or None outside every boundary."""
+        areas, tree = self._index
+        for index in tree.query_point(lon, lat):
+            properties, polygons = areas[index]
+            if any(_polygon_contains(polygon, lon, lat) for polygon in polygons):
+                return properties
+        return None
+
+    def nearest_office(self, lat, lon, department_code):
+        """Name of the nearest subdivision office of the department, or None."""
+        offices = self._offices.get(normalize_department_key(department_code))
+        if not offices:
+            return None
+        names, lats, lons = offices
+        matches = nearest_within(lat, lon, lats, lons, MAX_OFFICE_DISTANCE_KM)
+        return names[matches[0][0]] if matches else None
+
+    def _route(self, lat, lon, department_code):
+        fields = dict(self.locate(lat, lon) or {})
+        office = self.nearest_office(lat, lon, department_code)
+        if office:
+            fields['department_office'] = office
+        return fields
+
+    def route(self, lat, lon, department_code=None):
+        """Routing fields for a point (see ROUTING_FIELDS); {} when nothing is known about it."""
+        self._ensure_loaded()
+        return dict(self._route_cached(round(lat, ROUND_DIGITS), round(lon, ROUND_DIGITS),
+                                       normalize_department_key(department_code)))
+
+    def stats(self):
+        info = self._route_cached.cache_info()
+        return {
+            'ready': self.ready,
+            'source': self.source,
+            'local_bodies': len(self._index[0]),
+            'offices': sum(len(o[0]) for o in self._offices.values()),
+            'cache_hits': info.hits,
+            'cache_misses': info.misses,
+            'cache_size': info.currsize,
+        }
+
+
+boundary_router = BoundaryRouter()
+
+
+def routing_fields(report):
+    """
+    Routing fields the report is missing, resolved from its coordinates.
+    Values the client sent are never overwritten.
+    """
+    missing = [field for field in ROUTING_FIELDS if not report.get(field)]
+    if not missing:
+        return {}
+    coords = report_coordinates(report)
+    if coords is None:
+        return {}
+    resolved = boundary_router.route(coords[0], coords[1], report.get('department_key') or report.get('department'))
+    return {field: resolved[field] for field in missing if resolved.get(field)}
@@ -0,0 +1,113 @@
+"""
+Submission-time duplicate clustering.
+A new report is matched against open reports of the same category in the
+surrounding geohash cells, and failing that against open reports with a
+near-identical photo. A match absorbs the submission with a single write
+using server-side transforms (Increment, ArrayUnion), so simultaneous reports
+of the same issue are all counted and no read-modify-write is needed.
+Submissions with images are only matched once moderation has approved them;
+they are saved first and then folded into the match as a `duplicate`.
+"""
+
+from firebase_admin import firestore
+
+from geo import CLUSTER_RADIUS_KM, neighbor_cells
+from geo_distance import within_radius
+from report_analytics import update_report
+
+REQUESTS_COLLECTION = 'requests'
+# Only reports that are still being worked on absorb new submissions
+CLUSTERABLE_STATUSES = ('pending', 'in_progress')
+REVIEW_STATUS = 'under_review'
+DUPLICATE_STATUS = 'duplicate'
+# A photo match is trusted over noisy GPS, but not across a district
+PHOTO_MATCH_MAX_KM = 5.0
+
+
+def find_cluster_match(db, report):
+    """The nearest open report within the clustering radius as (snapshot, data), or None."""
+    lat = report.get('lat')
+    lon = report.get('lon')
+    if lat is None or lon is None or not report.get('cluster_cell'):
+        return None
+
+    # Only reports in the 3x3 geohash cells around the new one can be within the radius
+    # We can't do an OR query easily in firestore for 'status', so we filter in Python
+    existing_reports = db.collection(REQUESTS_COLLECTION) \
+        .where(filter=firestore.FieldFilter('category', '==', report.get('category'))) \
+        .where(filter=firestore.FieldFilter('cluster_cell', 'in', neighbor_cells(report['cluster_cell']))) \
+        .stream()
+
+    candidates = []
+    for doc in existing_reports:
+        data = doc.to_dict() or {}
+        if data.get('status') not in CLUSTERABLE_STATUSES:
+            continue
+        if data.get('lat') is None or data.get('lon') is None:
+            continue
+        candidates.append((doc, data))
+
+    # One vectorized distance call over all candidates; cluster with the nearest match
+    matches = within_radius(lat, lon,
+                            [c[1]['lat'] for c in candidates],
+                            [c[1]['lon'] for c in candidates],
+                            CLUSTER_RADIUS_KM)
+    return candidates[matches[0]] if matches else None
+
+
+def find_photo_match(db, report, index):
+    """
+    An open report of the same category with a near-identical photo as
+    (snapshot, data), or None. Used when location clustering finds nothing
+    because GPS is missing or off; if both reports have coordinates they must
+    still be within PHOTO_MATCH_MAX_KM.
+    """
+    if not index.ready or not report.get('image_hashes'):
+        return None
+    for report_id, _ in index.match(report.get('category'), report['image_hashes'], CLUSTERABLE_STATUSES):
+        doc = db.collection(REQUESTS_COLLECTION).document(report_id).get()
+        data = (doc.to_dict() or {}) if doc.exists else {}
+        # The index may lag behind another worker's status change
+        if data.get('status') not in CLUSTERABLE_STATUSES or data.get('category') != report.get('category'):
+            continue
+        if None not in (report.get('lat'), report.get('lon'), data.get('lat'), data.get('lon')) and \
+                not within_radius(report['lat'], report['lon'], [data['lat']], [data['lon']], PHOTO_MATCH_MAX_KM):
+            continue
+        return doc, data
+    return None
+
+
+def merge_into_cluster(doc_ref, reporter_email):
+    """
+    Count one more report of an existing issue. Both fields are updated by the
+    server in one write, so concurrent merges cannot overwrite each other.
+    Returns the fields written.
+    """
+    fields = {'upvotes': firestore.Increment(1)}
+    if reporter_email:
+        fields['co_reporters'] = firestore.ArrayUnion([reporter_email])
+    doc_ref.update(fields)
+    return fields
+
+
+def merge_reviewed_duplicate(db, report_id, report, match_doc):
+    """
+    Fold a saved report that has just passed moderation into the open report
+    it duplicates: it becomes `duplicate` with `duplicate_of` set, and the open
+    report counts one more reporter. Nothing happens if an admin has already
+    moved the report out of review. Returns True if it was merged.
+    """
+    def mark_duplicate(current):
+        if current.get('status') != REVIEW_STATUS:
+            return None
+        return {
+            'status': DUPLICATE_STATUS,
+            'duplicate_of': match_doc.id,
+            'lastActionDate': firestore.SERVER_TIMESTAMP,
+        }
+
+    _, duplicate = update_report(db, report_id, mark_duplicate)
+    if duplicate is None:
+        return False
+    merge_into_cluster(match_doc.reference, report.get('reporter_email'))
+    return True
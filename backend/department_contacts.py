@@ -188,6 +188,31 @@ DISTRICT_DATA = {
 }
 
 
+def _build_department_aliases():
+    """Map lowercased display names and their acronyms (e.g. 'kerala water authority') to codes."""
+    aliases = {}
+    for code, contact in DISTRICT_DEFAULTS.items():
+        name = contact.get('name', '').lower()
+        aliases[name] = code
+        if '(' in name and name.endswith(')'):
+            aliases[name[:name.index('(')].strip()] = code
+            aliases[name[name.index('(') + 1:-1].strip()] = code
+    return aliases
+
+DEPARTMENT_ALIASES = _build_department_aliases()
+
+def normalize_department_key(department):
+    """
+    Canonical, indexable department key for a report or admin.
+    The mobile app sends 'PWD' while admins are stored as 'pwd', so everything is
+    lowercased and mapped onto the DISTRICT_DEFAULTS codes where possible.
+    Unknown departments keep their lowercased value so they still match each other.
+    """
+    key = (department or '').strip().lower()
+    if not key or key in DISTRICT_DEFAULTS:
+        return key
+    return DEPARTMENT_ALIASES.get(key, key)
+
 def get_department_contacts(district, local_body_name, department_code, department_office=None):
     """
     Get contact information for a specific department at a localized level.
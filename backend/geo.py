@@ -0,0 +1,145 @@
+"""
+Geohash helpers for locating reports.
+At write time each report gets numeric `lat`/`lon` parsed from `location_text`,
+a full-precision `geohash`, and a `cluster_cell`: the geohash prefix whose 3x3
+neighbourhood always covers the duplicate-clustering radius. Clustering then
+queries those nine cells with an indexed `in` filter instead of streaming the
+whole category.
+"""
+
+import math
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+GEOHASH_PRECISION = 9
+# Reports within this distance of an open report in the same category are clustered
+CLUSTER_RADIUS_KM = 0.05
+# Cells narrow towards the poles; the cluster precision is chosen so the 3x3
+# neighbourhood still covers the radius up to this latitude
+MAX_CLUSTER_LATITUDE = 60.0
+
+
+def parse_location_text(text):
+    """Parse 'lat, lon' as sent by the apps. Returns (lat, lon) or None for free-text locations."""
+    if not text or not isinstance(text, str) or ',' not in text:
+        return None
+    parts = text.split(',')
+    try:
+        lat = float(parts[0].strip())
+        lon = float(parts[1].strip())
+    except ValueError:
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return lat, lon
+
+
+def report_coordinates(report):
+    """(lat, lon) of a report: the stored numeric fields, else parsed from location_text."""
+    lat = report.get('lat')
+    lon = report.get('lon')
+    if lat is not None and lon is not None:
+        return float(lat), float(lon)
+    return parse_location_text(report.get('location_text'))
+
+
+def encode_geohash(lat, lon, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def decode_geohash_bbox(geohash):
+    """Bounding box of a geohash cell as (lat_min, lat_max, lon_min, lon_max)."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def cell_size_km(precision, lat=0.0):
+    """(height, width) in km of a geohash cell at the given latitude."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    height = 180.0 / (1 << lat_bits) * KM_PER_DEGREE
+    width = 360.0 / (1 << lon_bits) * KM_PER_DEGREE * math.cos(math.radians(lat))
+    return height, width
+
+
+def precision_for_radius(radius_km, lat=MAX_CLUSTER_LATITUDE):
+    """Finest precision whose cells are at least radius_km on each side, so 3x3 cells cover the radius."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if min(cell_size_km(precision, lat)) >= radius_km:
+            return precision
+    return 1
+
+
+CLUSTER_PRECISION = precision_for_radius(CLUSTER_RADIUS_KM)
+
+
+def neighbor_cells(geohash):
+    """The cell and its eight neighbours (fewer at the poles)."""
+    lat_min, lat_max, lon_min, lon_max = decode_geohash_bbox(geohash)
+    d_lat = lat_max - lat_min
+    d_lon = lon_max - lon_min
+    center_lat = (lat_min + lat_max) / 2
+    center_lon = (lon_min + lon_max) / 2
+    cells = []
+    for i in (-1, 0, 1):
+        lat = center_lat + i * d_lat
+        if not -90.0 < lat < 90.0:
+            continue
+        for j in (-1, 0, 1):
+            lon = (center_lon + j * d_lon + 180.0) % 360.0 - 180.0
+            cell = encode_geohash(lat, lon, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def geo_fields(location_text):
+    """Fields to store on a report for its coordinates, or {} if location_text is not 'lat, lon'."""
+    coords = parse_location_text(location_text)
+    if coords is None:
+        return {}
+    lat, lon = coords
+    geohash = encode_geohash(lat, lon)
+    return {
+        'lat': lat,
+        'lon': lon,
+        'geohash': geohash,
+        'cluster_cell': geohash[:CLUSTER_PRECISION],
+    }
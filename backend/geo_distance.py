@@ -0,0 +1,82 @@
+"""
+Great-circle (haversine) distances in kilometres.
+The batch functions take arrays of coordinates and compute every distance in
+one vectorized NumPy call, so checking a point against N candidates costs one
+call instead of N. Without NumPy they fall back to a plain Python loop.
+"""
+
+import math
+
+from geo import EARTH_RADIUS_KM
+
+# Optional: NumPy for vectorized distance computations
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance between two points; scalar math is faster than NumPy for a single pair."""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _haversine_arrays(lat1, lon1, lat2, lon2):
+    """Element-wise (broadcasting) haversine over arrays of degrees."""
+    lat1 = np.radians(lat1)
+    lat2 = np.radians(lat2)
+    dlat = lat2 - lat1
+    dlon = np.radians(lon2) - np.radians(lon1)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distances_from(lat, lon, lats, lons):
+    """Distances from one point to each of N candidates. Returns an array (a list without NumPy)."""
+    if not NUMPY_AVAILABLE:
+        return [haversine_km(lat, lon, other_lat, other_lon) for other_lat, other_lon in zip(lats, lons)]
+    return _haversine_arrays(lat, lon, np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+
+
+def pairwise_distances(lats, lons):
+    """N x N distance matrix within one set of points. Memory grows as N^2; keep N to a few thousand."""
+    if not NUMPY_AVAILABLE:
+        points = list(zip(lats, lons))
+        return [[haversine_km(a[0], a[1], b[0], b[1]) for b in points] for a in points]
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    return _haversine_arrays(lats[:, None], lons[:, None], lats[None, :], lons[None, :])
+
+
+def cross_distances(lats1, lons1, lats2, lons2):
+    """M x K distance matrix between two sets of points."""
+    if not NUMPY_AVAILABLE:
+        return [[haversine_km(a, b, c, d) for c, d in zip(lats2, lons2)] for a, b in zip(lats1, lons1)]
+    lats1 = np.asarray(lats1, dtype=np.float64)
+    lons1 = np.asarray(lons1, dtype=np.float64)
+    lats2 = np.asarray(lats2, dtype=np.float64)
+    lons2 = np.asarray(lons2, dtype=np.float64)
+    return _haversine_arrays(lats1[:, None], lons1[:, None], lats2[None, :], lons2[None, :])
+
+
+def nearest_within(lat, lon, lats, lons, radius_km):
+    """(index, distance_km) for candidates within radius_km of the point, nearest first."""
+    distances = distances_from(lat, lon, lats, lons)
+    if not NUMPY_AVAILABLE:
+        matches = [(i, d) for i, d in enumerate(distances) if d <= radius_km]
+        return sorted(matches, key=lambda match: match[1])
+    matches = np.flatnonzero(distances <= radius_km)
+    matches = matches[np.argsort(distances[matches], kind='stable')]
+    return list(zip(matches.tolist(), distances[matches].tolist()))
+
+
+def within_radius(lat, lon, lats, lons, radius_km):
+    """Indices of candidates within radius_km of the point, nearest first."""
+    return [index for index, _ in nearest_within(lat, lon, lats, lons, radius_km)]
@@ -0,0 +1,136 @@
+"""
+Precomputed heatmap tiles for the admin analytics map.
+Reports are bucketed into Web Mercator (slippy map) tiles at every zoom level
+from MIN_ZOOM to MAX_ZOOM. Each tile document holds a TILE_BINS x TILE_BINS grid
+of counts per status for one department. Report writes apply +1/-1 deltas with
+firestore.Increment together with the analytics counters, so serving a tile is
+a single document read.
+"""
+
+import math
+
+from firebase_admin import firestore
+
+from geo import report_coordinates
+
+HEATMAP_COLLECTION = 'heatmap_tiles'
+MIN_ZOOM = 6
+MAX_ZOOM = 14
+# Each 256px tile is divided into TILE_BINS x TILE_BINS cells (8px at 32)
+TILE_BINS = 32
+# Web Mercator cannot represent the poles
+_MAX_LATITUDE = 85.05112878
+
+
+def tile_position(lat, lon, zoom):
+    """(x, y) of the tile containing the point at `zoom`, plus the (col, row) bin inside it."""
+    lat = max(-_MAX_LATITUDE, min(_MAX_LATITUDE, lat))
+    n = 1 << zoom
+    fx = (lon + 180.0) / 360.0 * n
+    lat_rad = math.radians(lat)
+    fy = (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n
+    x = min(int(fx), n - 1)
+    y = min(int(fy), n - 1)
+    col = min(int((fx - x) * TILE_BINS), TILE_BINS - 1)
+    row = min(int((fy - y) * TILE_BINS), TILE_BINS - 1)
+    return x, y, col, row
+
+
+def is_valid_tile(z, x, y):
+    return MIN_ZOOM <= z <= MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+
+
+def tile_doc_id(department_key, z, x, y):
+    return f"{department_key}_{z}_{x}_{y}"
+
+
+def tile_contribution(report, department_key, status):
+    """{(department_key, z, x, y, status, bin): 1} for every zoom level; {} without coordinates."""
+    if not report:
+        return {}
+    coords = report_coordinates(report)
+    if coords is None:
+        return {}
+    lat, lon = coords
+    contribution = {}
+    for z in range(MIN_ZOOM, MAX_ZOOM + 1):
+        x, y, col, row = tile_position(lat, lon, z)
+        contribution[(department_key, z, x, y, status, f"{col}_{row}")] = 1
+    return contribution
+
+
+def _group_by_tile(flat, transform):
+    tiles = {}
+    for (department_key, z, x, y, status, bin_key), amount in flat.items():
+        if not amount:
+            continue
+        counts = tiles.setdefault((department_key, z, x, y), {})
+        counts.setdefault(status, {})[bin_key] = transform(amount)
+    return tiles
+
+
+def apply_tile_delta(batch, db, delta):
+    """Add the Increment writes for a tile delta to `batch`. Returns True if anything changed."""
+    tiles = _group_by_tile(delta, firestore.Increment)
+    for (department_key, z, x, y), counts in tiles.items():
+        doc_ref = db.collection(HEATMAP_COLLECTION).document(tile_doc_id(department_key, z, x, y))
+        batch.set(doc_ref, {
+            'department_key': department_key,
+            'z': z,
+            'x': x,
+            'y': y,
+            'counts': counts,
+        }, merge=True)
+    return bool(tiles)
+
+
+def tile_documents(totals):
+    """Full tile documents for a rebuild from accumulated {(dept, z, x, y, status, bin): count}."""
+    for (department_key, z, x, y), counts in _group_by_tile(totals, lambda a: a).items():
+        yield tile_doc_id(department_key, z, x, y), {
+            'department_key': department_key,
+            'z': z,
+            'x': x,
+            'y': y,
+            'counts': counts,
+        }
+
+
+def format_tile(data, z, x, y, statuses=None):
+    """
+    Compact tile payload: non-empty bins as [col, row, count], summed over the
+    requested statuses (all when None).
+    """
+    summed = {}
+    for status, bins in (data.get('counts') or {}).items():
+        if statuses and status not in statuses:
+            continue
+        for bin_key, count in bins.items():
+            if count:
+                summed[bin_key] = summed.get(bin_key, 0) + count
+
+    cells = []
+    for bin_key, count in summed.items():
+        if count <= 0:
+            continue
+        col, row = bin_key.split('_')
+        cells.append([int(col), int(row), count])
+    cells.sort()
+    return {
+        'z': z,
+        'x': x,
+        'y': y,
+        'bins': TILE_BINS,
+        'cells': cells,
+        'max': max((c[2] for c in cells), default=0),
+        'total': sum(c[2] for c in cells),
+    }
+
+
+def get_heatmap_tile(db, department_key, z, x, y, statuses=None):
+    data = {}
+    if department_key:
+        doc = db.collection(HEATMAP_COLLECTION).document(tile_doc_id(department_key, z, x, y)).get()
+        if doc.exists:
+            data = doc.to_dict() or {}
+    return format_tile(data, z, x, y, statuses)
@@ -0,0 +1,48 @@
+"""
+ETag / If-None-Match helpers for the JSON API.
+List ETags are derived from each report's id and Firestore update time, so an
+unchanged poll is answered with 304 before the body is serialized.
+"""
+
+import hashlib
+import json
+
+from flask import request, jsonify, make_response
+
+
+def etag_for_reports(reports, *extra):
+    """Strong ETag for a result set: count, ids and per-document versions, plus any page context."""
+    digest = hashlib.sha1()
+    digest.update(f"{len(reports)}".encode('utf-8'))
+    for report in reports:
+        version = report.get('updateTime') or report.get('lastActionDate') or ''
+        digest.update(f"|{report.get('id')}@{version}".encode('utf-8'))
+    for value in extra:
+        digest.update(f"|{value}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def etag_for_payload(payload):
+    """ETag for a small payload (one report, an analytics summary) hashed from its content."""
+    raw = json.dumps(payload, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def not_modified(etag):
+    """True if the client already holds the representation with this ETag."""
+    return request.if_none_match.contains_weak(etag)
+
+
+def json_with_etag(etag, build_body, status=200):
+    """
+    Return 304 if the client's If-None-Match matches, otherwise jsonify(build_body()).
+    build_body is only called when a body is actually sent.
+    """
+    if not_modified(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(jsonify(build_body()), status)
+    response.set_etag(etag)
+    # Always revalidate; responses are per-caller when a JWT is involved
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,167 @@
+"""
+Downscaled WebP copies of uploaded images for list views and emails.
+Right after an upload is stored, a small thread pool writes a `thumb` and a
+`medium` version to uploads/derived/<size>/<original path>.webp. Re-encoding
+drops EXIF (camera details, GPS) after the orientation has been applied to the
+pixels. `/uploads/<path>?size=thumb` serves a derivative, falling back to the
+original while it is still being generated. Originals are not touched here;
+their metadata is already stripped when they are stored (upload_metadata).
+"""
+
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Optional: Pillow for thumbnails; without it the originals are served
+try:
+    from PIL import Image, ImageOps
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+    print("⚠️ Pillow not installed. Image thumbnails disabled; originals are served instead.")
+
+DERIVED_DIR = 'derived'
+# Longest side in pixels; smaller images are re-encoded but never upscaled
+SIZES = {'medium': 1280, 'thumb': 320}
+WEBP_QUALITY = {'medium': 80, 'thumb': 70}
+
+
+class DerivativePool:
+    def __init__(self, store, workers=2):
+        self.store = store
+        self.workers = workers
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def derivative_path(self, image, size):
+        source = self.store.local_path(image)
+        if source is None or size not in SIZES:
+            return None
+        relative = source.relative_to(self.store.root.resolve()).as_posix()
+        if relative.startswith(DERIVED_DIR + '/'):
+            return None
+        return self.store.root.resolve() / DERIVED_DIR / size / f"{relative}.webp"
+
+    def generate(self, image):
+        """Write every missing derivative of an image. Returns {size: path} of those that exist."""
+        source = self.store.local_path(image)
+        if not PILLOW_AVAILABLE or source is None or not source.is_file():
+            return {}
+        targets = {size: self.derivative_path(image, size) for size in SIZES}
+        if all(path.exists() for path in targets.values()):
+            return targets
+
+        with Image.open(source) as original:
+            # JPEGs can be decoded at a fraction of their size, which is most of the work
+            original.draft('RGB', (max(SIZES.values()),) * 2)
+            picture = ImageOps.exif_transpose(original)
+            if picture.mode not in ('RGB', 'RGBA'):
+                picture = picture.convert('RGBA' if picture.mode in ('LA', 'PA', 'P') else 'RGB')
+            # Largest first, so each smaller size is resized from the previous one
+            for size in sorted(SIZES, key=SIZES.get, reverse=True):
+                edge = SIZES[size]
+                picture.thumbnail((edge, edge), Image.LANCZOS)
+                target = targets[size]
+                target.parent.mkdir(parents=True, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=target.parent, suffix='.webp')
+                try:
+                    with os.fdopen(fd, 'wb') as out:
+                        # No exif= argument, so no metadata is written
+                        picture.save(out, 'WEBP', quality=WEBP_QUALITY[size], method=4)
+                    os.replace(temp_path, target)
+                    os.chmod(target, 0o644)
+                except BaseException:
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    raise
+                self.bytes_out += target.stat().st_size
+        self.bytes_in += source.stat().st_size
+        self.generated += 1
+        return targets
+
+    def _run(self, image):
+        try:
+            return self.generate(image)
+        except Exception as e:
+            # Videos and unreadable files keep being served as originals
+            self.failed += 1
+            print(f"⚠️ Could not create thumbnails for {image}: {str(e)}")
+            return {}
+        finally:
+            with self._lock:
+                self._futures.pop(image, None)
+
+    def submit(self, image):
+        """Queue derivative generation for an uploaded image; returns its future (None if disabled)."""
+        if not PILLOW_AVAILABLE or self.store.local_path(image) is None:
+            return None
+        with self._lock:
+            future = self._futures.get(image)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='derivatives')
+                future = self._executor.submit(self._run, image)
+                self._futures[image] = future
+            return future
+
+    def get(self, image, size, timeout=0):
+        """
+        Path of a finished derivative, or None. With a timeout, waits that long
+        for a derivative that is being generated (or queues it if missing).
+        """
+        path = self.derivative_path(image, size)
+        if path is None:
+            return None
+        if path.exists():
+            return path
+        if timeout:
+            future = self.submit(image)
+            if future is not None:
+                try:
+                    future.result(timeout=timeout)
+                except Exception:
+                    pass
+            if path.exists():
+                return path
+        return None
+
+    def stats(self):
+        with self._lock:
+            in_flight = len(self._futures)
+        return {
+            'enabled': PILLOW_AVAILABLE,
+            'in_flight': in_flight,
+            'generated': self.generated,
+            'failed': self.failed,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+        }
+
+
+def backfill_derivatives(pool, dry_run=False):
+    """Create missing derivatives for every stored upload. Returns counts."""
+    root = pool.store.root
+    scanned = 0
+    missing = 0
+    for path in sorted(root.rglob('*')):
+        relative = path.relative_to(root)
+        # .incoming and .quarantine hold no servable originals
+        if not path.is_file() or relative.parts[0] == DERIVED_DIR or relative.parts[0].startswith('.'):
+            continue
+        scanned += 1
+        image = 'uploads/' + relative.as_posix()
+        if all(pool.derivative_path(image, size).exists() for size in SIZES):
+            continue
+        missing += 1
+        if not dry_run:
+            pool._run(image)
+    print(f"✓ Derivatives: scanned {scanned} uploads, {'would generate' if dry_run else 'generated'} "
+          f"{missing - (0 if dry_run else pool.failed)}, {pool.failed} failed "
+          f"({pool.bytes_in / 1024 / 1024:.1f} MB of originals -> {pool.bytes_out / 1024 / 1024:.1f} MB of derivatives)")
+    return {'scanned': scanned, 'missing': missing, 'failed': pool.failed}
@@ -0,0 +1,98 @@
+"""
+JSON provider for the Flask app with explicit codecs for Firestore types.
+Uses orjson when it is installed and falls back to the standard library
+encoder otherwise. Output matches Flask's default provider (sorted keys,
+datetimes as HTTP dates) except that orjson writes non-ASCII text as UTF-8
+instead of \\u escapes, which decodes to the same values.
+"""
+
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+from firebase_admin import firestore
+
+# Optional: orjson for faster encoding of large report listings
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+try:
+    from google.cloud.firestore_v1 import DocumentReference, GeoPoint
+except ImportError:
+    DocumentReference = GeoPoint = None
+
+_SENTINEL_TYPES = (type(firestore.SERVER_TIMESTAMP), type(firestore.DELETE_FIELD))
+
+
+def encode_firestore_value(o):
+    """
+    Encode values the JSON encoder does not know. Firestore timestamps
+    (DatetimeWithNanoseconds) are datetimes; SERVER_TIMESTAMP sentinels only
+    show up in local copies of unsaved documents and have no value yet.
+    """
+    if isinstance(o, (datetime, date)):
+        return http_date(o)
+    if isinstance(o, _SENTINEL_TYPES):
+        return None
+    if GeoPoint is not None and isinstance(o, GeoPoint):
+        return {'latitude': o.latitude, 'longitude': o.longitude}
+    if DocumentReference is not None and isinstance(o, DocumentReference):
+        return o.path
+    if hasattr(o, 'ToDatetime'):
+        # protobuf Timestamp
+        return http_date(o.ToDatetime())
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class FirestoreJSONProvider(DefaultJSONProvider):
+    default = staticmethod(encode_firestore_value)
+
+    def dumps(self, obj, **kwargs):
+        option = self._orjson_option(kwargs)
+        if option is not None:
+            try:
+                return orjson.dumps(obj, default=encode_firestore_value, option=option).decode('utf-8')
+            except orjson.JSONEncodeError:
+                pass  # e.g. integers wider than 64 bits; let the stdlib encoder handle it
+        return super().dumps(obj, **kwargs)
+
+    def _orjson_option(self, kwargs):
+        """
+        orjson flags equivalent to the arguments jsonify passes (compact separators
+        or indent=2), or None if orjson is missing or other options were requested.
+        """
+        if orjson is None:
+            return None
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        for key, value in kwargs.items():
+            if key == 'separators' and tuple(value) == (',', ':'):
+                continue
+            if key == 'indent' and value == 2:
+                option |= orjson.OPT_INDENT_2
+                continue
+            return None
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
@@ -0,0 +1,109 @@
+"""
+Maintenance commands for the Public Assets backend.
+Usage: python manage.py <command> [--dry-run]
+"""
+
+import argparse
+import sys
+
+from app import db, upload_store, derivative_pool, upload_sessions
+import image_derivatives
+import migrations
+import reclustering
+import upload_gc
+import report_analytics
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Public Assets backend maintenance commands")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backfill = subparsers.add_parser('backfill-department-keys',
+                                     help="Write the canonical department_key on existing reports")
+    backfill.add_argument('--dry-run', action='store_true', help="Count changes without writing")
+
+    geohashes = subparsers.add_parser('backfill-geohashes',
+                                      help="Write lat/lon, geohash and cluster_cell on existing reports")
+    geohashes.add_argument('--dry-run', action='store_true', help="Count changes without writing")
+
+    hashes = subparsers.add_parser('backfill-image-hashes',
+                                   help="Write perceptual image_hashes on existing reports for duplicate photo matching")
+    hashes.add_argument('--dry-run', action='store_true', help="Count changes without writing")
+
+    rebuild = subparsers.add_parser('rebuild-analytics',
+                                    help="Recompute the per-department analytics aggregates and heatmap tiles from all reports")
+    rebuild.add_argument('--dry-run', action='store_true', help="Scan and count without writing")
+
+    recluster = subparsers.add_parser('recluster',
+                                      help="Merge historical duplicate reports that lie within the clustering radius")
+    recluster.add_argument('--category', help="Only re-cluster this category (default: all)")
+    recluster.add_argument('--radius-m', type=float, default=reclustering.CLUSTER_RADIUS_KM * 1000,
+                           help="Clustering radius in metres (default: %(default)s)")
+    recluster.add_argument('--dry-run', action='store_true', help="Report the clusters without writing")
+    recluster.add_argument('--show', type=int, default=10, help="Print the N largest clusters")
+    recluster.add_argument('--output', help="Write every cluster as a JSON line to this file")
+
+    uploads = subparsers.add_parser('migrate-uploads',
+                                    help="Move flat uploads into content-addressed storage and recount references")
+    uploads.add_argument('--dry-run', action='store_true', help="Hash and count duplicates without moving or writing")
+
+    derivatives = subparsers.add_parser('generate-derivatives',
+                                        help="Create the thumb/medium WebP copies for existing uploads")
+    derivatives.add_argument('--dry-run', action='store_true', help="Count uploads missing derivatives without writing")
+
+    metadata = subparsers.add_parser('strip-upload-metadata',
+                                     help="Strip metadata from existing uploads and move them to their new address")
+    metadata.add_argument('--dry-run', action='store_true', help="Count originals that would change without writing")
+
+    sessions = subparsers.add_parser('collect-upload-sessions',
+                                     help="Delete resumable upload sessions that were abandoned")
+    sessions.add_argument('--dry-run', action='store_true', help="Count abandoned sessions without deleting")
+
+    orphans = subparsers.add_parser('collect-orphaned-uploads',
+                                    help="Quarantine or delete uploaded files that no report references")
+    orphans.add_argument('--grace-hours', type=float, default=48,
+                         help="Only touch files older than this (default: %(default)s)")
+    orphans.add_argument('--delete', action='store_true', help="Delete orphans right away instead of quarantining them")
+    orphans.add_argument('--quarantine-days', type=float, default=7,
+                         help="Delete quarantined files after this many days (default: %(default)s)")
+    orphans.add_argument('--dry-run', action='store_true', help="Report orphans and reclaimable space without changes")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate-derivatives':
+        # Files only; works without Firestore
+        image_derivatives.backfill_derivatives(derivative_pool, dry_run=args.dry_run)
+        return 0
+    if args.command == 'collect-upload-sessions':
+        removed = upload_sessions.collect_garbage(dry_run=args.dry_run)
+        print(f"✓ Upload sessions: {'would remove' if args.dry_run else 'removed'} {removed} abandoned "
+              f"(idle for more than {upload_sessions.ttl_seconds // 3600}h)")
+        return 0
+
+    if db is None:
+        print("❌ Firestore is not available. Check firebaseServiceAccountKey.json.")
+        return 1
+
+    if args.command == 'backfill-department-keys':
+        migrations.backfill_department_keys(db, dry_run=args.dry_run)
+    elif args.command == 'backfill-geohashes':
+        migrations.backfill_geohashes(db, dry_run=args.dry_run)
+    elif args.command == 'backfill-image-hashes':
+        migrations.backfill_image_hashes(db, upload_store, dry_run=args.dry_run)
+    elif args.command == 'recluster':
+        reclustering.recluster_reports(db, category=args.category, radius_km=args.radius_m / 1000,
+                                       dry_run=args.dry_run, show=args.show, output=args.output)
+    elif args.command == 'migrate-uploads':
+        migrations.migrate_uploads(db, upload_store, dry_run=args.dry_run)
+    elif args.command == 'strip-upload-metadata':
+        migrations.strip_upload_metadata(db, upload_store, dry_run=args.dry_run)
+    elif args.command == 'collect-orphaned-uploads':
+        upload_gc.collect_orphaned_uploads(db, upload_store, grace_hours=args.grace_hours, quarantine=not args.delete,
+                                           quarantine_days=args.quarantine_days, dry_run=args.dry_run)
+    elif args.command == 'rebuild-analytics':
+        report_analytics.rebuild_analytics(db, dry_run=args.dry_run)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
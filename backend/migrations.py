@@ -0,0 +1,293 @@
+"""
+One-shot data migrations for the `requests` collection.
+Each migration streams the collection once and writes only the documents that
+need changing, in batches, so it is safe to re-run.
+"""
+
+import os
+import shutil
+import tempfile
+
+from firebase_admin import firestore
+
+from department_contacts import normalize_department_key
+from geo import geo_fields
+from image_derivatives import DERIVED_DIR, SIZES
+from photo_index import PILLOW_AVAILABLE, image_hashes
+from upload_store import CHUNK_SIZE, LEGACY_NAME, UPLOADS_COLLECTION, URL_PREFIX, digest_of, file_digest
+
+REQUESTS_COLLECTION = 'requests'
+# Firestore allows at most 500 writes per batch
+BATCH_SIZE = 400
+
+
+def commit_in_batches(db, updates, dry_run=False, batch_size=BATCH_SIZE):
+    """Apply (doc_ref, fields) updates in batches. Returns the number of documents updated."""
+    written = 0
+    batch = None
+    pending = 0
+    for doc_ref, fields in updates:
+        written += 1
+        if dry_run:
+            continue
+        if batch is None:
+            batch = db.batch()
+        batch.update(doc_ref, fields)
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch = None
+            pending = 0
+    if batch is not None and pending:
+        batch.commit()
+    return written
+
+
+def backfill_department_keys(db, dry_run=False):
+    """Write the canonical `department_key` on reports that are missing it or have a stale value."""
+    scanned = 0
+
+    def updates():
+        nonlocal scanned
+        for doc in db.collection(REQUESTS_COLLECTION).stream():
+            scanned += 1
+            data = doc.to_dict() or {}
+            key = normalize_department_key(data.get('department'))
+            if data.get('department_key') != key:
+                yield doc.reference, {'department_key': key}
+
+    updated = commit_in_batches(db, updates(), dry_run=dry_run)
+    print(f"✓ department_key backfill: scanned {scanned}, {'would update' if dry_run else 'updated'} {updated}")
+    return {'scanned': scanned, 'updated': updated}
+
+
+def backfill_geohashes(db, dry_run=False):
+    """Write lat/lon, geohash and cluster_cell on reports whose location_text holds coordinates."""
+    scanned = 0
+    skipped = 0
+
+    def updates():
+        nonlocal scanned, skipped
+        for doc in db.collection(REQUESTS_COLLECTION).stream():
+            scanned += 1
+            data = doc.to_dict() or {}
+            fields = geo_fields(data.get('location_text'))
+            if not fields:
+                skipped += 1
+                continue
+            if any(data.get(field) != value for field, value in fields.items()):
+                yield doc.reference, fields
+
+    updated = commit_in_batches(db, updates(), dry_run=dry_run)
+    print(f"✓ geohash backfill: scanned {scanned}, {'would update' if dry_run else 'updated'} {updated}, "
+          f"{skipped} without coordinates")
+    return {'scanned': scanned, 'updated': updated, 'skipped': skipped}
+
+
+def backfill_image_hashes(db, store, dry_run=False):
+    """Write the perceptual `image_hashes` of reports with stored photos that do not have them yet."""
+    if not PILLOW_AVAILABLE:
+        print("❌ Pillow is required to hash images: pip install Pillow")
+        return {'scanned': 0, 'updated': 0, 'skipped': 0}
+    scanned = 0
+    skipped = 0
+
+    def updates():
+        nonlocal scanned, skipped
+        for doc in db.collection(REQUESTS_COLLECTION).select(['images', 'image_hashes']).stream():
+            scanned += 1
+            data = doc.to_dict() or {}
+            if not data.get('images') or 'image_hashes' in data:
+                continue
+            hashes = image_hashes(data['images'], store.local_path)
+            if not hashes:
+                # Videos, external links or missing files; recorded so the next run skips them
+                skipped += 1
+            yield doc.reference, {'image_hashes': hashes}
+
+    updated = commit_in_batches(db, updates(), dry_run=dry_run)
+    print(f"✓ image hash backfill: scanned {scanned}, {'would update' if dry_run else 'updated'} {updated}, "
+          f"{skipped} without a hashable photo")
+    return {'scanned': scanned, 'updated': updated, 'skipped': skipped}
+
+
+def migrate_uploads(db, store, dry_run=False):
+    """
+    Copy flat `uploads/<uuid>_<name>` files into content-addressed storage,
+    point report `images` at the new paths and recount every upload's refcount.
+    Each new upload document lists the flat names it replaces in `legacy_names`,
+    so the /uploads route can redirect old links. The flat files are left in
+    place; no report points at them any more, so collect-orphaned-uploads
+    removes them after its grace period. Other files in the folder are not
+    touched. The recount overwrites the counters, so run it while no reports
+    are being created.
+    """
+    moved = {}
+    aliases = {}
+    seen = set()
+    duplicates = 0
+    reclaimable = 0
+    legacy = [path for path in sorted(store.root.iterdir()) if path.is_file() and LEGACY_NAME.match(path.name)]
+    for path in legacy:
+        if dry_run:
+            # Hashed as the real run stores it, after metadata is stripped
+            digest = scrubbed_digest(store, path)
+        else:
+            with open(path, 'rb') as f:
+                image, digest = store.save(f, path.name)[:2]
+            moved[URL_PREFIX + path.name] = image
+            aliases.setdefault(digest, (image, []))[1].append(path.name)
+        if digest in seen:
+            duplicates += 1
+            reclaimable += path.stat().st_size
+        seen.add(digest)
+
+    scanned = 0
+    references = {}
+    paths = {}
+
+    def updates():
+        nonlocal scanned
+        for doc in db.collection(REQUESTS_COLLECTION).select(['images']).stream():
+            scanned += 1
+            images = (doc.to_dict() or {}).get('images') or []
+            new_images = [moved.get(image, image) for image in images]
+            for image in new_images:
+                digest = digest_of(image)
+                if digest:
+                    references[digest] = references.get(digest, 0) + 1
+                    paths[digest] = image
+            if new_images != images:
+                yield doc.reference, {'images': new_images}
+
+    updated = commit_in_batches(db, updates(), dry_run=dry_run)
+
+    if not dry_run:
+        batch = db.batch()
+        pending = 0
+        # Moved files nobody references still get their aliases, for links in old emails
+        for digest in set(references) | set(aliases):
+            fields = {'path': paths.get(digest) or aliases[digest][0], 'refcount': references.get(digest, 0),
+                      'lastReferencedAt': firestore.SERVER_TIMESTAMP}
+            if digest in aliases:
+                fields['legacy_names'] = firestore.ArrayUnion(aliases[digest][1])
+            batch.set(db.collection(UPLOADS_COLLECTION).document(digest), fields, merge=True)
+            pending += 1
+            if pending >= BATCH_SIZE:
+                batch.commit()
+                batch = db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+
+    print(f"✓ Upload migration: {len(legacy)} flat files, {duplicates} duplicates "
+          f"({reclaimable / 1024 / 1024:.1f} MB freed once the flat files are collected); "
+          f"scanned {scanned} reports, {'would update' if dry_run else 'updated'} {updated}; "
+          f"{len(references)} referenced uploads counted")
+    return {'files': len(legacy), 'duplicates': duplicates, 'reclaimable_bytes': reclaimable,
+            'scanned': scanned, 'updated': updated, 'uploads': len(references)}
+
+
+def scrubbed_digest(store, path):
+    """SHA-256 the store would file `path` under: that of a scrubbed temporary copy when uploads are scrubbed."""
+    if store.scrub is None:
+        return file_digest(path)
+    fd, temp_path = tempfile.mkstemp(dir=store.incoming)
+    try:
+        with os.fdopen(fd, 'wb') as temp, open(path, 'rb') as f:
+            shutil.copyfileobj(f, temp, CHUNK_SIZE)
+        store.scrub(temp_path, path.suffix.lower())
+        return file_digest(temp_path)
+    finally:
+        os.remove(temp_path)
+
+
+def strip_upload_metadata(db, store, dry_run=False):
+    """
+    Strip location and camera metadata from content-addressed originals stored
+    before uploads were scrubbed. A stripped file is stored again under the
+    address of its new bytes, like a new upload: reports point at the new path,
+    its refcount moves over and the old path is listed in `legacy_names`, so old
+    links redirect. The old file and its derived copies are then deleted. Flat
+    uploads are stripped by migrate-uploads instead. Run it while no reports are
+    being submitted.
+    """
+    if store.scrub is None:
+        print("❌ The upload store does not strip metadata")
+        return {'scanned': 0, 'stripped': 0, 'updated': 0}
+    root = store.root
+    scanned = 0
+    stripped = 0
+    moved = {}
+    aliases = {}
+    for path in sorted(root.rglob('*')):
+        relative = path.relative_to(root).as_posix()
+        # Derived copies carry no metadata; .incoming and .quarantine are not served
+        if not path.is_file() or relative.split('/', 1)[0] == DERIVED_DIR or relative.startswith('.'):
+            continue
+        old_digest = digest_of(URL_PREFIX + relative)
+        if old_digest is None:
+            continue
+        scanned += 1
+        if dry_run:
+            if scrubbed_digest(store, path) != old_digest:
+                stripped += 1
+                # New path unknown until stored; enough to count the reports that would change
+                moved[URL_PREFIX + relative] = None
+            continue
+        with open(path, 'rb') as f:
+            image, digest = store.save(f, path.name)[:2]
+        if digest == old_digest:
+            continue
+        stripped += 1
+        moved[URL_PREFIX + relative] = image
+        aliases.setdefault(digest, (image, []))[1].append((relative, old_digest))
+
+    scanned_reports = 0
+
+    def updates():
+        nonlocal scanned_reports
+        for doc in db.collection(REQUESTS_COLLECTION).select(['images']).stream():
+            scanned_reports += 1
+            images = (doc.to_dict() or {}).get('images') or []
+            new_images = [moved.get(image, image) for image in images]
+            if new_images != images:
+                yield doc.reference, {'images': new_images}
+
+    updated = commit_in_batches(db, updates(), dry_run=dry_run)
+
+    if moved and not dry_run:
+        uploads = db.collection(UPLOADS_COLLECTION)
+        batch = db.batch()
+        pending = 0
+        for digest, (image, old) in aliases.items():
+            refcount = 0
+            for _, old_digest in old:
+                snapshot = uploads.document(old_digest).get()
+                refcount += ((snapshot.to_dict() or {}).get('refcount') or 0) if snapshot.exists else 0
+                batch.delete(uploads.document(old_digest))
+            # Merged into whatever a clean copy of the same photo already counted
+            batch.set(uploads.document(digest), {
+                'path': image,
+                'refcount': firestore.Increment(refcount),
+                'lastReferencedAt': firestore.SERVER_TIMESTAMP,
+                'legacy_names': firestore.ArrayUnion([name for name, _ in old]),
+            }, merge=True)
+            pending += len(old) + 1
+            if pending >= BATCH_SIZE:
+                batch.commit()
+                batch = db.batch()
+                pending = 0
+        if pending:
+            batch.commit()
+
+        # Only now that nothing points at them; the route redirects their links
+        for old_image in moved:
+            relative = old_image[len(URL_PREFIX):]
+            for victim in [root / relative] + [root / DERIVED_DIR / size / f"{relative}.webp" for size in SIZES]:
+                if victim.exists():
+                    victim.unlink()
+
+    print(f"✓ Upload metadata: scanned {scanned} originals, {'would strip' if dry_run else 'stripped'} {stripped}; "
+          f"scanned {scanned_reports} reports, {'would update' if dry_run else 'updated'} {updated}")
+    return {'scanned': scanned, 'stripped': stripped, 'updated': updated}
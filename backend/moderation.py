@@ -0,0 +1,355 @@
+"""
+Background image moderation for new reports.
+create_request only saves the uploads and queues the report; a small pool of
+worker threads fetches queued reports, sends their images to Cloud Vision
+SafeSearch in batch_annotate_images calls (up to 16 images per call, across
+reports) through one shared client, and writes the verdict back to the report.
+Flagged reports are rejected in the same transaction that applies their
+analytics delta; the caller's on_verdict hook handles the other side effects
+(caches, notifications). Every worker process runs a pool, so a report is
+first claimed in a transaction (moderation_status `checking` with a lease);
+only the claiming worker checks it and writes its verdict. A periodic sweep
+re-queues reports still marked pending, whatever their status, or whose claim
+has expired because the worker died, e.g. after a restart. Images already checked (same SHA-256) are
+answered from the verdict cache without a Vision call.
+"""
+
+import hashlib
+import os
+import queue
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+
+from report_analytics import update_report
+from upload_store import digest_of
+from verdict_cache import verdict_cache
+
+try:
+    from google.cloud import vision
+    VISION_AVAILABLE = True
+except ImportError:
+    vision = None
+    VISION_AVAILABLE = False
+    print("⚠️ Google Cloud Vision not installed. Image moderation disabled.")
+
+REQUESTS_COLLECTION = 'requests'
+REVIEW_STATUS = 'under_review'
+REJECTED_STATUS = 'rejected'
+
+MODERATION_PENDING = 'pending'
+MODERATION_CHECKING = 'checking'
+MODERATION_APPROVED = 'approved'
+MODERATION_REJECTED = 'rejected'
+# A claim older than this belongs to a worker that died mid-check; the sweep hands the report out again
+CLAIM_LEASE_SECONDS = 600
+
+# Vision accepts at most 16 images per batch_annotate_images request
+MAX_IMAGES_PER_CALL = 16
+MAX_BYTES_PER_CALL = 8 * 1024 * 1024
+# After the first report arrives, wait this long for more to fill the batch
+BATCH_WAIT_SECONDS = 0.05
+# Likelihood enum: 1=UNKNOWN, 2=VERY_UNLIKELY, 3=UNLIKELY, 4=POSSIBLE, 5=LIKELY, 6=VERY_LIKELY
+# We block if any of these are LIKELY (5) or VERY_LIKELY (6)
+BLOCK_LIKELIHOOD = 5
+REJECTION_REASON = 'Uploaded images violate our safety policy regarding inappropriate content.'
+
+
+def _claimable(report, now):
+    status = report.get('moderation_status')
+    if status == MODERATION_PENDING:
+        return True
+    claimed_at = report.get('moderation_claimed_at')
+    return status == MODERATION_CHECKING and (claimed_at is None
+                                              or claimed_at < now - timedelta(seconds=CLAIM_LEASE_SECONDS))
+
+
+def is_flagged(annotation):
+    return (annotation['adult'] >= BLOCK_LIKELIHOOD or annotation['violence'] >= BLOCK_LIKELIHOOD
+            or annotation['racy'] >= BLOCK_LIKELIHOOD)
+
+
+class ModerationPool:
+    def __init__(self):
+        self._queue = queue.Queue()
+        # Reports queued or being checked in this process, so the sweep does not add them twice
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._threads = []
+        self.db = None
+        self.on_verdict = None
+        self.resolve_image = None
+        self.processed = 0
+        self.rejected = 0
+        self.api_calls = 0
+        self.errors = 0
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def start(self, db, resolve_image, on_verdict=None, workers=None, sweep_seconds=None):
+        """
+        Start the worker threads and the sweep.
+        resolve_image(path) maps a stored image path to a local file (None to skip it);
+        on_verdict(report_id, report, update) runs after a verdict has been written.
+        """
+        if self._threads:
+            return
+        self.db = db
+        self.resolve_image = resolve_image
+        self.on_verdict = on_verdict
+        workers = workers or int(os.getenv('MODERATION_WORKERS', 2))
+        sweep_seconds = sweep_seconds or int(os.getenv('MODERATION_SWEEP_SECONDS', 300))
+
+        for i in range(workers):
+            t = threading.Thread(target=self._worker_loop, name=f'moderation-{i}', daemon=True)
+            t.start()
+            self._threads.append(t)
+        t = threading.Thread(target=self._sweep_loop, args=(sweep_seconds,), name='moderation-sweep', daemon=True)
+        t.start()
+        print(f"✓ Image moderation: {workers} workers, Vision {'enabled' if VISION_AVAILABLE else 'not installed (images approved)'}")
+
+    def submit(self, report_id):
+        with self._lock:
+            if report_id in self._queued:
+                return False
+            self._queued.add(report_id)
+        self._queue.put(report_id)
+        return True
+
+    def sweep(self):
+        """Queue every report still waiting for moderation or with an expired claim. Returns how many were added."""
+        # Any report status: an admin may have moved the report on before it was checked
+        requests = self.db.collection(REQUESTS_COLLECTION)
+        now = datetime.now(timezone.utc)
+        pending = requests.where(filter=firestore.FieldFilter('moderation_status', '==', MODERATION_PENDING))
+        expired = requests \
+            .where(filter=firestore.FieldFilter('moderation_status', '==', MODERATION_CHECKING)) \
+            .where(filter=firestore.FieldFilter('moderation_claimed_at', '<', now - timedelta(seconds=CLAIM_LEASE_SECONDS)))
+        added = 0
+        for query in (pending, expired):
+            for doc in query.select(['moderation_status', 'moderation_claimed_at']).stream():
+                if _claimable(doc.to_dict() or {}, now) and self.submit(doc.id):
+                    added += 1
+        return added
+
+    def _sweep_loop(self, interval):
+        while True:
+            try:
+                added = self.sweep()
+                if added:
+                    print(f"✓ Moderation sweep queued {added} reports")
+            except Exception as e:
+                print(f"⚠️ Moderation sweep failed: {str(e)}")
+            time.sleep(interval)
+
+    def _next_batch(self):
+        """Block for one report, then take whatever else arrives shortly after."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + BATCH_WAIT_SECONDS
+        while len(batch) < MAX_IMAGES_PER_CALL:
+            try:
+                batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0.001)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self.process(batch)
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Moderation batch failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._queued.difference_update(batch)
+
+    def _get_client(self):
+        # One client for the whole process; creating it opens a new gRPC channel
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = vision.ImageAnnotatorClient()
+        return self._client
+
+    def _annotate(self, contents):
+        """SafeSearch likelihoods for each image; None for images the API could not check."""
+        if not VISION_AVAILABLE or not contents:
+            return [None] * len(contents)
+        # Pinned so cached verdicts stay valid until the model is deliberately changed
+        feature = vision.Feature(type_=vision.Feature.Type.SAFE_SEARCH_DETECTION, model=verdict_cache.model)
+        results = []
+        start = 0
+        while start < len(contents):
+            # Fill the call up to the image and size limits
+            end = start
+            size = 0
+            while end < len(contents) and end - start < MAX_IMAGES_PER_CALL and (end == start or size + len(contents[end]) <= MAX_BYTES_PER_CALL):
+                size += len(contents[end])
+                end += 1
+            requests = [vision.AnnotateImageRequest(image=vision.Image(content=c), features=[feature])
+                        for c in contents[start:end]]
+            self.api_calls += 1
+            started = time.monotonic()
+            try:
+                response = self._get_client().batch_annotate_images(requests=requests)
+                verdict_cache.record_api_call(len(requests), time.monotonic() - started)
+            except Exception as e:
+                print(f"⚠️ Vision API Error: {str(e)}")
+                results.extend([None] * (end - start))
+                start = end
+                continue
+            for item in response.responses:
+                if item.error.message:
+                    print(f"⚠️ Vision API Error: {item.error.message}")
+                    results.append(None)
+                    continue
+                safe = item.safe_search_annotation
+                results.append({'adult': int(safe.adult), 'violence': int(safe.violence), 'racy': int(safe.racy)})
+            start = end
+        return results
+
+    def _claim(self, report_id):
+        """
+        Mark a report as being checked by this worker. The transaction makes sure
+        only one worker of all processes gets it. Returns (report, claim token) or None.
+        """
+        doc_ref = self.db.collection(REQUESTS_COLLECTION).document(report_id)
+        token = secrets.token_hex(8)
+        now = datetime.now(timezone.utc)
+
+        @firestore.transactional
+        def claim(transaction):
+            snapshot = doc_ref.get(transaction=transaction)
+            data = snapshot.to_dict() if snapshot.exists else None
+            if not data or not _claimable(data, now):
+                return None
+            transaction.update(doc_ref, {
+                'moderation_status': MODERATION_CHECKING,
+                'moderation_claim': token,
+                'moderation_claimed_at': now,
+            })
+            return data
+
+        data = claim(self.db.transaction())
+        return None if data is None else (data, token)
+
+    def process(self, report_ids):
+        """Moderate a batch of reports with as few Vision calls as possible and write the verdicts."""
+        reports = []
+        for report_id in report_ids:
+            claimed = self._claim(report_id)
+            if claimed is not None:
+                reports.append((report_id, *claimed))
+
+        # Content-addressed paths carry their hash; older files are hashed from their bytes
+        entries = []
+        contents = {}
+        for index, (_, data, _) in enumerate(reports):
+            for image in data.get('images') or []:
+                path = self.resolve_image(image)
+                if path is None:
+                    continue
+                digest = digest_of(image)
+                if digest is None:
+                    content = _read_image(path, image)
+                    if content is None:
+                        continue
+                    digest = hashlib.sha256(content).hexdigest()
+                    contents[digest] = content
+                entries.append((index, image, path, digest))
+
+        verdicts = verdict_cache.get_many(self.db, [entry[3] for entry in entries])
+
+        # Every uncached image of the batch goes into the same annotate calls, each distinct one once
+        missing = []
+        for _, image, path, digest in entries:
+            if digest in verdicts or digest in missing:
+                continue
+            if digest not in contents:
+                content = _read_image(path, image)
+                if content is None:
+                    continue
+                contents[digest] = content
+            missing.append(digest)
+        annotated = {digest: annotation
+                     for digest, annotation in zip(missing, self._annotate([contents[d] for d in missing]))
+                     if annotation is not None}
+        verdict_cache.put_many(self.db, annotated)
+        verdicts.update(annotated)
+
+        # Unreadable files are left out; images Vision could not check have no verdict
+        checked = [[] for _ in reports]
+        for index, image, _, digest in entries:
+            if digest in verdicts or digest in contents:
+                checked[index].append((image, verdicts.get(digest)))
+
+        for (report_id, _, token), images in zip(reports, checked):
+            flagged = [image for image, annotation in images if annotation and is_flagged(annotation)]
+            verdict = {
+                'moderation_status': MODERATION_REJECTED if flagged else MODERATION_APPROVED,
+                'moderation': {
+                    'checkedAt': firestore.SERVER_TIMESTAMP,
+                    'images': [{'path': image, **(annotation or {'checked': False})} for image, annotation in images],
+                },
+            }
+
+            def verdict_update(current, verdict=verdict, flagged=flagged, token=token):
+                # Our claim expired and another worker took the report over
+                if current.get('moderation_status') != MODERATION_CHECKING or current.get('moderation_claim') != token:
+                    return None
+                update = dict(verdict)
+                # Never overrule an admin who already moved the report on
+                if flagged and current.get('status') == REVIEW_STATUS:
+                    update['status'] = REJECTED_STATUS
+                    update['rejection_reason'] = REJECTION_REASON
+                    update['lastActionDate'] = firestore.SERVER_TIMESTAMP
+                return update
+
+            # A rejection changes the status, so it is written with its analytics delta
+            data, updated = update_report(self.db, report_id, verdict_update)
+            if updated is None:
+                continue
+            # The fields written, as decided against the state the transaction saw
+            update = verdict_update(data)
+            if flagged:
+                print(f"⚠️ Report {report_id} flagged by AI Moderation: {', '.join(flagged)}")
+                self.rejected += 1
+            self.processed += 1
+            if self.on_verdict:
+                try:
+                    self.on_verdict(report_id, data, update)
+                except Exception as e:
+                    print(f"⚠️ Moderation follow-up for {report_id} failed: {str(e)}")
+
+    def stats(self):
+        return {
+            'cache': verdict_cache.stats(),
+            'running': self.running,
+            'vision': VISION_AVAILABLE,
+            'queued': self._queue.qsize(),
+            'processed': self.processed,
+            'rejected': self.rejected,
+            'api_calls': self.api_calls,
+            'errors': self.errors,
+        }
+
+
+def _read_image(path, image):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError as e:
+        print(f"⚠️ Could not read {image} for moderation: {str(e)}")
+        return None
+
+
+moderation_pool = ModerationPool()
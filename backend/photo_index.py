@@ -0,0 +1,301 @@
+"""
+Near-duplicate photo lookup for report clustering.
+Every uploaded image gets a 64-bit difference hash (dHash) when its report is
+created, stored as hex in the report's `image_hashes`. Resized, re-encoded or
+re-sent copies of a photo hash to within a few bits of each other. The index
+keeps the hashes of all reports in memory as a multi-index hash table: each
+hash is split into four 16-bit blocks with one table per block. Two hashes at
+most `max_distance` bits apart must then agree on some block to within
+max_distance // 4 bits, so a query only probes those few buckets instead of
+comparing against every stored hash. A block takes every fourth bit rather
+than two whole pixel rows, because rows of sky or road hash alike and would
+pile up in a few buckets. Like the nearby index it is built from Firestore
+when a worker starts and kept current by the create and status-change paths;
+other workers' writes arrive through the report mirror's listener, or with a
+periodic rebuild when the mirror is off.
+"""
+
+import functools
+import os
+import threading
+import time
+from itertools import combinations
+
+# Optional: Pillow to hash photos; without it reports are clustered by location only
+try:
+    from PIL import Image, ImageOps
+    PILLOW_AVAILABLE = True
+except ImportError:
+    PILLOW_AVAILABLE = False
+    print("⚠️ Pillow not installed. Duplicate photo detection disabled.")
+
+REQUESTS_COLLECTION = 'requests'
+INDEXED_FIELDS = ['image_hashes', 'category', 'status']
+HASH_BITS = 64
+BLOCKS = 4
+BLOCK_BITS = HASH_BITS // BLOCKS
+# Flat or nearly flat images (night shots, lens cap) all hash close to 0 or all ones
+MIN_SET_BITS = 8
+
+
+try:
+    # Python 3.10+
+    _popcount = int.bit_count
+except AttributeError:
+    def _popcount(value):
+        return bin(value).count('1')
+
+
+@functools.lru_cache(maxsize=8192)
+def image_dhash(path):
+    """dHash of an image file as 16 hex digits, or None if it cannot be hashed (videos, damaged files)."""
+    if not PILLOW_AVAILABLE:
+        return None
+    try:
+        with Image.open(path) as original:
+            # A 9x8 thumbnail is all that is needed, so JPEGs are decoded at 1/8 scale
+            original.draft('L', (72, 64))
+            picture = ImageOps.exif_transpose(original).convert('L').resize((9, 8), Image.LANCZOS)
+    except Exception:
+        return None
+    pixels = list(picture.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    if not MIN_SET_BITS <= _popcount(value) <= HASH_BITS - MIN_SET_BITS:
+        return None
+    return f'{value:016x}'
+
+
+def image_hashes(images, resolve_image):
+    """Distinct dHashes of a report's images; resolve_image(path) gives the local file or None."""
+    hashes = []
+    for image in images or []:
+        path = resolve_image(image)
+        digest = image_dhash(str(path)) if path is not None else None
+        if digest and digest not in hashes:
+            hashes.append(digest)
+    return hashes
+
+
+def _parse(hashes):
+    values = []
+    for value in hashes or []:
+        try:
+            values.append(int(value, 16))
+        except (TypeError, ValueError):
+            continue
+    return values
+
+
+# For each byte value, its bits k and k+4 as the 2-bit share of block k (bit p of a hash goes to block p % 4)
+_SPREAD = [tuple(((byte >> block) & 1) | (((byte >> (block + 4)) & 1) << 1) for block in range(BLOCKS))
+           for byte in range(256)]
+
+
+def _block_keys(value):
+    keys = [0] * BLOCKS
+    for byte_index in range(HASH_BITS // 8):
+        shares = _SPREAD[(value >> (byte_index * 8)) & 0xFF]
+        shift = byte_index * 2
+        for block in range(BLOCKS):
+            keys[block] |= shares[block] << shift
+    return keys
+
+
+@functools.lru_cache(maxsize=None)
+def _flip_masks(radius):
+    """Every BLOCK_BITS-bit mask with at most `radius` bits set."""
+    masks = [0]
+    for bits in range(1, radius + 1):
+        for positions in combinations(range(BLOCK_BITS), bits):
+            mask = 0
+            for position in positions:
+                mask |= 1 << position
+            masks.append(mask)
+    return tuple(masks)
+
+
+class PhotoIndex:
+    def __init__(self, max_distance=6):
+        self.max_distance = max_distance
+        self._lock = threading.RLock()
+        # block number -> block value -> hashes with that block
+        self._tables = [{} for _ in range(BLOCKS)]
+        # hash -> tuple of report ids with a photo of that hash
+        self._reports = {}
+        # report id -> (category, status, hashes)
+        self._entries = {}
+        self._replay = None
+        self._thread = None
+        self._built = threading.Event()
+        self.refresh_seconds = 0
+        self.ready = False
+        self.built_at = None
+        self.build_seconds = None
+        self.queries = 0
+        self.matches = 0
+
+    # ---- writes ----
+
+    def upsert(self, report_id, report):
+        """Index (or re-index) a report's photo hashes; reports without any are dropped."""
+        hashes = _parse(report.get('image_hashes'))
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(('upsert', report_id, report))
+            self._remove(report_id)
+            if not hashes:
+                return
+            for value in hashes:
+                owners = self._reports.get(value)
+                if owners is None:
+                    for table, key in zip(self._tables, _block_keys(value)):
+                        table.setdefault(key, []).append(value)
+                    owners = ()
+                # Almost every photo belongs to one report; a tuple is a fraction of a set's size
+                self._reports[value] = owners + (report_id,)
+            self._entries[report_id] = [report.get('category'), report.get('status'), tuple(hashes)]
+
+    def update(self, report_id, fields):
+        """Apply a changed status or category to an indexed report."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(('update', report_id, fields))
+            entry = self._entries.get(report_id)
+            if entry is not None:
+                if 'category' in fields:
+                    entry[0] = fields['category']
+                if 'status' in fields:
+                    entry[1] = fields['status']
+
+    def remove(self, report_id):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(('remove', report_id))
+            self._remove(report_id)
+
+    def _remove(self, report_id):
+        entry = self._entries.pop(report_id, None)
+        if entry is None:
+            return
+        for value in entry[2]:
+            owners = tuple(owner for owner in self._reports[value] if owner != report_id)
+            if owners:
+                self._reports[value] = owners
+                continue
+            del self._reports[value]
+            for table, key in zip(self._tables, _block_keys(value)):
+                bucket = table[key]
+                bucket.remove(value)
+                if not bucket:
+                    del table[key]
+
+    def rebuild(self, db):
+        """Load every report's photo hashes from Firestore and swap in a fresh index."""
+        started = time.monotonic()
+        with self._lock:
+            self._replay = []
+        fresh = PhotoIndex(self.max_distance)
+        try:
+            for doc in db.collection(REQUESTS_COLLECTION).select(INDEXED_FIELDS).stream():
+                data = doc.to_dict() or {}
+                if data.get('image_hashes'):
+                    fresh.upsert(doc.id, data)
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            for op, *args in self._replay:
+                getattr(fresh, op)(*args)
+            self._replay = None
+            self._tables = fresh._tables
+            self._reports = fresh._reports
+            self._entries = fresh._entries
+            self.ready = True
+            self._built.set()
+            self.built_at = time.time()
+            self.build_seconds = round(time.monotonic() - started, 3)
+        print(f"✓ Photo index built: {len(self._reports)} photo hashes of {len(self._entries)} reports "
+              f"({self.build_seconds}s)")
+
+    def start(self, db, refresh_seconds=0):
+        """
+        Build the index in a background thread, then rebuild it every
+        `refresh_seconds` (0: build once). Calling it again does nothing.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.refresh_seconds = refresh_seconds
+            self._thread = threading.Thread(target=self._build_loop, args=(db, refresh_seconds),
+                                            name='photo-index', daemon=True)
+        self._thread.start()
+
+    def wait_ready(self, timeout=None):
+        """Block until the first build has finished, at most `timeout` seconds. Returns whether it has."""
+        return self._built.wait(timeout)
+
+    def _build_loop(self, db, refresh_seconds):
+        while True:
+            try:
+                self.rebuild(db)
+            except Exception as e:
+                print(f"❌ Photo index build failed: {str(e)}")
+            if not refresh_seconds:
+                return
+            time.sleep(refresh_seconds)
+
+    # ---- reads ----
+
+    def nearest(self, value, max_distance=None):
+        """[(distance, hash)] of stored hashes within max_distance bits of `value`."""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        masks = _flip_masks(max_distance // BLOCKS)
+        candidates = []
+        with self._lock:
+            for table, key in zip(self._tables, _block_keys(value)):
+                for bucket in map(table.get, [key ^ mask for mask in masks]):
+                    if bucket:
+                        candidates += bucket
+        # A close hash turns up under several blocks; the set drops the repeats
+        return sorted({(_popcount(value ^ c), c) for c in candidates if _popcount(value ^ c) <= max_distance})
+
+    def match(self, category, hashes, statuses, max_distance=None, limit=5):
+        """
+        Reports of `category` in one of `statuses` with a photo within
+        max_distance bits of any of `hashes`, closest first, as [(report_id, distance)].
+        """
+        best = {}
+        with self._lock:
+            self.queries += 1
+            for value in _parse(hashes):
+                for distance, candidate in self.nearest(value, max_distance):
+                    for report_id in self._reports.get(candidate, ()):
+                        entry_category, status, _ = self._entries[report_id]
+                        if entry_category != category or status not in statuses:
+                            continue
+                        if distance < best.get(report_id, HASH_BITS + 1):
+                            best[report_id] = distance
+            if best:
+                self.matches += 1
+        return sorted(best.items(), key=lambda item: item[1])[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'reports': len(self._entries),
+                'hashes': len(self._reports),
+                'max_distance': self.max_distance,
+                'queries': self.queries,
+                'matches': self.matches,
+                'built_at': self.built_at,
+                'build_seconds': self.build_seconds,
+                'refresh_seconds': self.refresh_seconds,
+            }
+
+
+photo_index = PhotoIndex(max_distance=int(os.getenv('PHOTO_MATCH_DISTANCE', 6)))
@@ -0,0 +1,254 @@
+"""
+Offline re-clustering of duplicate reports.
+create_request only compares a new report with open reports at submission
+time, so older duplicates stay separate. This job loads the coordinates of
+every eligible report, links reports of the same category that lie within the
+clustering radius (a grid of radius-sized cells plus union-find), and merges
+each group into its oldest report: upvotes are summed, co_reporters united, and
+the other reports are marked `duplicate` with `duplicate_of` set.
+"""
+
+import json
+import math
+import time
+
+from firebase_admin import firestore
+
+from clustering import DUPLICATE_STATUS
+from geo import CLUSTER_RADIUS_KM, KM_PER_DEGREE, report_coordinates
+from geo_distance import NUMPY_AVAILABLE, cross_distances, haversine_km
+from migrations import commit_in_batches
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+REQUESTS_COLLECTION = 'requests'
+# Reports still awaiting moderation may be rejected, so they never absorb or join a cluster
+ELIGIBLE_STATUSES = ('pending', 'in_progress')
+# First pass reads only what clustering needs; merge fields are fetched for clustered reports only
+LOAD_FIELDS = ['category', 'status', 'lat', 'lon', 'location_text', 'createdAt']
+MERGE_FIELDS = ['upvotes', 'co_reporters', 'reporter_email', 'merged_from']
+# Cap on distance-matrix entries, so a crowded cell is compared in slices
+MAX_MATRIX_ENTRIES = 1 << 22
+# Below this many pairs plain scalar math beats the overhead of building arrays
+SCALAR_PAIRS = 32
+GET_ALL_CHUNK = 300
+
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+        self.rank = [0] * size
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        root_a = self.find(a)
+        root_b = self.find(b)
+        if root_a == root_b:
+            return
+        if self.rank[root_a] < self.rank[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        if self.rank[root_a] == self.rank[root_b]:
+            self.rank[root_a] += 1
+
+
+def _close_pairs(matrix, radius_km):
+    if NUMPY_AVAILABLE:
+        return np.argwhere(matrix <= radius_km).tolist()
+    return [(a, b) for a, row in enumerate(matrix) for b, d in enumerate(row) if d <= radius_km]
+
+
+def find_clusters(lats, lons, radius_km=CLUSTER_RADIUS_KM):
+    """
+    Groups of point indices (size >= 2) connected by chains of pairs within radius_km.
+    Points are bucketed into cells at least radius_km wide, so every close pair
+    lies in the same or an adjacent cell.
+    """
+    n = len(lats)
+    if n < 2:
+        return []
+    uf = UnionFind(n)
+
+    # Reports at exactly the same spot (e.g. a default device location) are joined
+    # up front, and only one representative per spot is compared by distance
+    spots = {}
+    for i in range(n):
+        first = spots.setdefault((lats[i], lons[i]), i)
+        if first != i:
+            uf.union(first, i)
+    representatives = list(spots.values())
+
+    cell_lat = radius_km / KM_PER_DEGREE
+    widest_lat = min(max(abs(v) for v in lats) + cell_lat, 89.0)
+    cell_lon = cell_lat / max(math.cos(math.radians(widest_lat)), 0.01)
+
+    cells = {}
+    for i in representatives:
+        key = (math.floor(lats[i] / cell_lat), math.floor(lons[i] / cell_lon))
+        cells.setdefault(key, []).append(i)
+
+    # This cell and its four "forward" neighbours, so each pair of cells is compared once
+    offsets = ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1))
+    for (row, col), members in cells.items():
+        for d_row, d_col in offsets:
+            others = members if (d_row, d_col) == (0, 0) else cells.get((row + d_row, col + d_col))
+            if not others or (others is members and len(members) == 1):
+                continue
+            if len(members) * len(others) <= SCALAR_PAIRS:
+                for i in members:
+                    for j in others:
+                        if i != j and haversine_km(lats[i], lons[i], lats[j], lons[j]) <= radius_km:
+                            uf.union(i, j)
+                continue
+            other_lats = [lats[j] for j in others]
+            other_lons = [lons[j] for j in others]
+            rows = max(1, MAX_MATRIX_ENTRIES // len(others))
+            for start in range(0, len(members), rows):
+                chunk = members[start:start + rows]
+                matrix = cross_distances([lats[i] for i in chunk], [lons[i] for i in chunk], other_lats, other_lons)
+                for a, b in _close_pairs(matrix, radius_km):
+                    if chunk[a] != others[b]:
+                        uf.union(chunk[a], others[b])
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(uf.find(i), []).append(i)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def _load_points(db, category, statuses):
+    """Coordinates of eligible reports grouped by category: {category: (ids, lats, lons, created)}."""
+    query = db.collection(REQUESTS_COLLECTION)
+    if category:
+        query = query.where(filter=firestore.FieldFilter('category', '==', category))
+    points = {}
+    scanned = 0
+    for doc in query.select(LOAD_FIELDS).stream():
+        scanned += 1
+        data = doc.to_dict() or {}
+        if data.get('status') not in statuses:
+            continue
+        coords = report_coordinates(data)
+        if coords is None:
+            continue
+        ids, lats, lons, created = points.setdefault(data.get('category'), ([], [], [], []))
+        ids.append(doc.id)
+        lats.append(coords[0])
+        lons.append(coords[1])
+        created.append(data.get('createdAt'))
+    return points, scanned
+
+
+def _canonical_order(report_id, created_at):
+    # Oldest first; reports without a timestamp go last
+    return (created_at is None, created_at, report_id)
+
+
+def _fetch_merge_fields(db, report_ids):
+    collection = db.collection(REQUESTS_COLLECTION)
+    fields = {}
+    for start in range(0, len(report_ids), GET_ALL_CHUNK):
+        refs = [collection.document(report_id) for report_id in report_ids[start:start + GET_ALL_CHUNK]]
+        for doc in db.get_all(refs, field_paths=MERGE_FIELDS):
+            if doc.exists:
+                fields[doc.id] = doc.to_dict() or {}
+    return fields
+
+
+def plan_merges(db, category=None, radius_km=CLUSTER_RADIUS_KM, statuses=ELIGIBLE_STATUSES):
+    """Find duplicate groups and work out the merged values. Returns (merges, stats)."""
+    started = time.monotonic()
+    points, scanned = _load_points(db, category, statuses)
+    loaded = time.monotonic()
+
+    groups = []
+    for group_category, (ids, lats, lons, created) in points.items():
+        for members in find_clusters(lats, lons, radius_km):
+            members.sort(key=lambda i: _canonical_order(ids[i], created[i]))
+            groups.append((group_category, [ids[i] for i in members]))
+    clustered = time.monotonic()
+
+    merge_fields = _fetch_merge_fields(db, [report_id for _, members in groups for report_id in members])
+    merges = []
+    for group_category, members in groups:
+        canonical, duplicates = members[0], members[1:]
+        upvotes = 0
+        co_reporters = []
+        for report_id in members:
+            data = merge_fields.get(report_id, {})
+            upvotes += data.get('upvotes') or 1
+            for email in (data.get('co_reporters') or []) + [data.get('reporter_email')]:
+                if email and email not in co_reporters:
+                    co_reporters.append(email)
+        merged_from = list(merge_fields.get(canonical, {}).get('merged_from') or [])
+        merges.append({
+            'category': group_category,
+            'canonical': canonical,
+            'duplicates': duplicates,
+            'upvotes': upvotes,
+            # What the duplicates add to the canonical report's own upvotes
+            'added_upvotes': upvotes - (merge_fields.get(canonical, {}).get('upvotes') or 1),
+            'co_reporters': co_reporters,
+            'merged_from': merged_from + [d for d in duplicates if d not in merged_from],
+        })
+
+    stats = {
+        'scanned': scanned,
+        'eligible': sum(len(p[0]) for p in points.values()),
+        'clusters': len(merges),
+        'duplicates': sum(len(m['duplicates']) for m in merges),
+        'load_seconds': round(loaded - started, 2),
+        'cluster_seconds': round(clustered - loaded, 2),
+    }
+    return merges, stats
+
+
+def _merge_updates(db, merges):
+    collection = db.collection(REQUESTS_COLLECTION)
+    for merge in merges:
+        # Applied by the server like merge_into_cluster, so a live merge between the read and this write is kept
+        yield collection.document(merge['canonical']), {
+            'upvotes': firestore.Increment(merge['added_upvotes']),
+            'co_reporters': firestore.ArrayUnion(merge['co_reporters']),
+            'merged_from': firestore.ArrayUnion(merge['duplicates']),
+        }
+        for duplicate in merge['duplicates']:
+            yield collection.document(duplicate), {
+                'status': DUPLICATE_STATUS,
+                'duplicate_of': merge['canonical'],
+                'lastActionDate': firestore.SERVER_TIMESTAMP,
+            }
+
+
+def recluster_reports(db, category=None, radius_km=CLUSTER_RADIUS_KM, dry_run=False, show=10, output=None):
+    """Find and merge duplicate reports. With dry_run nothing is written; `output` gets one JSON line per cluster."""
+    merges, stats = plan_merges(db, category=category, radius_km=radius_km)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            for merge in merges:
+                f.write(json.dumps(merge) + '\n')
+
+    for merge in sorted(merges, key=lambda m: len(m['duplicates']), reverse=True)[:show]:
+        print(f"  [{merge['category']}] {merge['canonical']} <- {len(merge['duplicates'])} duplicates "
+              f"(upvotes {merge['upvotes']}, {len(merge['co_reporters'])} reporters)")
+
+    started = time.monotonic()
+    written = commit_in_batches(db, _merge_updates(db, merges), dry_run=dry_run)
+    stats['written'] = 0 if dry_run else written
+    stats['write_seconds'] = round(time.monotonic() - started, 2)
+
+    print(f"✓ Re-clustering: scanned {stats['scanned']}, {stats['eligible']} with coordinates, "
+          f"{stats['clusters']} clusters, {stats['duplicates']} duplicates "
+          f"{'would be merged (dry run)' if dry_run else 'merged'} "
+          f"[load {stats['load_seconds']}s, cluster {stats['cluster_seconds']}s, write {stats['write_seconds']}s]")
+    if not dry_run and merges:
+        print("  Run `python manage.py rebuild-analytics` to refresh the dashboard counters.")
+    return stats
@@ -0,0 +1,290 @@
+"""
+Incrementally maintained analytics for the admin dashboard.
+One document per department_key in the `analytics` collection holds status,
+priority and daily counters plus resolution-time totals. Every write path
+applies the difference between a report's old and new state with
+firestore.Increment, so the analytics endpoint is a single document read.
+The same batch updates the department's heatmap tiles (see heatmap_tiles).
+Changes to existing reports use update_report(), which reads the old state and
+writes both the report and the increments in one transaction.
+"""
+
+import re
+from datetime import datetime, timezone
+
+from firebase_admin import firestore
+
+from department_contacts import normalize_department_key
+from heatmap_tiles import HEATMAP_COLLECTION, tile_contribution, apply_tile_delta, tile_documents
+
+ANALYTICS_COLLECTION = 'analytics'
+REQUESTS_COLLECTION = 'requests'
+
+# Aggregate document for reports without a department (Firestore ids cannot be empty)
+UNASSIGNED_KEY = '_unassigned'
+
+_UNSAFE_KEY_CHARS = re.compile(r'[^A-Za-z0-9_-]')
+
+
+def _safe_key(value, default):
+    """Map keys are user supplied (priority, status); keep them valid Firestore field names."""
+    key = str(value) if value else default
+    return _UNSAFE_KEY_CHARS.sub('_', key) or default
+
+
+def _department_key(report):
+    """Reports written before department_key existed fall back to normalizing `department`."""
+    return report.get('department_key') or normalize_department_key(report.get('department')) or UNASSIGNED_KEY
+
+
+def _to_datetime(value, now):
+    if value is firestore.SERVER_TIMESTAMP:
+        return now
+    if hasattr(value, 'ToDatetime'):
+        return value.ToDatetime().replace(tzinfo=timezone.utc)
+    if isinstance(value, datetime):
+        return value
+    return None
+
+
+def report_contribution(report, now=None):
+    """
+    The counters a single report adds to its department's aggregate,
+    as {(map_name, key) or (field,): amount}. Mirrors the old full-scan computation.
+    """
+    if not report:
+        return {}
+    now = now or datetime.now(timezone.utc)
+    status = report.get('status') or 'unknown'
+    priority = report.get('priority') or 'normal'
+
+    contribution = {
+        ('total',): 1,
+        ('status_counts', _safe_key(status, 'unknown')): 1,
+        ('priority_counts', _safe_key(priority, 'normal')): 1,
+    }
+
+    created_raw = report.get('createdAt')
+    created = _to_datetime(created_raw, now)
+    if created:
+        contribution[('daily_counts', created.strftime('%Y-%m-%d'))] = 1
+    elif created_raw:
+        contribution[('daily_counts', _safe_key(str(created_raw)[:10], 'unknown'))] = 1
+
+    if priority == 'high' and status != 'resolved':
+        contribution[('high_priority_unresolved',)] = 1
+
+    if status == 'resolved':
+        updated = _to_datetime(report.get('lastActionDate'), now)
+        if created and updated:
+            contribution[('resolution_days_sum',)] = (updated - created).days
+            contribution[('resolution_count',)] = 1
+
+    return contribution
+
+
+def _tile_contribution(report):
+    if not report:
+        return {}
+    return tile_contribution(report, _department_key(report), _safe_key(report.get('status'), 'unknown'))
+
+
+def _nest(flat, transform):
+    """Turn {(map, key): amount} into the nested dict shape Firestore expects."""
+    nested = {}
+    for path, amount in flat.items():
+        if len(path) == 1:
+            nested[path[0]] = transform(amount)
+        else:
+            nested.setdefault(path[0], {})[path[1]] = transform(amount)
+    return nested
+
+
+def _apply_delta(batch, db, department_key, delta):
+    delta = {path: amount for path, amount in delta.items() if amount}
+    if not delta:
+        return False
+    doc_ref = db.collection(ANALYTICS_COLLECTION).document(department_key)
+    batch.set(doc_ref, _nest(delta, firestore.Increment), merge=True)
+    return True
+
+
+def _stage_report_change(writer, db, old_report, new_report):
+    """Add the aggregate difference between two states of one report to a batch or transaction."""
+    now = datetime.now(timezone.utc)
+    old_key = _department_key(old_report or {})
+    new_key = _department_key(new_report or {})
+    old_contribution = report_contribution(old_report, now)
+    new_contribution = report_contribution(new_report, now)
+
+    changed = False
+    if old_report and old_key != new_key:
+        changed |= _apply_delta(writer, db, old_key, {p: -a for p, a in old_contribution.items()})
+        old_contribution = {}
+    if new_report:
+        delta = dict(new_contribution)
+        for path, amount in old_contribution.items():
+            delta[path] = delta.get(path, 0) - amount
+        changed |= _apply_delta(writer, db, new_key, delta)
+
+    tile_delta = _tile_contribution(new_report)
+    for path, amount in _tile_contribution(old_report).items():
+        tile_delta[path] = tile_delta.get(path, 0) - amount
+    changed |= apply_tile_delta(writer, db, tile_delta)
+    return changed
+
+
+def record_report_change(db, old_report, new_report):
+    """
+    Apply the aggregate difference between two states of one report.
+    Pass old_report=None for a new report. Handles reports moving between departments.
+    Changes to an existing report go through update_report instead, so the old
+    state is the one the update actually replaced.
+    """
+    batch = db.batch()
+    if _stage_report_change(batch, db, old_report, new_report):
+        batch.commit()
+
+
+def update_report(db, report_id, changes):
+    """
+    Update a report and its department aggregate in one transaction.
+    `changes` is the dict of fields to write, or a function of the current
+    report returning that dict (or None to leave the report alone). The old
+    state is read inside the transaction, so two concurrent status changes
+    cannot both subtract the same old status. Returns (old, new) reports;
+    (None, None) if the report does not exist, (old, None) if nothing was written.
+    """
+    doc_ref = db.collection(REQUESTS_COLLECTION).document(report_id)
+
+    @firestore.transactional
+    def apply(transaction):
+        snapshot = doc_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return None, None
+        old = {**(snapshot.to_dict() or {}), 'id': snapshot.id}
+        update = changes(old) if callable(changes) else changes
+        if not update:
+            return old, None
+        new = {**old, **update}
+        transaction.update(doc_ref, update)
+        try:
+            _stage_report_change(transaction, db, old, new)
+        except Exception as e:
+            # Analytics must never fail a user-facing write; a rebuild repairs them
+            print(f"⚠️ Analytics update failed (run `python manage.py rebuild-analytics`): {str(e)}")
+        return old, new
+
+    return apply(db.transaction())
+
+
+def record_clustered_report(db, existing_report):
+    """Count a submission that was merged into an existing report instead of creating one."""
+    db.collection(ANALYTICS_COLLECTION).document(_department_key(existing_report)).set(
+        {'clustered_reports': firestore.Increment(1)}, merge=True
+    )
+
+
+def safe_record_report_change(db, old_report, new_report):
+    """Analytics must never fail a user-facing write; log and rely on a rebuild instead."""
+    try:
+        record_report_change(db, old_report, new_report)
+    except Exception as e:
+        print(f"⚠️ Analytics update failed (run `python manage.py rebuild-analytics`): {str(e)}")
+
+
+def rebuild_analytics(db, dry_run=False):
+    """
+    Recompute every department aggregate and heatmap tile from scratch with one
+    pass over the reports. Aggregates and tiles no report contributes to any
+    more are deleted.
+    """
+    totals = {}
+    tile_totals = {}
+    scanned = 0
+    now = datetime.now(timezone.utc)
+    for doc in db.collection(REQUESTS_COLLECTION).stream():
+        scanned += 1
+        data = doc.to_dict() or {}
+        department_totals = totals.setdefault(_department_key(data), {})
+        for path, amount in report_contribution(data, now).items():
+            department_totals[path] = department_totals.get(path, 0) + amount
+        for path, amount in _tile_contribution(data).items():
+            tile_totals[path] = tile_totals.get(path, 0) + amount
+
+    # Clustered submissions leave no trace on the reports themselves, so carry them over
+    existing = []
+    for doc in db.collection(ANALYTICS_COLLECTION).stream():
+        existing.append(doc.id)
+        clustered = (doc.to_dict() or {}).get('clustered_reports')
+        if clustered:
+            totals.setdefault(doc.id, {})[('clustered_reports',)] = clustered
+    # Departments whose reports were all deleted or moved to another key
+    stale = [department_key for department_key in existing if department_key not in totals]
+    if not dry_run:
+        for department_key, flat in totals.items():
+            db.collection(ANALYTICS_COLLECTION).document(department_key).set(_nest(flat, lambda a: a))
+        for department_key in stale:
+            db.collection(ANALYTICS_COLLECTION).document(department_key).delete()
+
+    tiles = _rewrite_heatmap_tiles(db, tile_totals, dry_run)
+    print(f"✓ Analytics rebuild: scanned {scanned} reports across {len(totals)} departments, "
+          f"{len(stale)} stale departments removed, {tiles} heatmap tiles{' (dry run)' if dry_run else ''}")
+    return {'scanned': scanned, 'departments': len(totals), 'stale_departments': len(stale), 'heatmap_tiles': tiles}
+
+
+def _rewrite_heatmap_tiles(db, tile_totals, dry_run, batch_size=400):
+    """Replace every heatmap tile document; tiles that are now empty are deleted."""
+    documents = dict(tile_documents(tile_totals))
+    if dry_run:
+        return len(documents)
+    collection = db.collection(HEATMAP_COLLECTION)
+    batch = db.batch()
+    pending = 0
+    stale = (doc.id for doc in collection.stream() if doc.id not in documents)
+    writes = [(doc_id, None) for doc_id in stale] + list(documents.items())
+    for doc_id, data in writes:
+        if data is None:
+            batch.delete(collection.document(doc_id))
+        else:
+            batch.set(collection.document(doc_id), data)
+        pending += 1
+        if pending >= batch_size:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return len(documents)
+
+
+def get_department_analytics(db, department_key):
+    """Read one aggregate document and shape it like the admin analytics response."""
+    data = {}
+    if department_key:
+        doc = db.collection(ANALYTICS_COLLECTION).document(department_key).get()
+        if doc.exists:
+            data = doc.to_dict() or {}
+    return format_analytics(data)
+
+
+def format_analytics(data):
+    """Shape an aggregate document like the admin analytics response."""
+    status_counts = {k: v for k, v in (data.get('status_counts') or {}).items() if v}
+    priority_counts = {k: v for k, v in (data.get('priority_counts') or {}).items() if v}
+    daily_counts = {k: v for k, v in sorted((data.get('daily_counts') or {}).items()) if v}
+    resolution_count = data.get('resolution_count', 0)
+    avg_resolution_time = data.get('resolution_days_sum', 0) / resolution_count if resolution_count else 0
+
+    return {
+        "total_complaints": data.get('total', 0),
+        "status_distribution": status_counts,
+        "priority_distribution": priority_counts,
+        "daily_creation_count": daily_counts,
+        "average_resolution_days": round(avg_resolution_time, 2),
+        "high_priority_unresolved": data.get('high_priority_unresolved', 0),
+        "resolved_count": status_counts.get('resolved', 0),
+        "in_progress_count": status_counts.get('in_progress', 0),
+        "pending_count": status_counts.get('pending', 0),
+        "clustered_reports": data.get('clustered_reports', 0)
+    }
@@ -0,0 +1,130 @@
+"""
+In-process read-through cache for single report documents.
+Bounded LRU with a TTL, keyed by document id. Write paths update entries in
+place when they know the final values, and invalidate them when the write used
+server-side transforms (SERVER_TIMESTAMP, ArrayUnion, Increment).
+The TTL bounds staleness across gunicorn workers, which each hold their own cache,
+so only read handlers are served from it: write paths fetch the document fresh.
+"""
+
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from firebase_admin import firestore
+
+from report_queries import snapshot_to_report
+
+REQUESTS_COLLECTION = 'requests'
+
+# Values whose result is only known server-side after the write
+_TRANSFORM_TYPES = (
+    type(firestore.SERVER_TIMESTAMP),
+    type(firestore.DELETE_FIELD),
+    firestore.Increment,
+    firestore.ArrayUnion,
+    firestore.ArrayRemove,
+)
+
+
+class ReportCache:
+    def __init__(self, max_entries=1000, ttl_seconds=60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, report_id):
+        """Return a copy of the cached report, or None on a miss or expired entry."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(report_id)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[report_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(report_id)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, report_id, report):
+        with self._lock:
+            self._entries[report_id] = (time.monotonic() + self.ttl_seconds, copy.deepcopy(report))
+            self._entries.move_to_end(report_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, report_id, fields):
+        """Apply plain field updates to a cached entry; entries with transforms are dropped instead."""
+        if any(not _is_plain_value(value) for value in fields.values()):
+            self.invalidate(report_id)
+            return
+        with self._lock:
+            entry = self._entries.get(report_id)
+            if entry is None:
+                return
+            entry[1].update(copy.deepcopy(fields))
+            # The server-assigned version of this write is unknown here
+            entry[1].pop('updateTime', None)
+
+    def invalidate(self, report_id):
+        with self._lock:
+            if self._entries.pop(report_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def _is_plain_value(value):
+    if isinstance(value, dict):
+        return all(_is_plain_value(v) for v in value.values())
+    if isinstance(value, list):
+        return all(_is_plain_value(v) for v in value)
+    return not isinstance(value, _TRANSFORM_TYPES)
+
+
+report_cache = ReportCache(
+    max_entries=int(os.getenv('REPORT_CACHE_SIZE', 1000)),
+    ttl_seconds=int(os.getenv('REPORT_CACHE_TTL_SECONDS', 60))
+)
+
+
+def get_report(db, report_id, fresh=False):
+    """
+    Read-through fetch of one report as a dict with its id, or None if it does not exist.
+    fresh=True skips the cache (and refreshes it) for write paths that act on the current state.
+    """
+    cached = None if fresh else report_cache.get(report_id)
+    if cached is not None:
+        return cached
+
+    doc = db.collection(REQUESTS_COLLECTION).document(report_id).get()
+    if not doc.exists:
+        return None
+    report = snapshot_to_report(doc)
+    report_cache.put(report_id, report)
+    return copy.deepcopy(report)
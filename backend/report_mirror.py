@@ -0,0 +1,224 @@
+"""
+Optional live in-memory mirror of the `requests` and `analytics` collections.
+A Firestore snapshot listener keeps every report in memory with secondary
+indexes on the fields the list endpoints filter by, so those endpoints become
+dictionary lookups instead of network queries. Enable with
+REQUESTS_MIRROR_ENABLED=true. While the listener is warming up or has dropped,
+callers fall back to direct Firestore queries. Other in-memory indexes can
+follow the same listener with add_listener().
+"""
+
+import json
+import os
+import threading
+import time
+
+from report_queries import created_at_sort_key, paginate, snapshot_to_report
+
+REQUESTS_COLLECTION = 'requests'
+ANALYTICS_COLLECTION = 'analytics'
+INDEXED_FIELDS = ('department', 'department_key', 'status', 'userId')
+# Minimum gap between attempts to re-subscribe after the listener drops
+RESTART_BACKOFF_SECONDS = 30
+
+
+def _approx_size(data):
+    """Rough in-memory footprint of a document: its JSON-encoded length."""
+    try:
+        return len(json.dumps(data, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class ReportMirror:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reports = {}
+        self._sizes = {}
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        self._analytics = {}
+        self._watches = []
+        self._listeners = []
+        self._db = None
+        self._ready = set()
+        self._last_event_at = None
+        self._last_start_at = 0.0
+        self.approx_bytes = 0
+        self.restarts = 0
+
+    # ---- lifecycle ----
+
+    def start(self, db):
+        """Subscribe to both collections. The mirror is ready once each sends its initial snapshot."""
+        with self._lock:
+            self._db = db
+            self._last_start_at = time.monotonic()
+            self._stop_watches()
+            self._clear()
+            self._watches = [
+                db.collection(REQUESTS_COLLECTION).on_snapshot(self._on_requests_snapshot),
+                db.collection(ANALYTICS_COLLECTION).on_snapshot(self._on_analytics_snapshot),
+            ]
+        print("🔭 Report mirror subscribed to Firestore; warming up...")
+
+    def stop(self):
+        with self._lock:
+            self._stop_watches()
+            self._clear()
+
+    def _stop_watches(self):
+        for watch in self._watches:
+            try:
+                watch.unsubscribe()
+            except Exception:
+                pass
+        self._watches = []
+
+    def _clear(self):
+        self._reports = {}
+        self._sizes = {}
+        self._indexes = {field: {} for field in INDEXED_FIELDS}
+        self._analytics = {}
+        self._ready = set()
+        self.approx_bytes = 0
+
+    def is_active(self):
+        return bool(self._watches) and all(getattr(w, 'is_active', True) for w in self._watches)
+
+    def is_ready(self):
+        return self._ready == {REQUESTS_COLLECTION, ANALYTICS_COLLECTION}
+
+    def is_serving(self):
+        """True if reads can be served from memory; re-subscribes (with backoff) if the listener dropped."""
+        if self._db is None:
+            return False
+        if self.is_active():
+            return self.is_ready()
+        if time.monotonic() - self._last_start_at >= RESTART_BACKOFF_SECONDS:
+            print("⚠️ Report mirror listener dropped; re-subscribing and falling back to Firestore queries")
+            self.restarts += 1
+            try:
+                self.start(self._db)
+            except Exception as e:
+                print(f"❌ Report mirror restart failed: {str(e)}")
+        return False
+
+    def add_listener(self, listener):
+        """Pass every report change on to `listener`, anything with upsert(report_id, report) and remove(report_id)."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    # ---- snapshot callbacks (run on Firestore's listener thread) ----
+
+    def _on_requests_snapshot(self, docs, changes, read_time):
+        applied = []
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                if change.type.name == 'REMOVED':
+                    self._remove(doc.id)
+                    applied.append((doc.id, None))
+                else:
+                    report = snapshot_to_report(doc)
+                    self._upsert(doc.id, report)
+                    applied.append((doc.id, report))
+            self._ready.add(REQUESTS_COLLECTION)
+            self._last_event_at = time.time()
+            listeners = list(self._listeners)
+        # Outside the mirror's lock, as each listener takes its own
+        for listener in listeners:
+            for report_id, report in applied:
+                try:
+                    if report is None:
+                        listener.remove(report_id)
+                    else:
+                        listener.upsert(report_id, report)
+                except Exception as e:
+                    print(f"⚠️ Report mirror listener failed for {report_id}: {str(e)}")
+
+    def _on_analytics_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    self._analytics.pop(change.document.id, None)
+                else:
+                    self._analytics[change.document.id] = change.document.to_dict() or {}
+            self._ready.add(ANALYTICS_COLLECTION)
+            self._last_event_at = time.time()
+
+    def _upsert(self, report_id, data):
+        self._remove(report_id)
+        self._reports[report_id] = data
+        size = _approx_size(data)
+        self._sizes[report_id] = size
+        self.approx_bytes += size
+        for field, index in self._indexes.items():
+            value = data.get(field)
+            if value:
+                index.setdefault(value, set()).add(report_id)
+
+    def _remove(self, report_id):
+        old = self._reports.pop(report_id, None)
+        if old is None:
+            return
+        self.approx_bytes -= self._sizes.pop(report_id, 0)
+        for field, index in self._indexes.items():
+            value = old.get(field)
+            ids = index.get(value)
+            if ids is not None:
+                ids.discard(report_id)
+                if not ids:
+                    del index[value]
+
+    # ---- reads ----
+
+    def query(self, filters, limit=None, cursor=None):
+        """Same contract as report_queries.fetch_requests, served from memory."""
+        active = {field: value for field, value in filters.items() if value}
+        with self._lock:
+            if active:
+                candidate_sets = []
+                for field, value in active.items():
+                    if field not in self._indexes:
+                        raise ValueError(f"Field {field} is not indexed by the mirror")
+                    candidate_sets.append(self._indexes[field].get(value, set()))
+                candidate_sets.sort(key=len)
+                ids = set.intersection(*candidate_sets)
+            else:
+                ids = self._reports.keys()
+            results = [dict(self._reports[report_id]) for report_id in ids]
+
+        results.sort(key=created_at_sort_key, reverse=True)
+        page, next_cursor = paginate(results, limit, cursor)
+        plan = {
+            'strategy': 'mirror',
+            'filters': sorted(active),
+            'order_by': 'createdAt',
+            'documents_read': 0,
+        }
+        return page, next_cursor, plan
+
+    def department_analytics(self, department_key):
+        """The mirrored aggregate document for a department (empty if none)."""
+        with self._lock:
+            return dict(self._analytics.get(department_key) or {})
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self._db is not None,
+                'ready': self.is_ready(),
+                'active': self.is_active(),
+                'documents': len(self._reports),
+                'approx_bytes': self.approx_bytes,
+                'index_keys': {field: len(index) for field, index in self._indexes.items()},
+                'last_event_at': self._last_event_at,
+                'restarts': self.restarts,
+            }
+
+
+report_mirror = ReportMirror()
+
+
+def mirror_enabled():
+    return os.getenv('REQUESTS_MIRROR_ENABLED', 'false').lower() == 'true'
@@ -0,0 +1,275 @@
+"""
+Query planner for the `requests` collection.
+Pushes equality filters and createdAt ordering down to Firestore when a matching
+composite index is declared in firestore.indexes.json, and only falls back to
+scanning when that index is missing on the project.
+"""
+
+import base64
+import json
+import pathlib
+from datetime import datetime, timezone
+
+from firebase_admin import firestore
+
+try:
+    from google.api_core.exceptions import FailedPrecondition
+except ImportError:
+    FailedPrecondition = None
+
+INDEX_FILE = pathlib.Path(__file__).resolve().parent / 'firestore.indexes.json'
+REQUESTS_COLLECTION = 'requests'
+ORDER_FIELD = 'createdAt'
+
+# Plans, cheapest first:
+#   index  - equality filters + order_by served by a composite index
+#   filter - equality filters only (no composite index needed), sorted in Python
+#   scan   - whole collection streamed and filtered in Python
+PLAN_INDEX = 'index'
+PLAN_FILTER = 'filter'
+PLAN_SCAN = 'scan'
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+_EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+
+def load_declared_indexes(path=INDEX_FILE, collection=REQUESTS_COLLECTION):
+    """Return the sets of equality fields that have a composite index ending in createdAt DESC."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not read Firestore index definitions: {str(e)}")
+        return set()
+
+    declared = set()
+    for index in spec.get('indexes', []):
+        if index.get('collectionGroup') != collection:
+            continue
+        fields = index.get('fields', [])
+        if not fields:
+            continue
+        last = fields[-1]
+        if last.get('fieldPath') != ORDER_FIELD or last.get('order') != 'DESCENDING':
+            continue
+        declared.add(frozenset(f.get('fieldPath') for f in fields[:-1]))
+    return declared
+
+
+DECLARED_INDEXES = load_declared_indexes()
+
+# Field sets whose index is declared but Firestore rejected (not deployed or still building)
+_missing_indexes = set()
+
+
+def is_missing_index_error(error):
+    """True if Firestore refused the query because a composite index does not exist."""
+    if FailedPrecondition is not None and isinstance(error, FailedPrecondition):
+        return True
+    message = str(error).lower()
+    return 'requires an index' in message or 'requires a composite index' in message
+
+
+def created_at_sort_key(report):
+    """Sort key (createdAt, id) that tolerates reports whose createdAt is missing."""
+    return (report.get(ORDER_FIELD) or _EPOCH, report.get('id', ''))
+
+
+def parse_page_size(value):
+    """Parse a `limit` query arg. None means no limit (legacy clients); raises ValueError if invalid."""
+    if value in (None, ''):
+        return None
+    limit = int(value)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(report):
+    """Opaque cursor pointing just after `report` in createdAt DESC, id DESC order."""
+    created = report.get(ORDER_FIELD)
+    payload = {
+        't': created.isoformat() if isinstance(created, datetime) else None,
+        'id': report.get('id'),
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor from encode_cursor into (createdAt, doc_id); raises ValueError if malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created = datetime.fromisoformat(payload['t']) if payload.get('t') else None
+        doc_id = payload['id']
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(doc_id, str) or not doc_id:
+        raise ValueError("Invalid cursor")
+    return created, doc_id
+
+
+def paginate(results, limit=None, cursor=None):
+    """
+    Apply cursor + limit to a list already sorted newest first.
+    Used by plans that sort in Python. Returns (page, next_cursor).
+    """
+    if cursor:
+        after = (cursor[0] or _EPOCH, cursor[1])
+        results = [r for r in results if created_at_sort_key(r) < after]
+    if limit is None or len(results) <= limit:
+        return results, None
+    page = results[:limit]
+    return page, encode_cursor(page[-1])
+
+
+def plan_requests_query(filters):
+    """Pick the cheapest plan for the given equality filters (empty values are ignored)."""
+    active = {field: value for field, value in filters.items() if value}
+    fields = frozenset(active)
+
+    if not active or (fields in DECLARED_INDEXES and fields not in _missing_indexes):
+        strategy = PLAN_INDEX
+    else:
+        strategy = PLAN_FILTER
+
+    plan = {
+        'strategy': strategy,
+        'filters': sorted(active),
+        'order_by': ORDER_FIELD,
+    }
+    if fields in _missing_indexes:
+        plan['fallback_reason'] = 'missing_index'
+    return plan
+
+
+def _build_query(db, filters, ordered, limit=None, cursor=None):
+    collection = db.collection(REQUESTS_COLLECTION)
+    query = collection
+    for field, value in filters.items():
+        query = query.where(filter=firestore.FieldFilter(field, '==', value))
+    if ordered:
+        # Document id breaks createdAt ties so cursors never skip or repeat reports
+        query = query.order_by(ORDER_FIELD, direction=firestore.Query.DESCENDING)
+        query = query.order_by('__name__', direction=firestore.Query.DESCENDING)
+        if cursor and cursor[0] is not None:
+            query = query.start_after({ORDER_FIELD: cursor[0], '__name__': collection.document(cursor[1])})
+        if limit is not None:
+            # One extra document tells us whether another page exists
+            query = query.limit(limit + 1)
+    return query
+
+
+def snapshot_to_report(doc):
+    """Report dict with its id and `updateTime`, Firestore's per-write version stamp."""
+    data = doc.to_dict() or {}
+    data['id'] = doc.id
+    update_time = getattr(doc, 'update_time', None)
+    if update_time is not None:
+        data['updateTime'] = update_time.isoformat() if hasattr(update_time, 'isoformat') else update_time.ToJsonString()
+    return data
+
+
+def _collect(query, matches=None):
+    """Stream a query into a list of dicts with ids; returns (results, documents_read)."""
+    results = []
+    read = 0
+    for doc in query.stream():
+        read += 1
+        data = snapshot_to_report(doc)
+        if matches is None or matches(data):
+            results.append(data)
+    return results, read
+
+
+def fetch_requests(db, filters, limit=None, cursor=None):
+    """
+    Fetch reports matching the equality `filters` ({field: value}), newest first.
+    `cursor` is a decoded (createdAt, doc_id) pair from a previous page.
+    Returns (reports, next_cursor, plan) where plan describes the strategy used and documents read.
+    """
+    active = {field: value for field, value in filters.items() if value}
+    plan = plan_requests_query(filters)
+
+    if plan['strategy'] == PLAN_INDEX and not (cursor and cursor[0] is None):
+        try:
+            results, read = _collect(_build_query(db, active, ordered=True, limit=limit, cursor=cursor))
+            plan['documents_read'] = read
+            next_cursor = None
+            if limit is not None and len(results) > limit:
+                results = results[:limit]
+                next_cursor = encode_cursor(results[-1])
+            return results, next_cursor, plan
+        except Exception as e:
+            if not is_missing_index_error(e):
+                raise
+            _missing_indexes.add(frozenset(active))
+            print(f"⚠️ Missing Firestore index for {plan['filters']} + {ORDER_FIELD}; falling back. "
+                  "Deploy firestore.indexes.json to fix this.")
+            plan['fallback_reason'] = 'missing_index'
+        plan['strategy'] = PLAN_FILTER
+
+    if plan['strategy'] == PLAN_FILTER:
+        try:
+            results, read = _collect(_build_query(db, active, ordered=False))
+            results.sort(key=created_at_sort_key, reverse=True)
+            plan['documents_read'] = read
+            return paginate(results, limit, cursor) + (plan,)
+        except Exception as e:
+            if not is_missing_index_error(e):
+                raise
+            print(f"⚠️ Firestore rejected equality filters {plan['filters']}; scanning collection.")
+            plan['strategy'] = PLAN_SCAN
+            plan['fallback_reason'] = 'missing_index'
+
+    def matches(data):
+        return all(data.get(field) == value for field, value in active.items())
+
+    results, read = _collect(db.collection(REQUESTS_COLLECTION), matches)
+    results.sort(key=created_at_sort_key, reverse=True)
+    plan['documents_read'] = read
+    return paginate(results, limit, cursor) + (plan,)
+
+
+def _stream_snapshots(first, docs, plan):
+    if first is None:
+        return
+    plan['documents_read'] += 1
+    yield snapshot_to_report(first)
+    for doc in docs:
+        plan['documents_read'] += 1
+        yield snapshot_to_report(doc)
+
+
+def stream_requests(db, filters):
+    """
+    Like fetch_requests without pagination, but yields reports straight off an
+    index-ordered Firestore stream so memory stays flat however many match.
+    The first document is read eagerly so a missing index is detected (and the
+    buffered fallback chosen) before any output is produced.
+    Returns (iterator of reports, plan); plan['documents_read'] grows as the iterator is consumed.
+    """
+    active = {field: value for field, value in filters.items() if value}
+    plan = plan_requests_query(filters)
+
+    if plan['strategy'] == PLAN_INDEX:
+        docs = iter(_build_query(db, active, ordered=True).stream())
+        try:
+            first = next(docs, None)
+        except Exception as e:
+            if not is_missing_index_error(e):
+                raise
+            _missing_indexes.add(frozenset(active))
+            print(f"⚠️ Missing Firestore index for {plan['filters']} + {ORDER_FIELD}; "
+                  "streaming from a buffered, Python-sorted fallback.")
+        else:
+            plan['documents_read'] = 0
+            plan['streamed'] = True
+            return _stream_snapshots(first, docs, plan), plan
+
+    results, _, plan = fetch_requests(db, filters)
+    plan['streamed'] = False
+    return iter(results), plan
@@ -0,0 +1,247 @@
+"""
+In-memory uniform-grid index over report coordinates for nearby search.
+Reports are bucketed into fixed-size lat/lon cells; a radius query only looks
+at the cells overlapping the search circle and measures those candidates with
+one vectorized haversine call. The index is built from Firestore when the
+worker starts and kept current by the create and status-change paths of this
+worker. Writes made by other workers arrive through the report mirror's
+listener when it is enabled, otherwise with a periodic rebuild.
+"""
+
+import math
+import os
+import threading
+import time
+
+from geo import KM_PER_DEGREE, report_coordinates
+from geo_distance import NUMPY_AVAILABLE, nearest_within
+
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+REQUESTS_COLLECTION = 'requests'
+# Only these fields are read when rebuilding
+INDEXED_FIELDS = ['lat', 'lon', 'location_text', 'status', 'category', 'title', 'priority']
+OPEN_STATUSES = ('pending', 'in_progress')
+MAX_RADIUS_KM = 10.0
+
+
+class _Cell:
+    """Parallel id/lat/lon lists with O(1) swap-removal and cached arrays for vectorized queries."""
+    __slots__ = ('ids', 'lats', 'lons', 'positions', '_arrays')
+
+    def __init__(self):
+        self.ids = []
+        self.lats = []
+        self.lons = []
+        self.positions = {}
+        self._arrays = None
+
+    def add(self, report_id, lat, lon):
+        self.positions[report_id] = len(self.ids)
+        self.ids.append(report_id)
+        self.lats.append(lat)
+        self.lons.append(lon)
+        self._arrays = None
+
+    def remove(self, report_id):
+        index = self.positions.pop(report_id)
+        last = len(self.ids) - 1
+        if index != last:
+            self.ids[index] = self.ids[last]
+            self.lats[index] = self.lats[last]
+            self.lons[index] = self.lons[last]
+            self.positions[self.ids[index]] = index
+        self.ids.pop()
+        self.lats.pop()
+        self.lons.pop()
+        self._arrays = None
+
+    def arrays(self):
+        if self._arrays is None:
+            if NUMPY_AVAILABLE:
+                self._arrays = (np.array(self.lats, dtype=np.float64), np.array(self.lons, dtype=np.float64))
+            else:
+                self._arrays = (self.lats, self.lons)
+        return self._arrays
+
+
+def _summary(report_id, lat, lon, report):
+    return {
+        'id': report_id,
+        'lat': lat,
+        'lon': lon,
+        'status': report.get('status'),
+        'category': report.get('category'),
+        'title': report.get('title'),
+        'priority': report.get('priority'),
+    }
+
+
+class SpatialGrid:
+    def __init__(self, cell_degrees=0.01):
+        self.cell_degrees = cell_degrees
+        self._lock = threading.RLock()
+        self._cells = {}
+        self._entries = {}
+        # Writes made while a rebuild is streaming, replayed onto the fresh index
+        self._replay = None
+        self._thread = None
+        self.ready = False
+        self.built_at = None
+        self.build_seconds = None
+        self.refresh_seconds = 0
+
+    def _cell_key(self, lat, lon):
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lon / self.cell_degrees))
+
+    # ---- writes ----
+
+    def upsert(self, report_id, report):
+        """Index (or re-index) a report; reports without coordinates are dropped from the index."""
+        coords = report_coordinates(report)
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(('upsert', report_id, report))
+            self._remove(report_id)
+            if coords is None:
+                return
+            lat, lon = coords
+            key = self._cell_key(lat, lon)
+            self._cells.setdefault(key, _Cell()).add(report_id, lat, lon)
+            self._entries[report_id] = (key, _summary(report_id, lat, lon, report))
+
+    def update(self, report_id, fields):
+        """Apply changed summary fields (e.g. status) to an indexed report; location never changes."""
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(('update', report_id, fields))
+            entry = self._entries.get(report_id)
+            if entry is not None:
+                summary = entry[1]
+                for field in ('status', 'category', 'title', 'priority'):
+                    if field in fields:
+                        summary[field] = fields[field]
+
+    def remove(self, report_id):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append(('remove', report_id))
+            self._remove(report_id)
+
+    def _remove(self, report_id):
+        entry = self._entries.pop(report_id, None)
+        if entry is None:
+            return
+        cell = self._cells[entry[0]]
+        cell.remove(report_id)
+        if not cell.ids:
+            del self._cells[entry[0]]
+
+    def rebuild(self, db):
+        """Load every report's coordinates from Firestore and swap in a fresh index."""
+        started = time.monotonic()
+        with self._lock:
+            self._replay = []
+        fresh = SpatialGrid(self.cell_degrees)
+        try:
+            for doc in db.collection(REQUESTS_COLLECTION).select(INDEXED_FIELDS).stream():
+                fresh.upsert(doc.id, doc.to_dict() or {})
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        with self._lock:
+            for op, *args in self._replay:
+                getattr(fresh, op)(*args)
+            self._replay = None
+            self._cells = fresh._cells
+            self._entries = fresh._entries
+            self.ready = True
+            self.built_at = time.time()
+            self.build_seconds = round(time.monotonic() - started, 3)
+        print(f"✓ Nearby index built: {len(self._entries)} reports in {len(self._cells)} cells "
+              f"({self.build_seconds}s)")
+
+    def start(self, db, refresh_seconds=0):
+        """
+        Build the index in a background thread, then rebuild it every
+        `refresh_seconds` (0: build once). Calling it again does nothing.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.refresh_seconds = refresh_seconds
+            self._thread = threading.Thread(target=self._build_loop, args=(db, refresh_seconds),
+                                            name='nearby-index', daemon=True)
+        self._thread.start()
+
+    def _build_loop(self, db, refresh_seconds):
+        while True:
+            try:
+                self.rebuild(db)
+            except Exception as e:
+                print(f"❌ Nearby index build failed: {str(e)}")
+            if not refresh_seconds:
+                return
+            time.sleep(refresh_seconds)
+
+    # ---- reads ----
+
+    def query(self, lat, lon, radius_km, category=None, statuses=OPEN_STATUSES, limit=100):
+        """Reports within radius_km of (lat, lon), nearest first, each with its `distance_km`."""
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        row_min, col_min = self._cell_key(lat - lat_span, lon - lon_span)
+        row_max, col_max = self._cell_key(lat + lat_span, lon + lon_span)
+
+        with self._lock:
+            ids = []
+            lat_parts = []
+            lon_parts = []
+            for row in range(row_min, row_max + 1):
+                for col in range(col_min, col_max + 1):
+                    cell = self._cells.get((row, col))
+                    if cell is None:
+                        continue
+                    cell_lats, cell_lons = cell.arrays()
+                    ids.extend(cell.ids)
+                    lat_parts.append(cell_lats)
+                    lon_parts.append(cell_lons)
+            if not ids:
+                return []
+            if NUMPY_AVAILABLE:
+                lats = np.concatenate(lat_parts)
+                lons = np.concatenate(lon_parts)
+            else:
+                lats = [v for part in lat_parts for v in part]
+                lons = [v for part in lon_parts for v in part]
+
+            results = []
+            for index, distance in nearest_within(lat, lon, lats, lons, radius_km):
+                summary = self._entries[ids[index]][1]
+                if statuses and summary.get('status') not in statuses:
+                    continue
+                if category and summary.get('category') != category:
+                    continue
+                result = dict(summary)
+                result['distance_km'] = round(distance, 4)
+                results.append(result)
+                if len(results) >= limit:
+                    break
+            return results
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'reports': len(self._entries),
+                'cells': len(self._cells),
+                'cell_degrees': self.cell_degrees,
+                'built_at': self.built_at,
+                'build_seconds': self.build_seconds,
+                'refresh_seconds': self.refresh_seconds,
+            }
+
+
+nearby_index = SpatialGrid(cell_degrees=float(os.getenv('NEARBY_CELL_DEGREES', 0.01)))
@@ -220,7 +220,9 @@ function openDetails(id) {
             // If relative (e.g., 'uploads/xxx.jpg'), prepend base url implicitly or explicitly
             // Based on backend config, it's served at /uploads/...
             const src = img.startsWith('http') ? img : `/${img}`;
-            imagesHtml += `<a href="${src}" target="_blank"><img src="${src}" alt="Report Image"></a>`;
+            // Uploads have a small WebP copy for the grid; the link opens the original
+            const thumb = img.startsWith('http') ? src : `${src}?size=thumb`;
+            imagesHtml += `<a href="${src}" target="_blank"><img src="${thumb}" loading="lazy" alt="Report Image"></a>`;
         });
         imagesHtml += '</div>';
     } else {
@@ -0,0 +1,71 @@
+"""
+Streaming NDJSON responses for large report listings.
+Clients opt in with `Accept: application/x-ndjson`; each report is written as
+one JSON line as it comes off the Firestore stream, gzip-compressed on the fly
+when the client sends `Accept-Encoding: gzip`. Nothing is buffered beyond one
+output chunk, so memory use does not grow with the number of reports.
+"""
+
+import zlib
+
+from flask import Response, current_app, request
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Output is flushed to the client in chunks of roughly this many bytes
+CHUNK_BYTES = 64 * 1024
+GZIP_LEVEL = 6
+
+
+def wants_ndjson():
+    """True if the client prefers NDJSON over a regular JSON body."""
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def _ndjson_chunks(records, dumps, on_complete=None):
+    buffer = []
+    size = 0
+    count = 0
+    for record in records:
+        line = (dumps(record) + '\n').encode('utf-8')
+        buffer.append(line)
+        size += len(line)
+        count += 1
+        if size >= CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+    if on_complete:
+        on_complete(count)
+
+
+def _gzip_chunks(chunks):
+    # wbits=31 writes a gzip header/trailer; Z_SYNC_FLUSH lets clients decode each chunk as it arrives
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def ndjson_response(records, headers=None, on_complete=None):
+    """
+    Stream `records` (any iterable of dicts) as NDJSON, gzip-compressed if accepted.
+    `on_complete(count)` runs after the last record has been written.
+    """
+    # Capture the encoder now; the generator runs after the request context is gone
+    chunks = _ndjson_chunks(records, current_app.json.dumps, on_complete)
+    response_headers = {
+        'Cache-Control': 'private, no-cache',
+        'Vary': 'Accept, Accept-Encoding',
+        # Ask nginx not to buffer the stream
+        'X-Accel-Buffering': 'no',
+    }
+    if request.accept_encodings['gzip']:
+        chunks = _gzip_chunks(chunks)
+        response_headers['Content-Encoding'] = 'gzip'
+    response_headers.update(headers or {})
+    return Response(chunks, mimetype=NDJSON_MIMETYPE, headers=response_headers)
@@ -0,0 +1,81 @@
+"""
+Concurrency check for duplicate clustering against the Firestore emulator.
+Fires 100 parallel clustered submissions at one existing report and verifies
+that every upvote and co-reporter was recorded.
+
+    firebase emulators:start --only firestore
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python test_cluster_concurrency.py
+"""
+
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from google.auth.credentials import AnonymousCredentials
+from firebase_admin import firestore
+
+from clustering import find_cluster_match, merge_into_cluster
+from geo import geo_fields
+
+SUBMISSIONS = 100
+BASE_LOCATION = '9.9312, 76.2673'
+# About 2 m away, well inside the clustering radius
+NEARBY_LOCATION = '9.93121, 76.26731'
+
+
+def submit(db, category, i):
+    """Same steps as create_request: find the open report nearby, then merge into it."""
+    report = {
+        'category': category,
+        'reporter_email': f'reporter{i}@example.com',
+        **geo_fields(NEARBY_LOCATION),
+    }
+    match = find_cluster_match(db, report)
+    if match is None:
+        return False
+    merge_into_cluster(match[0].reference, report['reporter_email'])
+    return True
+
+
+def main():
+    if not os.getenv('FIRESTORE_EMULATOR_HOST'):
+        print("❌ Set FIRESTORE_EMULATOR_HOST (e.g. localhost:8080); this test must not run against production.")
+        return 1
+
+    db = firestore.Client(project=os.getenv('GCLOUD_PROJECT', 'demo-public-assets'),
+                          credentials=AnonymousCredentials())
+    # A fresh category keeps runs independent of any other data in the emulator
+    category = f'concurrency-test-{uuid.uuid4().hex[:8]}'
+    doc_ref = db.collection('requests').document()
+    doc_ref.set({
+        'title': 'Concurrency test pothole',
+        'category': category,
+        'status': 'pending',
+        'upvotes': 1,
+        'co_reporters': ['original@example.com'],
+        **geo_fields(BASE_LOCATION),
+    })
+
+    print(f"Firing {SUBMISSIONS} parallel clustered submissions at {doc_ref.id}...")
+    with ThreadPoolExecutor(max_workers=SUBMISSIONS) as pool:
+        results = list(pool.map(lambda i: submit(db, category, i), range(SUBMISSIONS)))
+
+    data = doc_ref.get().to_dict()
+    doc_ref.delete()
+
+    upvotes = data.get('upvotes')
+    reporters = len(data.get('co_reporters', []))
+    print(f"Matched: {sum(results)}/{SUBMISSIONS}")
+    print(f"upvotes: {upvotes} (expected {SUBMISSIONS + 1})")
+    print(f"co_reporters: {reporters} (expected {SUBMISSIONS + 1})")
+
+    if all(results) and upvotes == SUBMISSIONS + 1 and reporters == SUBMISSIONS + 1:
+        print("✓ PASS: no lost updates")
+        return 0
+    print("❌ FAIL: updates were lost or submissions did not cluster")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
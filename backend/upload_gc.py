@@ -0,0 +1,150 @@
+"""
+Garbage collection of uploads that no report points at.
+Files are saved before a report is written, so a submission that fails OTP
+verification, is clustered onto an existing report or is abandoned after a
+resumable upload leaves files behind. collect_orphaned_uploads() streams the
+`images` of every report into a set of referenced paths, then walks the upload
+folder and moves (or deletes) files that are not referenced and older than a
+grace period, together with their thumbnails. Quarantined files are kept in
+uploads/.quarantine, which is never served, and deleted on a later run.
+"""
+
+import os
+import time
+
+from image_derivatives import DERIVED_DIR, SIZES
+from upload_store import UPLOADS_COLLECTION, URL_PREFIX, digest_of
+
+REQUESTS_COLLECTION = 'requests'
+QUARANTINE_DIR = '.quarantine'
+BATCH_SIZE = 400
+
+
+def referenced_uploads(db, store):
+    """Resolved local paths of every upload referenced by a report, read in one streaming pass."""
+    referenced = set()
+    scanned = 0
+    for doc in db.collection(REQUESTS_COLLECTION).select(['images']).stream():
+        scanned += 1
+        for image in (doc.to_dict() or {}).get('images') or []:
+            path = store.local_path(image)
+            if path is not None:
+                referenced.add(path)
+    return referenced, scanned
+
+
+def _walk_uploads(root):
+    """Originals below the upload folder; derived copies and dot folders (.incoming, .quarantine) are skipped."""
+    for directory, subdirs, files in os.walk(root):
+        if directory == str(root):
+            subdirs[:] = [d for d in subdirs if d != DERIVED_DIR and not d.startswith('.')]
+        for name in files:
+            yield os.path.join(directory, name)
+
+
+def _derivatives_of(root, relative):
+    return [root / DERIVED_DIR / size / f"{relative}.webp" for size in SIZES]
+
+
+def _remove_empty_parents(path, root):
+    for parent in path.parents:
+        if parent == root or root not in parent.parents:
+            break
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+
+
+def collect_orphaned_uploads(db, store, grace_hours=48, quarantine=True, quarantine_days=7, dry_run=False):
+    """
+    Quarantine (or delete) unreferenced uploads last modified more than
+    `grace_hours` before the scan started, and purge quarantined files older
+    than `quarantine_days`. Returns counts and reclaimed bytes.
+    """
+    root = store.root.resolve()
+    # Measured before the scan: a file re-used by a report created meanwhile
+    # has been touched by the store since, so it is never older than this
+    cutoff = time.time() - grace_hours * 3600
+    referenced, scanned = referenced_uploads(db, store)
+
+    files = 0
+    orphans = 0
+    reclaimed = 0
+    removed_digests = []
+    for name in _walk_uploads(root):
+        files += 1
+        path = root / os.path.relpath(name, root)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if path in referenced or stat.st_mtime >= cutoff:
+            continue
+        orphans += 1
+        relative = path.relative_to(root).as_posix()
+        victims = [path] + [d for d in _derivatives_of(root, relative) if d.exists()]
+        reclaimed += sum(victim.stat().st_size for victim in victims)
+        if dry_run:
+            continue
+        for victim in victims:
+            if quarantine:
+                target = root / QUARANTINE_DIR / victim.relative_to(root)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(victim, target)
+                # The quarantine clock starts now
+                os.utime(target)
+            else:
+                victim.unlink()
+            _remove_empty_parents(victim, root)
+        digest = digest_of(URL_PREFIX + relative)
+        if digest:
+            removed_digests.append(digest)
+
+    # Counters of files that are gone would only mislead
+    if removed_digests:
+        batch = db.batch()
+        for i, digest in enumerate(removed_digests, 1):
+            batch.delete(db.collection(UPLOADS_COLLECTION).document(digest))
+            if i % BATCH_SIZE == 0:
+                batch.commit()
+                batch = db.batch()
+        if len(removed_digests) % BATCH_SIZE:
+            batch.commit()
+
+    purged, purged_bytes = purge_quarantine(store, quarantine_days, dry_run=dry_run)
+
+    action = 'would ' if dry_run else ''
+    print(f"✓ Upload GC: scanned {scanned} reports ({len(referenced)} referenced uploads) and {files} files; "
+          f"{action}{'quarantine' if quarantine else 'delete'} {orphans} orphans older than {grace_hours}h "
+          f"({reclaimed / 1024 / 1024:.1f} MB); {action}purge {purged} quarantined files "
+          f"({purged_bytes / 1024 / 1024:.1f} MB)")
+    return {'reports': scanned, 'referenced': len(referenced), 'files': files, 'orphans': orphans,
+            'reclaimed_bytes': reclaimed, 'purged': purged, 'purged_bytes': purged_bytes}
+
+
+def purge_quarantine(store, quarantine_days=7, dry_run=False):
+    """Delete quarantined files older than `quarantine_days`. Returns (files, bytes)."""
+    quarantine_root = store.root / QUARANTINE_DIR
+    if not quarantine_root.is_dir():
+        return 0, 0
+    cutoff = time.time() - quarantine_days * 86400
+    purged = 0
+    purged_bytes = 0
+    for path in list(quarantine_root.rglob('*')):
+        if not path.is_file():
+            continue
+        stat = path.stat()
+        if stat.st_mtime >= cutoff:
+            continue
+        purged += 1
+        purged_bytes += stat.st_size
+        if not dry_run:
+            path.unlink()
+    if not dry_run:
+        # Drop the emptied shard folders, deepest first
+        for directory in sorted((p for p in quarantine_root.rglob('*') if p.is_dir()), reverse=True):
+            if not any(directory.iterdir()):
+                directory.rmdir()
+    return purged, purged_bytes
+
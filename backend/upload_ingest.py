@@ -0,0 +1,71 @@
+"""
+Streaming multipart ingest for report uploads.
+By default werkzeug spools every file part to a temporary file and the view
+then copies it again with save(). StreamingUploadRequest instead hands each
+file part an IncomingUpload in the upload folder, so bytes go to disk once,
+hashed on the way, and a view only has to commit them. The first bytes of each
+file are sniffed and anything that is not a supported photo or video is
+refused before the rest is read, as is a file over the per-file limit. The
+per-request limit is Flask's MAX_CONTENT_LENGTH.
+"""
+
+from flask import Request
+
+from upload_store import UnsupportedUpload, UploadTooLarge
+
+MB = 1024 * 1024
+SUPPORTED_MEDIA = "Only photos (JPEG, PNG, GIF, WebP, HEIC) and videos (MP4, MOV, WebM, Ogg) can be uploaded"
+# Brands in an ISO media file's 'ftyp' box that mean a HEIC/HEIF photo
+_HEIF_BRANDS = (b'heic', b'heix', b'hevc', b'heim', b'heis', b'mif1', b'msf1')
+# Brands of MP4 videos; others (M4A audio, 3GP, AVIF images) are refused
+_MP4_BRANDS = (b'isom', b'iso2', b'iso3', b'iso4', b'iso5', b'iso6', b'mp41', b'mp42', b'avc1',
+               b'M4V ', b'M4VH', b'M4VP', b'dash', b'mmp4', b'MSNV')
+
+
+def sniff_media(head):
+    """Extension for a file starting with `head`; raises UnsupportedUpload for anything else."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return '.jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return '.png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return '.gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand in _HEIF_BRANDS:
+            return '.heic'
+        if brand == b'qt  ':
+            return '.mov'
+        if brand in _MP4_BRANDS:
+            return '.mp4'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return '.webm'
+    if head.startswith(b'OggS'):
+        return '.ogg'
+    raise UnsupportedUpload(SUPPORTED_MEDIA)
+
+
+class StreamingUploadRequest(Request):
+    # Set by the app; without a store file parts are spooled as usual
+    upload_store = None
+    max_file_bytes = 50 * MB
+    max_files = 20
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # A file field left empty is sent as a part without a filename and no bytes
+        if self.upload_store is None or not filename:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        incoming = self.__dict__.setdefault('_incoming_uploads', [])
+        if len(incoming) >= self.max_files:
+            raise UploadTooLarge(f"At most {self.max_files} files can be uploaded at once")
+        upload = self.upload_store.open_incoming(max_bytes=self.max_file_bytes, sniff=sniff_media)
+        incoming.append(upload)
+        return upload
+
+    def close(self):
+        super().close()
+        # Parts of an aborted or uncommitted request are deleted; committed ones are kept
+        for upload in self.__dict__.get('_incoming_uploads', ()):
+            upload.discard()
@@ -0,0 +1,438 @@
+"""
+Removal of location and camera metadata from uploaded originals.
+Originals are public under /uploads, and phones write the GPS position into
+every photo and video they take. strip_metadata() runs on each file before it
+is hashed and stored:
+
+- JPEG: EXIF/XMP (APP1), Photoshop/IPTC (APP13), multi-picture (MPF) segments,
+  comments and anything after the end of the image are dropped without
+  re-encoding. The orientation is kept in a minimal EXIF block of its own.
+- PNG: eXIf and text chunks are dropped.
+- WebP: EXIF and XMP chunks are dropped and the header flags updated.
+- MP4/MOV/HEIC: location boxes (©xyz, loci, Apple's location keys) become
+  `free` boxes and HEIC Exif items are emptied, all in place, so no offsets
+  in the file change.
+
+Other types (GIF, WebM, Ogg) carry no location and are left alone.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+
+COPY_BYTES = 1024 * 1024
+# JPEG markers
+_SOI = b'\xff\xd8'
+_SOS = 0xDA
+_EOI = 0xD9
+_APP1 = 0xE1
+_APP2 = 0xE2
+_APP13 = 0xED
+_COM = 0xFE
+# Markers without a length field
+_STANDALONE = {0x01} | set(range(0xD0, 0xD8))
+
+_EXIF_HEADER = b'Exif\x00\x00'
+_ORIENTATION_TAG = 0x0112
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_DROPPED = {b'eXIf', b'tEXt', b'zTXt', b'iTXt', b'tIME'}
+
+_WEBP_DROPPED = {b'EXIF', b'XMP '}
+_VP8X_METADATA_FLAGS = 0x08 | 0x04
+
+# ISO base media (MP4, MOV, HEIC) containers that can hold location boxes
+_BMFF_CONTAINERS = {b'moov', b'trak', b'udta', b'meta'}
+_BMFF_LOCATION = {b'\xa9xyz', b'loci'}
+# An empty but valid Exif payload for HEIC: TIFF header offset 0, big-endian TIFF, no entries
+_EMPTY_HEIF_EXIF = b'\x00\x00\x00\x00MM\x00\x2a\x00\x00\x00\x08\x00\x00\x00\x00\x00\x00'
+
+
+def strip_metadata(path, extension):
+    """
+    Remove location and camera metadata from the file at `path`, whose type
+    is given by its sniffed `extension`. Returns True if the file changed.
+    Damaged files are left as they are.
+    """
+    handler = _HANDLERS.get(extension)
+    if handler is None or os.path.getsize(path) == 0:
+        return False
+    try:
+        return handler(path)
+    except (ValueError, IndexError, struct.error) as e:
+        print(f"⚠️ Could not strip metadata from {os.path.basename(path)}: {str(e)}")
+        return False
+
+
+def _rewrite(path, data, parts):
+    """
+    Replace `path` with a new file made of `parts`: (start, end) ranges of
+    `data`, copied a piece at a time so a large video is never held in memory,
+    or literal bytes.
+    """
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.strip-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for part in parts:
+                if isinstance(part, bytes):
+                    out.write(part)
+                    continue
+                for offset in range(part[0], part[1], COPY_BYTES):
+                    out.write(data[offset:min(offset + COPY_BYTES, part[1])])
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+# ---- JPEG ----
+
+def _jpeg_orientation(payload):
+    """Orientation tag of an EXIF APP1 payload, or None (also for a damaged block, which is dropped all the same)."""
+    if not payload.startswith(_EXIF_HEADER):
+        return None
+    tiff = payload[len(_EXIF_HEADER):]
+    order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if order is None:
+        return None
+    try:
+        ifd = struct.unpack(order + 'I', tiff[4:8])[0]
+        count = struct.unpack(order + 'H', tiff[ifd:ifd + 2])[0]
+        for i in range(count):
+            entry = ifd + 2 + i * 12
+            tag, kind = struct.unpack(order + 'HH', tiff[entry:entry + 4])
+            if tag == _ORIENTATION_TAG and kind == 3:
+                orientation = struct.unpack(order + 'H', tiff[entry + 8:entry + 10])[0]
+                return orientation if 1 <= orientation <= 8 else None
+    except struct.error:
+        return None
+    return None
+
+
+def _orientation_segment(orientation):
+    """APP1 segment with an EXIF block that holds only the orientation."""
+    tiff = b'MM\x00\x2a\x00\x00\x00\x08' + struct.pack('>HHHIHH', 1, _ORIENTATION_TAG, 3, 1, orientation, 0) + b'\x00' * 4
+    payload = _EXIF_HEADER + tiff
+    return struct.pack('>BBH', 0xFF, _APP1, len(payload) + 2) + payload
+
+
+def _dropped_segment(marker, payload):
+    if marker in (_APP1, _APP13, _COM):
+        return True
+    # MPF points at secondary images by offset, and those are cut off below
+    return marker == _APP2 and bytes(payload[:4]) == b'MPF\x00'
+
+
+def _entropy_end(data, pos):
+    """Offset of the first marker after entropy-coded data starting at `pos`."""
+    while True:
+        pos = data.find(b'\xff', pos)
+        if pos < 0 or pos + 1 >= len(data):
+            raise ValueError("JPEG ends inside image data")
+        following = data[pos + 1]
+        # Stuffed 0xFF bytes, restart markers and fill bytes belong to the scan
+        if following == 0x00 or 0xD0 <= following <= 0xD7 or following == 0xFF:
+            pos += 1
+            continue
+        return pos
+
+
+def _strip_jpeg(path):
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:2] != _SOI:
+            raise ValueError("not a JPEG")
+        kept = [(0, 2)]
+        orientation = None
+        changed = False
+        pos = 2
+        while True:
+            if data[pos] != 0xFF:
+                raise ValueError("expected a JPEG marker")
+            marker = data[pos + 1]
+            if marker == 0xFF:
+                # Fill byte before a marker
+                pos += 1
+                continue
+            if marker == _EOI:
+                kept.append((pos, pos + 2))
+                # Multi-picture files append more JPEGs (with their own EXIF) after the first one
+                changed |= pos + 2 < len(data)
+                break
+            if marker in _STANDALONE:
+                kept.append((pos, pos + 2))
+                pos += 2
+                continue
+            length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+            end = pos + 2 + length
+            if length < 2 or end > len(data):
+                raise ValueError("JPEG segment runs past the end of the file")
+            payload = data[pos + 4:end]
+            if marker == _APP1 and orientation is None and _orientation_segment(
+                    _jpeg_orientation(payload) or 1) == data[pos:end]:
+                # The block written by an earlier strip, so stripping twice changes nothing
+                orientation = 0
+                kept.append((pos, end))
+            elif _dropped_segment(marker, payload):
+                if marker == _APP1 and orientation is None:
+                    orientation = _jpeg_orientation(payload)
+                changed = True
+            else:
+                kept.append((pos, end))
+            if marker == _SOS:
+                scan_end = _entropy_end(data, end)
+                kept.append((end, scan_end))
+                end = scan_end
+            pos = end
+
+        if not changed:
+            return False
+        parts = list(kept)
+        if orientation and orientation != 1:
+            # Right after SOI, or after JFIF, which has to come first
+            insert_at = 2 if len(kept) > 1 and data[kept[1][0] + 1] == 0xE0 else 1
+            parts.insert(insert_at, _orientation_segment(orientation))
+        _rewrite(path, data, parts)
+    return True
+
+
+# ---- PNG ----
+
+def _strip_png(path):
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:8] != _PNG_SIGNATURE:
+            raise ValueError("not a PNG")
+        kept = [(0, 8)]
+        changed = False
+        pos = 8
+        while pos + 12 <= len(data):
+            length = struct.unpack('>I', data[pos:pos + 4])[0]
+            kind = data[pos + 4:pos + 8]
+            end = pos + 12 + length
+            if end > len(data):
+                raise ValueError("PNG chunk runs past the end of the file")
+            if kind in _PNG_DROPPED:
+                changed = True
+            else:
+                kept.append((pos, end))
+            pos = end
+            if kind == b'IEND':
+                break
+        if not changed:
+            return False
+        _rewrite(path, data, kept)
+    return True
+
+
+# ---- WebP ----
+
+def _strip_webp(path):
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if data[:4] != b'RIFF' or data[8:12] != b'WEBP':
+            raise ValueError("not a WebP")
+        chunks = []
+        changed = False
+        pos = 12
+        while pos + 8 <= len(data):
+            kind = data[pos:pos + 4]
+            length = struct.unpack('<I', data[pos + 4:pos + 8])[0]
+            # Chunks are padded to an even length
+            end = pos + 8 + length + (length & 1)
+            if end > len(data):
+                raise ValueError("WebP chunk runs past the end of the file")
+            if kind in _WEBP_DROPPED:
+                changed = True
+            else:
+                chunks.append((pos, end))
+            pos = end
+        if not changed:
+            return False
+        parts = []
+        for start, end in chunks:
+            if data[start:start + 4] == b'VP8X':
+                # The extended header is small; rewrite its flags
+                header = data[start:end]
+                parts.append(header[:8] + bytes([header[8] & ~_VP8X_METADATA_FLAGS & 0xFF]) + header[9:])
+            else:
+                parts.append((start, end))
+        size = 4 + sum(end - start for start, end in chunks)
+        _rewrite(path, data, [b'RIFF', struct.pack('<I', size), b'WEBP'] + parts)
+    return True
+
+
+# ---- MP4 / MOV / HEIC ----
+
+def _boxes(data, start, end):
+    """(type, start, header length, size) of each box between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack('>I4s', data[pos:pos + 8])
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', data[pos + 8:pos + 16])[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise ValueError(f"box {kind!r} runs past its parent")
+        yield kind, pos, header, size
+        pos += size
+
+
+def _meta_children_start(data, start, header, end):
+    """ISO `meta` is a full box (4 bytes of version and flags); QuickTime's is not."""
+    body = start + header
+    if body + 8 <= end and data[body + 4:body + 8] == b'hdlr':
+        return body
+    return body + 4
+
+
+def _blank_box(data, start, size):
+    """Turn a box into a `free` box of the same size and zero its contents."""
+    header = 16 if struct.unpack('>I', data[start:start + 4])[0] == 1 else 8
+    data[start + 4:start + 8] = b'free'
+    data[start + header:start + size] = b'\x00' * (size - header)
+
+
+def _quicktime_location_items(data, start, end):
+    """ilst item types (1-based key indexes, as 4 bytes) of Apple's location keys in a `keys` box."""
+    count = struct.unpack('>I', data[start + 12:start + 16])[0]
+    items = set()
+    pos = start + 16
+    for index in range(1, count + 1):
+        size = struct.unpack('>I', data[pos:pos + 4])[0]
+        if size < 8 or pos + size > end:
+            raise ValueError("keys entry runs past its box")
+        if b'location' in data[pos + 8:pos + size]:
+            items.add(struct.pack('>I', index))
+        pos += size
+    return items
+
+
+def _blank_bmff_locations(data, start, end):
+    blanked = False
+    children = list(_boxes(data, start, end))
+    location_items = set()
+    for kind, box_start, header, size in children:
+        if kind == b'keys':
+            location_items |= _quicktime_location_items(data, box_start, box_start + size)
+    for kind, box_start, header, size in children:
+        box_end = box_start + size
+        if kind in _BMFF_LOCATION:
+            _blank_box(data, box_start, size)
+            blanked = True
+        elif kind == b'ilst' and location_items:
+            for item, item_start, _, item_size in _boxes(data, box_start + header, box_end):
+                if item in location_items:
+                    _blank_box(data, item_start, item_size)
+                    blanked = True
+        elif kind == b'meta':
+            body = _meta_children_start(data, box_start, header, box_end)
+            blanked |= _blank_bmff_locations(data, body, box_end)
+            blanked |= _blank_heif_exif(data, body, box_end)
+        elif kind in _BMFF_CONTAINERS:
+            blanked |= _blank_bmff_locations(data, box_start + header, box_end)
+    return blanked
+
+
+def _uint(data, pos, size):
+    return int.from_bytes(data[pos:pos + size], 'big') if size else 0
+
+
+def _heif_exif_items(data, start, end):
+    """Item ids of the Exif items listed in an `iinf` box."""
+    version = data[start]
+    pos = start + 4 + (2 if version == 0 else 4)
+    items = set()
+    for kind, box_start, header, size in _boxes(data, pos, end):
+        if kind != b'infe':
+            continue
+        body = box_start + header
+        infe_version = data[body]
+        if infe_version < 2:
+            continue
+        id_size = 2 if infe_version == 2 else 4
+        item_id = _uint(data, body + 4, id_size)
+        if data[body + 4 + id_size + 2:body + 4 + id_size + 6] == b'Exif':
+            items.add(item_id)
+    return items
+
+
+def _blank_heif_exif(data, start, end):
+    """Replace the payload of HEIC Exif items with an empty Exif block."""
+    boxes = {kind: (box_start, header, size) for kind, box_start, header, size in _boxes(data, start, end)}
+    if b'iinf' not in boxes or b'iloc' not in boxes:
+        return False
+    iinf_start, iinf_header, iinf_size = boxes[b'iinf']
+    exif_items = _heif_exif_items(data, iinf_start + iinf_header, iinf_start + iinf_size)
+    if not exif_items:
+        return False
+    idat = boxes.get(b'idat')
+    idat_body = idat[0] + idat[1] if idat else None
+
+    iloc_start, iloc_header, _ = boxes[b'iloc']
+    pos = iloc_start + iloc_header
+    version = data[pos]
+    offset_size, length_size = data[pos + 4] >> 4, data[pos + 4] & 0x0F
+    base_offset_size = data[pos + 5] >> 4
+    index_size = data[pos + 5] & 0x0F if version in (1, 2) else 0
+    pos += 6
+    id_size = 2 if version < 2 else 4
+    item_count = _uint(data, pos, id_size)
+    pos += id_size
+    blanked = False
+    for _ in range(item_count):
+        item_id = _uint(data, pos, id_size)
+        pos += id_size
+        construction_method = 0
+        if version in (1, 2):
+            construction_method = _uint(data, pos, 2) & 0x0F
+            pos += 2
+        pos += 2  # data_reference_index
+        base_offset = _uint(data, pos, base_offset_size)
+        pos += base_offset_size
+        extent_count = _uint(data, pos, 2)
+        pos += 2
+        for _ in range(extent_count):
+            pos += index_size
+            extent_offset = _uint(data, pos, offset_size)
+            pos += offset_size
+            extent_length = _uint(data, pos, length_size)
+            pos += length_size
+            if item_id not in exif_items or not extent_length:
+                continue
+            if construction_method == 0:
+                extent_start = base_offset + extent_offset
+            elif construction_method == 1 and idat_body is not None:
+                extent_start = idat_body + base_offset + extent_offset
+            else:
+                continue
+            if extent_start + extent_length > len(data):
+                raise ValueError("Exif item runs past the end of the file")
+            filler = _EMPTY_HEIF_EXIF[:extent_length].ljust(extent_length, b'\x00')
+            if data[extent_start:extent_start + extent_length] != filler:
+                data[extent_start:extent_start + extent_length] = filler
+                blanked = True
+    return blanked
+
+
+def _strip_bmff(path):
+    with open(path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as data:
+        blanked = _blank_bmff_locations(data, 0, len(data))
+        if blanked:
+            data.flush()
+    return blanked
+
+
+_HANDLERS = {
+    '.jpg': _strip_jpeg,
+    '.jpeg': _strip_jpeg,
+    '.png': _strip_png,
+    '.webp': _strip_webp,
+    '.heic': _strip_bmff,
+    '.mp4': _strip_bmff,
+    '.mov': _strip_bmff,
+}
+
@@ -0,0 +1,283 @@
+"""
+Resumable uploads for the mobile app.
+A client creates a session with the file's size (and optionally its SHA-256),
+PUTs numbered chunks in any order and as often as needed, and finalizes with
+the SHA-256 of the whole file. The finished file is moved into the upload
+store like any other upload, and a report refers to it by upload id instead of
+sending the file again. Sessions live on disk below uploads/.incoming/sessions,
+so every worker process sees the same state; each has a preallocated `data`
+file that chunks are written into at their offset, a marker file per received
+chunk and a small session.json. Sessions not touched for UPLOAD_SESSION_TTL_HOURS
+are deleted by collect_garbage().
+"""
+
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+
+from upload_store import CHUNK_SIZE, UnsupportedUpload, UploadRejected, UploadTooLarge
+
+SESSIONS_DIR = 'sessions'
+DEFAULT_CHUNK_BYTES = 1024 * 1024
+MIN_CHUNK_BYTES = 64 * 1024
+MAX_CHUNK_BYTES = 8 * 1024 * 1024
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadSessionNotFound(UploadRejected):
+    status_code = 404
+
+
+class UploadSessions:
+    def __init__(self, store, max_file_bytes=50 * 1024 * 1024, ttl_hours=24, sniff=None):
+        self.store = store
+        self.root = store.incoming / SESSIONS_DIR
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_file_bytes = max_file_bytes
+        self.ttl_seconds = ttl_hours * 3600
+        self.sniff = sniff
+        self._gc_thread = None
+        self.created = 0
+        self.completed = 0
+        self.chunks_received = 0
+        self.collected = 0
+
+    def _dir(self, upload_id):
+        if not isinstance(upload_id, str) or not _UPLOAD_ID.match(upload_id):
+            raise UploadSessionNotFound("Unknown upload id")
+        return self.root / upload_id
+
+    def _load(self, upload_id):
+        try:
+            with open(self._dir(upload_id) / 'session.json') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            raise UploadSessionNotFound("Unknown or expired upload id")
+
+    def _save(self, session):
+        directory = self._dir(session['upload_id'])
+        temp_path = directory / 'session.json.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(session, f)
+        os.replace(temp_path, directory / 'session.json')
+
+    def _received(self, upload_id):
+        try:
+            return sorted(int(name) for name in os.listdir(self._dir(upload_id) / 'chunks') if name.isdigit())
+        except FileNotFoundError:
+            return []
+
+    def create(self, size, sha256=None, chunk_size=None):
+        """Start a session for a file of `size` bytes. Returns its status."""
+        if not isinstance(size, int) or size <= 0:
+            raise UploadRejected("size must be a positive number of bytes")
+        if size > self.max_file_bytes:
+            raise UploadTooLarge(f"Each file must be at most {self.max_file_bytes // (1024 * 1024)} MB")
+        if sha256 is not None and not _SHA256.match(str(sha256).lower()):
+            raise UploadRejected("sha256 must be 64 hex characters")
+        chunk_size = min(max(int(chunk_size or DEFAULT_CHUNK_BYTES), MIN_CHUNK_BYTES), MAX_CHUNK_BYTES)
+
+        upload_id = secrets.token_hex(16)
+        directory = self._dir(upload_id)
+        (directory / 'chunks').mkdir(parents=True)
+        # Sparse until the chunks arrive; each one is written at its own offset
+        with open(directory / 'data', 'wb') as f:
+            f.truncate(size)
+        session = {
+            'upload_id': upload_id,
+            'size': size,
+            'chunk_size': chunk_size,
+            'chunks': -(-size // chunk_size),
+            'sha256': sha256.lower() if sha256 else None,
+            'extension': None,
+            'image': None,
+            'createdAt': datetime.now(timezone.utc).isoformat(),
+        }
+        self._save(session)
+        self.created += 1
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        session = self._load(upload_id)
+        received = self._received(upload_id) if not session['image'] else list(range(session['chunks']))
+        received_set = set(received)
+        return {
+            'upload_id': upload_id,
+            'size': session['size'],
+            'chunk_size': session['chunk_size'],
+            'chunks': session['chunks'],
+            'received': received,
+            'missing': [i for i in range(session['chunks']) if i not in received_set],
+            'complete': bool(session['image']),
+            'image': session['image'],
+        }
+
+    def put_chunk(self, upload_id, index, stream, sha256=None):
+        """
+        Write chunk `index` from `stream` (anything with read(n)). Re-sending a
+        chunk overwrites it, so a client can simply retry. With `sha256` the
+        chunk is only recorded if its bytes match.
+        """
+        session = self._load(upload_id)
+        if session['image']:
+            return self.status(upload_id)
+        if not isinstance(index, int) or not 0 <= index < session['chunks']:
+            raise UploadRejected(f"Chunk index must be between 0 and {session['chunks'] - 1}")
+        offset = index * session['chunk_size']
+        expected = min(session['chunk_size'], session['size'] - offset)
+
+        hasher = hashlib.sha256()
+        written = 0
+        head = b''
+        fd = os.open(self._dir(upload_id) / 'data', os.O_WRONLY)
+        try:
+            while written < expected:
+                data = stream.read(min(CHUNK_SIZE, expected - written))
+                if not data:
+                    break
+                if index == 0 and len(head) < 32:
+                    head += data[:32 - len(head)]
+                # Different chunks go to different offsets, so parallel PUTs do not collide
+                os.pwrite(fd, data, offset + written)
+                hasher.update(data)
+                written += len(data)
+        finally:
+            os.close(fd)
+        marker = self._dir(upload_id) / 'chunks' / str(index)
+        if written != expected or stream.read(1):
+            # The bytes at this offset are no longer the ones received before
+            marker.unlink(missing_ok=True)
+            raise UploadRejected(f"Chunk {index} must be exactly {expected} bytes")
+        if sha256 and hasher.hexdigest() != sha256.lower():
+            marker.unlink(missing_ok=True)
+            raise UploadRejected(f"Chunk {index} does not match its checksum, please send it again")
+        if index == 0 and self.sniff is not None:
+            # The file type is known from the first chunk, so a wrong file is refused early
+            try:
+                extension = self.sniff(head)
+            except UnsupportedUpload:
+                self.delete(upload_id)
+                raise
+            if extension != session['extension']:
+                session['extension'] = extension
+                self._save(session)
+
+        marker.touch()
+        self.chunks_received += 1
+        return self.status(upload_id)
+
+    def complete(self, upload_id, sha256=None):
+        """
+        Check that every chunk arrived and the file hashes to `sha256` (or the
+        checksum given at creation), then store it. Returns the status, whose
+        `image` is the stored path. Completing twice returns the same result.
+        """
+        session = self._load(upload_id)
+        if session['image']:
+            return self.status(upload_id)
+        expected = (sha256 or session['sha256'] or '').lower()
+        if not _SHA256.match(expected):
+            raise UploadRejected("sha256 of the whole file is required to finish an upload")
+        if session['sha256'] and expected != session['sha256']:
+            raise UploadRejected("sha256 differs from the one given when the upload was started")
+        missing = session['chunks'] - len(self._received(upload_id))
+        if missing:
+            raise UploadRejected(f"{missing} chunks are still missing")
+
+        directory = self._dir(upload_id)
+        digest = hashlib.sha256()
+        try:
+            with open(directory / 'data', 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            if digest.hexdigest() != expected:
+                # Some chunk was corrupted on the way; the client has to send the file again
+                self.delete(upload_id)
+                raise UploadRejected("The uploaded file does not match its sha256, please upload it again")
+            image, _, _ = self.store.commit_file(directory / 'data', expected, session['extension'] or '')
+        except FileNotFoundError:
+            # Another request is finishing the same upload right now
+            if self._load(upload_id)['image']:
+                return self.status(upload_id)
+            raise UploadRejected("This upload is already being finished, please retry")
+        session['image'] = image
+        session['completedAt'] = datetime.now(timezone.utc).isoformat()
+        self._save(session)
+        shutil.rmtree(directory / 'chunks', ignore_errors=True)
+        if (directory / 'data').exists():
+            # An identical file was already stored
+            os.remove(directory / 'data')
+        self.completed += 1
+        return self.status(upload_id)
+
+    def resolve(self, upload_ids):
+        """Stored image paths of finished uploads, in order; raises for unknown or unfinished ones."""
+        images = []
+        for upload_id in upload_ids:
+            session = self._load(upload_id)
+            if not session['image']:
+                raise UploadRejected(f"Upload {upload_id} is not finished yet")
+            images.append(session['image'])
+        return images
+
+    def delete(self, upload_id):
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+
+    def collect_garbage(self, now=None, dry_run=False):
+        """Delete sessions not touched for the TTL. Finished files stay in the store. Returns how many went."""
+        cutoff = (now or time.time()) - self.ttl_seconds
+        removed = 0
+        for directory in self.root.iterdir():
+            if not directory.is_dir() or not _UPLOAD_ID.match(directory.name):
+                continue
+            try:
+                # A chunk write or a status change touches one of these
+                touched = max(entry.stat().st_mtime for entry in directory.iterdir())
+            except ValueError:
+                touched = directory.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if touched < cutoff:
+                if not dry_run:
+                    self.delete(directory.name)
+                removed += 1
+        if not dry_run:
+            self.collected += removed
+        return removed
+
+    def _gc_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                removed = self.collect_garbage()
+                if removed:
+                    print(f"✓ Removed {removed} abandoned upload sessions")
+            except Exception as e:
+                print(f"⚠️ Upload session cleanup failed: {str(e)}")
+
+    def start_gc(self, interval=3600):
+        if self._gc_thread is not None:
+            return
+        self._gc_thread = threading.Thread(target=self._gc_loop, args=(interval,), name='upload-session-gc', daemon=True)
+        self._gc_thread.start()
+
+    def stats(self):
+        try:
+            active = sum(1 for entry in self.root.iterdir() if entry.is_dir())
+        except FileNotFoundError:
+            active = 0
+        return {
+            'active': active,
+            'created': self.created,
+            'completed': self.completed,
+            'chunks_received': self.chunks_received,
+            'collected': self.collected,
+            'ttl_hours': self.ttl_seconds // 3600,
+        }
@@ -0,0 +1,260 @@
+"""
+Content-addressed storage for uploaded images.
+Each upload is hashed with SHA-256 while it is streamed to a temporary file
+and then moved to uploads/<aa>/<bb>/<sha256><ext>, so identical photos (app
+retries, re-submissions) share one file. A file whose metadata had to be
+stripped first is hashed again afterwards, so the address is always that of
+the bytes that are served. The `uploads` collection keeps one
+document per stored file with a `refcount` of the reports whose `images`
+point at it. The stored path still starts with `uploads/`, so links and the
+/uploads route keep working, and older flat `uploads/<uuid>_<name>` paths
+are still resolved. Flat files moved by migrate-uploads, and originals
+re-addressed by strip-upload-metadata, are listed under `legacy_names` of
+their new document, so old links can be redirected.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from firebase_admin import firestore
+
+UPLOADS_COLLECTION = 'uploads'
+URL_PREFIX = 'uploads/'
+CHUNK_SIZE = 64 * 1024
+# Partially written uploads live here until their hash is known
+INCOMING_DIR = '.incoming'
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+# Name of a file saved before content addressing: uuid4().hex + '_' + the client's file name
+LEGACY_NAME = re.compile(r'^[0-9a-f]{32}_.+')
+_EXTENSION = re.compile(r'^\.[a-z0-9]{1,5}$')
+
+
+def blob_name(digest, extension=''):
+    """Sharded path of a blob below the upload folder: 'ab/cd/abcd...<ext>'."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def digest_of(image):
+    """SHA-256 of a content-addressed image path, or None for legacy and external paths."""
+    if not isinstance(image, str) or not image.startswith(URL_PREFIX):
+        return None
+    stem = Path(image).name.split('.', 1)[0]
+    return stem if _DIGEST.match(stem) else None
+
+
+def legacy_target(db, name):
+    """Image path a migrated flat upload or a re-addressed original (relative to the folder) was moved to, or None."""
+    if not LEGACY_NAME.match(name) and digest_of(URL_PREFIX + name) is None:
+        return None
+    query = db.collection(UPLOADS_COLLECTION) \
+        .where(filter=firestore.FieldFilter('legacy_names', 'array_contains', name)).limit(1)
+    for doc in query.stream():
+        return (doc.to_dict() or {}).get('path')
+    return None
+
+
+def file_digest(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class UploadStore:
+    def __init__(self, root, scrub=None):
+        self.root = Path(root)
+        self.incoming = self.root / INCOMING_DIR
+        self.incoming.mkdir(parents=True, exist_ok=True)
+        # scrub(path, extension) cleans a file before it is stored and returns True if it changed it
+        self.scrub = scrub
+
+    def local_path(self, image):
+        """File behind an 'uploads/...' image path, or None if it is external or escapes the folder."""
+        if not isinstance(image, str) or URL_PREFIX not in image:
+            return None
+        relative = image.split(URL_PREFIX, 1)[1]
+        path = (self.root / relative).resolve()
+        root = self.root.resolve()
+        if path == root or root not in path.parents:
+            return None
+        return path
+
+    def _existing(self, digest):
+        shard = self.root / blob_name(digest).rsplit('/', 1)[0]
+        if not shard.is_dir():
+            return None
+        for candidate in shard.glob(f'{digest}*'):
+            return candidate
+        return None
+
+    def open_incoming(self, extension='', max_bytes=None, sniff=None):
+        return IncomingUpload(self, extension, max_bytes, sniff)
+
+    def commit(self, incoming):
+        """
+        Move a finished IncomingUpload to its content address. Returns
+        (image_path, digest, size, created); created is False when an identical
+        file was already stored and the new copy was dropped.
+        """
+        try:
+            incoming.finish()
+        except BaseException:
+            incoming.discard()
+            raise
+        incoming.file.close()
+        try:
+            image, digest, created = self.commit_file(incoming.path, incoming.hasher.hexdigest(), incoming.extension)
+        except BaseException:
+            incoming.discard()
+            raise
+        incoming.committed = created
+        if not created:
+            incoming.discard()
+        return image, digest, incoming.size, created
+
+    def commit_file(self, path, digest, extension=''):
+        """
+        Move a complete file below the incoming folder whose SHA-256 is `digest`
+        to its content address. Returns (image_path, digest, created); when an
+        identical file is already stored, `path` is left for the caller to delete.
+        The returned digest is that of the stored bytes, after scrubbing.
+        """
+        if self.scrub is not None and self.scrub(str(path), extension):
+            digest = file_digest(path)
+        existing = self._existing(digest)
+        if existing is not None:
+            # Referenced again, so the orphan collector's grace period starts over
+            os.utime(existing)
+            return URL_PREFIX + existing.relative_to(self.root).as_posix(), digest, False
+
+        target = self.root / blob_name(digest, extension)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Same filesystem, so the file appears atomically under its final name
+        os.replace(path, target)
+        os.chmod(target, 0o644)
+        return URL_PREFIX + blob_name(digest, extension), digest, True
+
+    def save(self, stream, filename=''):
+        """
+        Store an upload by content. `stream` is anything with read(n) (a werkzeug
+        FileStorage works); an IncomingUpload that was already streamed to disk is
+        committed without copying. Returns the same tuple as commit().
+        """
+        if isinstance(stream, IncomingUpload) and stream.store is self:
+            return self.commit(stream)
+        extension = Path(filename or '').suffix.lower()
+        incoming = self.open_incoming(extension if _EXTENSION.match(extension) else '')
+        try:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                incoming.write(chunk)
+        except BaseException:
+            incoming.discard()
+            raise
+        return self.commit(incoming)
+
+
+class UploadRejected(Exception):
+    status_code = 400
+
+
+class UploadTooLarge(UploadRejected):
+    status_code = 413
+
+
+class UnsupportedUpload(UploadRejected):
+    status_code = 415
+
+
+class IncomingUpload:
+    """
+    A file being received into the store's incoming folder. Bytes are hashed
+    and counted as they are written, so nothing is read back before commit().
+    With max_bytes an oversized file is aborted mid-stream; sniff(head) sees the
+    first SNIFF_BYTES and returns the extension to store the file under, or
+    raises UnsupportedUpload. Behaves enough like a file for werkzeug to use it
+    as the stream of a multipart file field.
+    """
+    SNIFF_BYTES = 32
+
+    def __init__(self, store, extension='', max_bytes=None, sniff=None):
+        self.store = store
+        self.extension = extension
+        self.max_bytes = max_bytes
+        self.sniff = sniff
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.committed = False
+        self._head = b''
+        fd, self.path = tempfile.mkstemp(dir=store.incoming)
+        self.file = os.fdopen(fd, 'w+b')
+
+    def _check_head(self):
+        if self.sniff is not None:
+            self.extension = self.sniff(self._head)
+            self.sniff = None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            raise UploadTooLarge(f"Each file must be at most {self.max_bytes // (1024 * 1024)} MB")
+        if self.sniff is not None:
+            self._head += data[:self.SNIFF_BYTES]
+            if len(self._head) >= self.SNIFF_BYTES:
+                self._check_head()
+        self.hasher.update(data)
+        self.file.write(data)
+        return len(data)
+
+    def finish(self):
+        # Files shorter than SNIFF_BYTES are checked once they are complete; empty ones have nothing to check
+        if self.size == 0:
+            self.sniff = None
+        self._check_head()
+        self.file.flush()
+
+    def seek(self, offset, whence=0):
+        # werkzeug rewinds every file part when the body has been read
+        if offset == 0 and whence == 0:
+            self.finish()
+        return self.file.seek(offset, whence)
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def tell(self):
+        return self.file.tell()
+
+    def discard(self):
+        """Close the file and, unless it was committed, delete it."""
+        if not self.file.closed:
+            self.file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    close = discard
+
+
+def add_references(db, images, delta=1):
+    """Adjust the refcount of every content-addressed image in one batch. Returns how many were counted."""
+    counts = {}
+    paths = {}
+    for image in images or []:
+        digest = digest_of(image)
+        if digest:
+            counts[digest] = counts.get(digest, 0) + delta
+            paths[digest] = image
+    if not counts:
+        return 0
+    batch = db.batch()
+    for digest, amount in counts.items():
+        batch.set(db.collection(UPLOADS_COLLECTION).document(digest), {
+            'path': paths[digest],
+            'refcount': firestore.Increment(amount),
+            'lastReferencedAt': firestore.SERVER_TIMESTAMP,
+        }, merge=True)
+    batch.commit()
+    return len(counts)
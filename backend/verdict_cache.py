@@ -0,0 +1,116 @@
+"""
+Persistent cache of image moderation verdicts.
+SafeSearch results are stored in the `moderation_verdicts` collection keyed by
+the image's SHA-256 and the Vision model version, so the same bytes (app
+retries, clustered duplicates, re-submissions) are only sent to Vision once
+per model and TTL. Documents carry `expiresAt`, which is checked on read and
+can also drive a Firestore TTL policy for cleanup.
+"""
+
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+
+VERDICTS_COLLECTION = 'moderation_verdicts'
+VERDICT_FIELDS = ('adult', 'violence', 'racy')
+
+
+def _model_key(model):
+    # Document ids cannot contain '/', and 'builtin/stable' does
+    return re.sub(r'[^A-Za-z0-9_.-]', '-', model)
+
+
+class VerdictCache:
+    def __init__(self, model, ttl_days=30):
+        self.model = model
+        self.ttl = timedelta(days=ttl_days)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+        # Vision usage, so the stats can say how much the hits saved
+        self.api_images = 0
+        self.api_seconds = 0.0
+
+    def _doc(self, db, digest):
+        return db.collection(VERDICTS_COLLECTION).document(f"{digest}_{_model_key(self.model)}")
+
+    def get_many(self, db, digests):
+        """{digest: {'adult', 'violence', 'racy'}} for the digests with a live verdict, in one read."""
+        digests = list(dict.fromkeys(d for d in digests if d))
+        if not digests:
+            return {}
+        found = {}
+        now = datetime.now(timezone.utc)
+        try:
+            for doc in db.get_all([self._doc(db, digest) for digest in digests]):
+                data = doc.to_dict() if doc.exists else None
+                if not data or not data.get('expiresAt') or data['expiresAt'] < now:
+                    continue
+                found[data['digest']] = {field: data[field] for field in VERDICT_FIELDS}
+        except Exception as e:
+            # A cache outage only costs Vision calls
+            with self._lock:
+                self.errors += 1
+            print(f"⚠️ Verdict cache read failed: {str(e)}")
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(digests) - len(found)
+        return found
+
+    def put_many(self, db, verdicts):
+        """Store {digest: annotation} in one batch."""
+        if not verdicts:
+            return
+        expires_at = datetime.now(timezone.utc) + self.ttl
+        try:
+            batch = db.batch()
+            for digest, annotation in verdicts.items():
+                batch.set(self._doc(db, digest), {
+                    'digest': digest,
+                    'model': self.model,
+                    **{field: annotation[field] for field in VERDICT_FIELDS},
+                    'checkedAt': firestore.SERVER_TIMESTAMP,
+                    'expiresAt': expires_at,
+                })
+            batch.commit()
+            with self._lock:
+                self.writes += len(verdicts)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"⚠️ Verdict cache write failed: {str(e)}")
+
+    def record_api_call(self, images, seconds):
+        with self._lock:
+            self.api_images += images
+            self.api_seconds += seconds
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            per_image = self.api_seconds / self.api_images if self.api_images else 0.0
+            return {
+                'model': self.model,
+                'ttl_days': self.ttl.days,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'writes': self.writes,
+                'errors': self.errors,
+                'api_images': self.api_images,
+                'api_ms_per_image': round(per_image * 1000, 1),
+                # Each hit is one image that did not go to Vision
+                'images_saved': self.hits,
+                'estimated_seconds_saved': round(self.hits * per_image, 2),
+            }
+
+
+verdict_cache = VerdictCache(
+    model=os.getenv('MODERATION_MODEL', 'builtin/stable'),
+    ttl_days=int(os.getenv('MODERATION_CACHE_TTL_DAYS', 30))
+)
@@ -159,7 +159,14 @@ class WhatsAppService:
         Send report notification to department via WhatsApp
         """
         from department_contacts import get_whatsapp_for_department
-        
+        from boundary_router import routing_fields
+
+        # Reports that only carry GPS are routed to the local body containing them
+        try:
+            report_data = {**report_data, **routing_fields(report_data)}
+        except Exception as e:
+            logger.warning(f"⚠️ Boundary routing failed: {e}")
+
         district = report_data.get('district', 'Pathanamthitta')
         local_body_name = report_data.get('local_body_name', '')
         department_office = report_data.get('department_office', '')
@@ -14,6 +14,7 @@ class _AdminReportsState extends State<AdminReports> {
   bool isLoading = true;
   List<dynamic> reports = [];
   String? error;
+  String? reportsEtag; // Lets unchanged polls come back as 304
 
   @override
   void initState() {
@@ -29,11 +30,19 @@ class _AdminReportsState extends State<AdminReports> {
     try {
       final baseUrl = Config.apiBaseUrl;
       final uri = Uri.parse('$baseUrl/api/requests');
-      final resp = await http.get(uri);
-      if (resp.statusCode == 200) {
+      final resp = await http.get(
+        uri,
+        headers: reportsEtag != null ? {'If-None-Match': reportsEtag!} : null,
+      );
+      if (resp.statusCode == 304) {
+        setState(() {
+          isLoading = false;
+        });
+      } else if (resp.statusCode == 200) {
         final data = json.decode(resp.body);
         setState(() {
           reports = data['requests'] ?? [];
+          reportsEtag = resp.headers['etag'];
           isLoading = false;
         });
       } else {
@@ -22,10 +22,15 @@ class HomeScreen extends StatefulWidget {
 }
 
 class _HomeScreenState extends State<HomeScreen> {
+  static const int _pageSize = 20;
   final searchController = TextEditingController();
+  final scrollController = ScrollController();
   List<Map<String, dynamic>> allRequests = [];
   List<Map<String, dynamic>> filteredRequests = [];
   bool isLoading = false;
+  bool isLoadingMore = false;
+  String? nextCursor;
+  String? firstPageEtag; // Lets unchanged refreshes come back as 304
   String? errorMessage;
   String? selectedDepartment;
   String selectedStatus = 'all'; // Filter by status
@@ -65,14 +70,23 @@ class _HomeScreenState extends State<HomeScreen> {
     super.initState();
     fetchRequests();
     searchController.addListener(_filterRequests);
+    scrollController.addListener(_onScroll);
   }
 
   @override
   void dispose() {
     searchController.dispose();
+    scrollController.dispose();
     super.dispose();
   }
 
+  void _onScroll() {
+    if (scrollController.position.pixels >=
+        scrollController.position.maxScrollExtent - 300) {
+      loadMoreRequests();
+    }
+  }
+
   DateTime _parseDate(dynamic input) {
     if (input == null) return DateTime(2000);
     try {
@@ -98,13 +112,14 @@ class _HomeScreenState extends State<HomeScreen> {
     });
 
     try {
-      final baseUrl = Config.apiBaseUrl;
-      final response = await http.get(
-        Uri.parse('$baseUrl/api/requests?userId=${widget.userId}'),
-        headers: {'Content-Type': 'application/json'},
-      );
+      final response = await _fetchPage(null, etag: firstPageEtag);
 
-      if (response.statusCode == 200) {
+      if (response.statusCode == 304) {
+        // Nothing changed since the last refresh; keep what is on screen
+        setState(() {
+          isLoading = false;
+        });
+      } else if (response.statusCode == 200) {
         final data = json.decode(response.body);
         List<Map<String, dynamic>> requests = List<Map<String, dynamic>>.from(
           data['requests'] ?? data ?? [],
@@ -119,9 +134,11 @@ class _HomeScreenState extends State<HomeScreen> {
 
         setState(() {
           allRequests = requests;
-          filteredRequests = requests;
+          nextCursor = data['next_cursor'];
+          firstPageEtag = response.headers['etag'];
           isLoading = false;
         });
+        _filterRequests();
       } else {
         setState(() {
           errorMessage = 'Failed to fetch requests';
@@ -136,6 +153,47 @@ class _HomeScreenState extends State<HomeScreen> {
     }
   }
 
+  Future<http.Response> _fetchPage(String? cursor, {String? etag}) {
+    final baseUrl = Config.apiBaseUrl;
+    final params = {'userId': widget.userId, 'limit': '$_pageSize'};
+    if (cursor != null) params['cursor'] = cursor;
+    final headers = {'Content-Type': 'application/json'};
+    if (etag != null) headers['If-None-Match'] = etag;
+    return http.get(
+      Uri.parse('$baseUrl/api/requests').replace(queryParameters: params),
+      headers: headers,
+    );
+  }
+
+  Future<void> loadMoreRequests() async {
+    if (isLoading || isLoadingMore || nextCursor == null) return;
+    setState(() {
+      isLoadingMore = true;
+    });
+
+    try {
+      final response = await _fetchPage(nextCursor);
+      if (response.statusCode == 200) {
+        final data = json.decode(response.body);
+        final page = List<Map<String, dynamic>>.from(data['requests'] ?? []);
+        setState(() {
+          allRequests = [...allRequests, ...page];
+          nextCursor = data['next_cursor'];
+          isLoadingMore = false;
+        });
+        _filterRequests();
+      } else {
+        setState(() {
+          isLoadingMore = false;
+        });
+      }
+    } catch (e) {
+      setState(() {
+        isLoadingMore = false;
+      });
+    }
+  }
+
   void _filterRequests() {
     final query = searchController.text.toLowerCase();
 
@@ -413,6 +471,7 @@ class _HomeScreenState extends State<HomeScreen> {
         onRefresh: fetchRequests,
         color: const Color(0xFF26A69A),
         child: ListView(
+          controller: scrollController,
           children: [
             // Statistics Dashboard
             Padding(
@@ -823,6 +882,14 @@ class _HomeScreenState extends State<HomeScreen> {
                 ),
               ),
 
+            if (isLoadingMore)
+              const Padding(
+                padding: EdgeInsets.all(16.0),
+                child: Center(
+                  child: CircularProgressIndicator(color: Color(0xFF26A69A)),
+                ),
+              ),
+
             const SizedBox(height: 16),
           ],
         ),
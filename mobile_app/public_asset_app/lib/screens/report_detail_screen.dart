@@ -336,8 +336,11 @@ class _ReportDetailScreenState extends State<ReportDetailScreen> {
                 itemCount: images.length,
                 itemBuilder: (context, index) {
                   String imgUrl = images[index];
+                  // Server uploads have a small WebP copy for the grid
+                  String thumbUrl = imgUrl;
                   if (!imgUrl.startsWith('http')) {
                     imgUrl = '${Config.apiBaseUrl}/$imgUrl';
+                    thumbUrl = '$imgUrl?size=thumb';
                   }
                   return GestureDetector(
                     onTap: () {
@@ -346,7 +349,7 @@ class _ReportDetailScreenState extends State<ReportDetailScreen> {
                     child: ClipRRect(
                       borderRadius: BorderRadius.circular(8),
                       child: Image.network(
-                        imgUrl,
+                        thumbUrl,
                         fit: BoxFit.cover,
                         errorBuilder: (ctx, _, _) => Container(
                           color: Colors.grey[200],
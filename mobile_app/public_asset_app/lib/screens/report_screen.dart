@@ -8,6 +8,7 @@ import '../config.dart';
 import 'dart:convert';
 import '../utils/language_manager.dart';
 import '../utils/pathanamthitta_data.dart';
+import '../utils/resumable_upload.dart';
 
 class ReportScreen extends StatefulWidget {
   final String token;
@@ -36,6 +37,8 @@ class _ReportScreenState extends State<ReportScreen> {
   final locationCtrl =
       TextEditingController(); // This will act as the "Place / Locality" text field in addition to GPS
   List<XFile> images = [];
+  // Upload ids by file path, so a retried submission resumes instead of re-sending photos
+  final Map<String, String> uploadIds = {};
   bool isSubmitting = false;
 
   final ImagePicker _picker = ImagePicker();
@@ -360,6 +363,21 @@ class _ReportScreenState extends State<ReportScreen> {
     setState(() => isSubmitting = true);
 
     try {
+      // Photos go first in resumable chunks; the report then only refers to them
+      for (var file in images) {
+        final upload = ResumableUpload(
+          file.path,
+          resumeId: uploadIds[file.path],
+        );
+        try {
+          uploadIds[file.path] = await upload.send();
+        } finally {
+          if (upload.uploadId != null) {
+            uploadIds[file.path] = upload.uploadId!;
+          }
+        }
+      }
+
       final uri = Uri.parse('${Config.apiBaseUrl}/api/requests');
       final req = http.MultipartRequest('POST', uri);
 
@@ -379,14 +397,9 @@ class _ReportScreenState extends State<ReportScreen> {
       req.fields['userId'] = widget.userId;
       req.fields['otp'] = otp;
 
-      for (var file in images) {
-        final multipartFile = await http.MultipartFile.fromPath(
-          'images',
-          file.path,
-          filename: file.name,
-        );
-        req.files.add(multipartFile);
-      }
+      req.fields['upload_ids'] = images
+          .map((file) => uploadIds[file.path]!)
+          .join(',');
 
       final streamed = await req.send().timeout(const Duration(seconds: 30));
       final resp = await http.Response.fromStream(streamed);
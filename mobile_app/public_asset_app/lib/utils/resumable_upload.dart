@@ -0,0 +1,146 @@
+import 'dart:convert';
+import 'dart:io';
+import 'dart:math';
+
+import 'package:crypto/crypto.dart';
+import 'package:http/http.dart' as http;
+
+import '../config.dart';
+
+/// Sends a file to /api/uploads in chunks, so a dropped connection only costs
+/// the chunk in flight. Returns the upload id to put in a report's
+/// `upload_ids`. Pass the id from an earlier, interrupted attempt as
+/// [resumeId] to continue with the chunks the server is still missing.
+class ResumableUpload {
+  static const int chunkSize = 512 * 1024;
+  static const int maxAttempts = 5;
+  static const Duration requestTimeout = Duration(seconds: 30);
+
+  final String path;
+  final void Function(int sent, int total)? onProgress;
+  String? uploadId;
+
+  ResumableUpload(this.path, {String? resumeId, this.onProgress})
+    : uploadId = resumeId;
+
+  Future<String> send() async {
+    final file = File(path);
+    final size = await file.length();
+    final digest = (await sha256.bind(file.openRead()).first).toString();
+
+    var session = uploadId == null ? null : await _status(uploadId!);
+    session ??= await _create(size, digest);
+    uploadId = session['upload_id'] as String;
+    if (session['complete'] == true) {
+      return uploadId!;
+    }
+
+    final missing = List<int>.from(session['missing'] as List);
+    final sessionChunkSize = session['chunk_size'] as int;
+    final chunkCount = session['chunks'] as int;
+    var sent = chunkCount - missing.length;
+    final raf = await file.open();
+    try {
+      for (final index in missing) {
+        await raf.setPosition(index * sessionChunkSize);
+        final bytes = await raf.read(sessionChunkSize);
+        await _retry(() => _putChunk(index, bytes));
+        sent++;
+        onProgress?.call(sent, chunkCount);
+      }
+    } finally {
+      await raf.close();
+    }
+
+    await _retry(() => _complete(digest));
+    return uploadId!;
+  }
+
+  Uri _uri(String path) => Uri.parse('${Config.apiBaseUrl}/api/uploads$path');
+
+  Future<Map<String, dynamic>?> _status(String id) async {
+    try {
+      final resp = await http.get(_uri('/$id')).timeout(requestTimeout);
+      if (resp.statusCode == 200) {
+        return jsonDecode(resp.body) as Map<String, dynamic>;
+      }
+    } catch (_) {}
+    // Expired or unknown: start over
+    return null;
+  }
+
+  Future<Map<String, dynamic>> _create(int size, String digest) async {
+    final resp = await _retry(
+      () => http
+          .post(
+            _uri(''),
+            headers: {'Content-Type': 'application/json'},
+            body: jsonEncode({
+              'size': size,
+              'sha256': digest,
+              'chunk_size': chunkSize,
+            }),
+          )
+          .timeout(requestTimeout),
+    );
+    return jsonDecode(resp.body) as Map<String, dynamic>;
+  }
+
+  Future<http.Response> _putChunk(int index, List<int> bytes) {
+    return http
+        .put(
+          _uri('/$uploadId/chunks/$index'),
+          headers: {
+            'Content-Type': 'application/octet-stream',
+            'X-Chunk-SHA256': sha256.convert(bytes).toString(),
+          },
+          body: bytes,
+        )
+        .timeout(requestTimeout);
+  }
+
+  Future<http.Response> _complete(String digest) {
+    return http
+        .post(
+          _uri('/$uploadId/complete'),
+          headers: {'Content-Type': 'application/json'},
+          body: jsonEncode({'sha256': digest}),
+        )
+        .timeout(requestTimeout);
+  }
+
+  /// Retries network errors and 5xx/429 with backoff; other errors are final.
+  Future<http.Response> _retry(Future<http.Response> Function() call) async {
+    for (var attempt = 1; ; attempt++) {
+      try {
+        final resp = await call();
+        if (resp.statusCode < 300) {
+          return resp;
+        }
+        if (resp.statusCode < 500 && resp.statusCode != 429) {
+          throw UploadException(resp.statusCode, resp.body);
+        }
+        if (attempt >= maxAttempts) {
+          throw UploadException(resp.statusCode, resp.body);
+        }
+      } on UploadException {
+        rethrow;
+      } catch (_) {
+        if (attempt >= maxAttempts) {
+          rethrow;
+        }
+      }
+      await Future.delayed(Duration(seconds: min(pow(2, attempt).toInt(), 30)));
+    }
+  }
+}
+
+class UploadException implements Exception {
+  final int statusCode;
+  final String body;
+
+  UploadException(this.statusCode, this.body);
+
+  @override
+  String toString() => 'Upload failed ($statusCode): $body';
+}